@@ -1,40 +1,682 @@
+import asyncio
+import datetime
+import functools
 import sqlite3
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+
+from api.init_db import migrate
+
+DB_FILE = os.environ.get("SCRIPTBUDDY_DB_FILE") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scriptbuddy.db"
+)
+
+# 连接池参数 (可通过环境变量覆盖)
+POOL_SIZE = int(os.environ.get("SCRIPTBUDDY_DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 16 * 1024          # PRAGMA cache_size 以负数表示 KiB
+MMAP_SIZE = 256 * 1024 * 1024
+
+# 存储后端：sqlite (默认，单机单写线程) 或 mysql (连接池 + 多个写线程)
+DB_BACKEND = os.environ.get("SCRIPTBUDDY_DB_BACKEND", "sqlite")
+
+MYSQL_CONFIG = {
+    "host": os.environ.get("SCRIPTBUDDY_MYSQL_HOST", "127.0.0.1"),
+    "port": int(os.environ.get("SCRIPTBUDDY_MYSQL_PORT", "3306")),
+    "user": os.environ.get("SCRIPTBUDDY_MYSQL_USER", "scriptbuddy"),
+    "password": os.environ.get("SCRIPTBUDDY_MYSQL_PASSWORD", ""),
+    "database": os.environ.get("SCRIPTBUDDY_MYSQL_DATABASE", "scriptbuddy"),
+}
+# 连接数应不少于读线程 (POOL_SIZE) 与写线程之和，否则多出的调用方排队等待连接
+MYSQL_POOL_SIZE = int(os.environ.get("SCRIPTBUDDY_MYSQL_POOL_SIZE", "16"))
+MYSQL_WRITERS = int(os.environ.get("SCRIPTBUDDY_MYSQL_WRITERS", "4"))
+# 每个连接缓存的预编译语句数
+MYSQL_STATEMENT_CACHE = 64
+# 死锁 (1213) / 锁等待超时 (1205) 时整个写操作重试的次数
+MYSQL_WRITE_RETRIES = 3
+MYSQL_RETRY_ERRNOS = (1205, 1213)
+
+# 组提交参数：写线程拿到第一个写操作后最多再等待这么久，合并进同一个事务
+GROUP_COMMIT_WINDOW_MS = 2
+GROUP_COMMIT_MAX_BATCH = 512
 
-DB_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scriptbuddy.db")
 
 def get_db_connection():
+    """Open a new, pool-independent connection with the standard pragmas applied."""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
         conn.row_factory = sqlite3.Row  # Access columns by name
+        # journal_mode 是数据库级别的持久设置，其余 pragma 为连接级别
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        _ensure_migrated(conn)
         return conn
     except sqlite3.Error as e:
         print(f"Error connecting to database: {e}")
         raise
 
+
+_migrated_files = set()
+_migrate_lock = threading.Lock()
+
+
+def _ensure_migrated(conn):
+    # 每个进程对每个数据库文件只检查一次
+    if DB_FILE in _migrated_files:
+        return
+    with _migrate_lock:
+        if DB_FILE not in _migrated_files:
+            migrate(conn)
+            _migrated_files.add(DB_FILE)
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived connections (SQLite, or MySQL via ``connect``).
+
+    Connections are created lazily up to ``size`` and handed out LIFO so the
+    hottest connection (warm page cache) is reused first.
+    """
+
+    def __init__(self, size=POOL_SIZE, connect=get_db_connection):
+        self.size = size
+        self._connect = connect
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def acquire(self, timeout=None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # 池已满，等待其他调用方归还
+        return self._idle.get(timeout=timeout)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+class WriteQueue:
+    """Single writer thread that group-commits queued mutations.
+
+    Every mutation is a callable ``fn(conn) -> result``. The writer drains the
+    queue for up to ``window_ms`` and runs the whole batch in one transaction,
+    wrapping each operation in its own SAVEPOINT so a failing operation only
+    rolls back itself. Futures resolve after COMMIT, with the operation's own
+    result or exception.
+    """
+
+    def __init__(self, connect=get_db_connection, window_ms=GROUP_COMMIT_WINDOW_MS,
+                 max_batch=GROUP_COMMIT_MAX_BATCH):
+        self._connect = connect
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        # 统计信息
+        self.commits = 0
+        self.operations = 0
+
+    def submit(self, fn):
+        """Queue ``fn(conn)`` for the next group commit and return its Future."""
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._start()
+            self._queue.put((fn, future))
+        return future
+
+    def close(self):
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._thread = None
+            self._queue.put(None)
+        thread.join()
+
+    def _start(self):
+        # 每个写线程有自己的队列：线程退出后，之后的 submit 由新线程处理，不会落进没人消费的队列
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, args=(self._queue,), name="db-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self, work):
+        conn = None
+        batch = []
+        try:
+            conn = self._connect()
+            conn.isolation_level = None  # 事务边界由写线程显式控制
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                batch = [item]
+                deadline = time.monotonic() + self.window
+                stop = False
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = work.get(timeout=remaining) if remaining > 0 else work.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._commit_batch(conn, batch)
+                if stop:
+                    return
+        except Exception as e:
+            # 连不上数据库或连接已不可用：放弃这个写线程，下一次 submit 重新启动
+            print(f"DB writer stopped: {e}")
+            with self._lock:
+                if self._queue is work:
+                    self._thread = None
+            for _, future in batch:
+                if not future.done() and (future.running() or future.set_running_or_notify_cancel()):
+                    future.set_exception(e)
+            self._fail_pending(work, e)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _fail_pending(work, error):
+        while True:
+            try:
+                item = work.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(error)
+
+    def _commit_batch(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT op")
+                try:
+                    result = fn(conn)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    outcomes.append((future, None, e))
+                else:
+                    outcomes.append((future, result, None))
+                conn.execute("RELEASE op")
+            conn.execute("COMMIT")
+        except Exception as e:
+            # 整个事务失败 (BEGIN 超时 / COMMIT 出错)，批内所有操作都没有生效
+            print(f"Error committing write batch: {e}")
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except Exception:
+                # 连接状态未知：由 _run 放弃这个写线程，批内操作随后以原来的错误失败
+                raise e
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.commits += 1
+        self.operations += len(outcomes)
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+# --- MySQL ---
+
+def _from_mysql(value):
+    # 与 sqlite3 返回的类型保持一致，上层代码和 JSON 编码不必区分后端
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    if isinstance(value, Decimal):
+        # SUM() 等聚合返回 Decimal：整数保持 int，带小数位的 (如 0.0) 与 SQLite 一样是 float
+        return float(value) if value.as_tuple().exponent < 0 else int(value)
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+class Row:
+    """Result row addressable by position or column name, like ``sqlite3.Row``."""
+
+    __slots__ = ("_values", "_index")
+
+    def __init__(self, values, index):
+        self._values = values
+        self._index = index
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._index[key]
+        return self._values[key]
+
+    def keys(self):
+        return list(self._index)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+
+class _Result:
+    """Eagerly fetched result with the parts of the sqlite3 cursor API the services use."""
+
+    __slots__ = ("lastrowid", "rowcount", "_rows")
+
+    def __init__(self, cursor):
+        self.lastrowid = cursor.lastrowid
+        self.rowcount = cursor.rowcount
+        rows = []
+        if cursor.description:
+            index = {}
+            for position, column in enumerate(cursor.description):
+                index.setdefault(column[0], position)
+            rows = [Row(tuple(map(_from_mysql, values)), index) for values in cursor.fetchall()]
+        self._rows = iter(rows)
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return self._rows
+
+
+class _RowCount:
+    """``executemany`` 的结果：与 sqlite3 一样，rowcount 为各行影响行数之和"""
+
+    __slots__ = ("rowcount",)
+
+    def __init__(self, rowcount):
+        self.rowcount = rowcount
+
+
+class MySQLConnection:
+    """sqlite3-style facade over a mysql-connector connection.
+
+    SQL is written with ``?`` placeholders for both backends. Statements with
+    parameters run as server-side prepared statements (MySQL's own ``?``
+    style), cached per connection, so hot queries are parsed once; multi-row
+    INSERTs go through the driver's batched ``executemany``. Results are
+    fetched eagerly, leaving the cached cursor free as soon as a call returns.
+    """
+
+    def __init__(self, config=None):
+        self._config = dict(MYSQL_CONFIG if config is None else config)
+        self._statements = OrderedDict()
+        self._raw = None
+        self._connect()
+
+    def _connect(self):
+        import mysql.connector
+        from mysql.connector.constants import ClientFlag
+
+        self._statements.clear()
+        # autocommit：单条读不开事务，与 sqlite3 的默认行为一致；写操作由 MySQLWriter 显式开启事务。
+        # FOUND_ROWS：UPDATE 的 rowcount 为匹配的行数 (与 SQLite 相同)，而不是值真正变化的行数
+        self._raw = mysql.connector.connect(charset="utf8mb4", autocommit=True,
+                                            client_flags=[ClientFlag.FOUND_ROWS], **self._config)
+
+    def _prepared(self, sql):
+        entry = self._statements.get(sql)
+        if entry is not None:
+            self._statements.move_to_end(sql)
+            return entry
+        # 以缓存中的 sql 对象执行：驱动按对象身份判断是否需要重新 PREPARE
+        entry = self._statements[sql] = (sql, self._raw.cursor(prepared=True))
+        if len(self._statements) > MYSQL_STATEMENT_CACHE:
+            _, (_, cursor) = self._statements.popitem(last=False)
+            cursor.close()
+        return entry
+
+    def _execute(self, sql, params):
+        if not params:
+            # 无参数的语句 (DDL、触发器、一次性查询) 走文本协议，不占用预编译缓存
+            cursor = self._raw.cursor()
+            try:
+                cursor.execute(sql)
+                return _Result(cursor)
+            finally:
+                cursor.close()
+        sql, cursor = self._prepared(sql)
+        cursor.execute(sql, tuple(params))
+        return _Result(cursor)
+
+    def execute(self, sql, params=()):
+        import mysql.connector
+
+        try:
+            return self._execute(sql, params)
+        except (mysql.connector.InterfaceError, mysql.connector.OperationalError):
+            # 连接被服务端断开 (wait_timeout 等)：不在事务中时重连后重试一次
+            if self.in_transaction or self._raw.is_connected():
+                raise
+            self._connect()
+            return self._execute(sql, params)
+
+    def executemany(self, sql, rows):
+        rows = [tuple(row) for row in rows]
+        if not rows:
+            return _RowCount(0)
+        if sql.lstrip()[:6].upper() == "INSERT":
+            # 驱动把整批改写为一条多行 INSERT，一次往返
+            cursor = self._raw.cursor()
+            try:
+                cursor.executemany(sql.replace("?", "%s"), rows)
+                return _RowCount(cursor.rowcount)
+            finally:
+                cursor.close()
+        sql, cursor = self._prepared(sql)
+        total = 0
+        for row in rows:
+            cursor.execute(sql, row)
+            total += cursor.rowcount
+        return _RowCount(total)
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def begin(self):
+        self._raw.start_transaction()
+
+    def begin_read(self):
+        self._raw.start_transaction(consistent_snapshot=True, readonly=True)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        for _, cursor in self._statements.values():
+            cursor.close()
+        self._statements.clear()
+        self._raw.close()
+
+
+class MySQLWriter:
+    """Runs mutations on a small thread pool, one transaction per operation.
+
+    Same ``submit(fn) -> Future`` contract as :class:`WriteQueue`, but writes
+    from different threads proceed concurrently: InnoDB row locks serialize
+    the conflicting ones and deadlock victims are retried from the start.
+    """
+
+    def __init__(self, pool, workers=MYSQL_WRITERS, retries=MYSQL_WRITE_RETRIES):
+        self._pool = pool
+        self.retries = retries
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db-writer")
+        self._lock = threading.Lock()
+        # 统计信息
+        self.commits = 0
+        self.operations = 0
+
+    def submit(self, fn):
+        """Run ``fn(conn)`` in its own transaction and return its Future."""
+        return self._executor.submit(self._run, fn)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _run(self, fn):
+        with self._pool.connection() as conn:
+            for attempt in range(self.retries + 1):
+                conn.begin()
+                try:
+                    result = fn(conn)
+                    conn.commit()
+                except Exception as e:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    if attempt < self.retries and getattr(e, "errno", None) in MYSQL_RETRY_ERRNOS:
+                        continue
+                    with self._lock:
+                        self.operations += 1
+                    raise
+                with self._lock:
+                    self.commits += 1
+                    self.operations += 1
+                return result
+
+
+# --- Backends ---
+
+class SQLiteBackend:
+    """Embedded WAL-mode SQLite: pooled readers and one group-committing writer."""
+
+    name = "sqlite"
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, pool_size=POOL_SIZE):
+        self.pool_size = pool_size
+
+    def create_pool(self):
+        return ConnectionPool(self.pool_size)
+
+    def create_writer(self, pool):
+        return WriteQueue()
+
+    def begin_read(self, conn):
+        conn.execute("BEGIN")
+
+    def insert_many(self, conn, sql, rows):
+        """批量 INSERT，返回新行的 ID"""
+        conn.executemany(sql, rows)
+        # 写线程独占写锁，AUTOINCREMENT 分配的 ID 是连续的
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+
+
+class MySQLBackend:
+    """MySQL/MariaDB through mysql-connector: a bounded connection pool with
+    per-connection prepared statements, and concurrent writer threads."""
+
+    name = "mysql"
+
+    def __init__(self, config=None, pool_size=MYSQL_POOL_SIZE, writers=MYSQL_WRITERS):
+        import mysql.connector
+
+        self.IntegrityError = mysql.connector.IntegrityError
+        self.config = dict(MYSQL_CONFIG if config is None else config)
+        self.pool_size = pool_size
+        self.writers = writers
+        self._fulltext = None
+
+    def connect(self):
+        return MySQLConnection(self.config)
+
+    def create_pool(self):
+        return ConnectionPool(self.pool_size, connect=self.connect)
+
+    def create_writer(self, pool):
+        return MySQLWriter(pool, self.writers)
+
+    def begin_read(self, conn):
+        conn.begin_read()
+
+    def insert_many(self, conn, sql, rows):
+        # 并发写入时 AUTO_INCREMENT 不保证连续，逐行取回 ID (同一条预编译语句)
+        return [conn.execute(sql, row).lastrowid for row in rows]
+
+    def has_fulltext(self):
+        """script_lines.content 上是否有 FULLTEXT 索引 (MariaDB 没有 ngram 分词器时不建)"""
+        if self._fulltext is None:
+            # 用本后端自己的连接查询，不取全局连接池 (那是当前启用的后端的，未必是这个库)；结果缓存，只连一次
+            conn = self.connect()
+            try:
+                self._fulltext = conn.execute(
+                    "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() "
+                    "AND TABLE_NAME = 'script_lines' AND INDEX_TYPE = 'FULLTEXT' LIMIT 1"
+                ).fetchone() is not None
+            finally:
+                conn.close()
+        return self._fulltext
+
+
+def _default_backend():
+    if DB_BACKEND == "mysql":
+        return MySQLBackend()
+    if DB_BACKEND != "sqlite":
+        raise ValueError(f"unknown SCRIPTBUDDY_DB_BACKEND '{DB_BACKEND}'")
+    return SQLiteBackend()
+
+
+_backend = None
+_pool = None
+_writer = None
+_pool_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _pool_lock:
+            if _backend is None:
+                _backend = _default_backend()
+    return _backend
+
+
+def use_backend(backend):
+    """Switch the process-wide backend (tests and tools); closes the current pool and writer."""
+    global _backend
+    close_pool()
+    with _pool_lock:
+        _backend = backend
+
+
+def get_pool():
+    global _pool
+    backend = get_backend()
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = backend.create_pool()
+    return _pool
+
+
+def get_writer():
+    global _writer
+    pool = get_pool()
+    if _writer is None:
+        with _pool_lock:
+            if _writer is None:
+                _writer = get_backend().create_writer(pool)
+    return _writer
+
+
+def close_pool():
+    """Drop the process-wide pool and writer (used by tools that swap ``DB_FILE``)."""
+    global _pool, _writer
+    with _pool_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
 def query_all(sql, params=None):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        # SQLite uses ? placeholder, MySQL uses %s. We need to standardize.
-        # Simple replace for now, assuming standard usage.
-        sql = sql.replace('%s', '?')
-        cursor.execute(sql, params or ())
-        result = cursor.fetchall()
+    with get_pool().connection() as conn:
+        # 两种后端的 SQL 都使用 ? 占位符 (sqlite3 与 MySQL 预编译语句的原生风格)
+        rows = conn.execute(sql, params or ()).fetchall()
         # Convert Row objects to dicts
-        return [dict(row) for row in result]
-    finally:
-        cursor.close()
-        conn.close()
+        return [dict(row) for row in rows]
+
+
+def _execute(sql, params):
+    def op(conn):
+        return conn.execute(sql, params or ()).lastrowid
+    return op
+
 
 def execute_query(sql, params=None):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        sql = sql.replace('%s', '?')
-        cursor.execute(sql, params or ())
-        conn.commit()
-        return cursor.lastrowid
-    finally:
-        cursor.close()
-        conn.close()
+    """Run a single write through the group-commit queue and wait for it to commit."""
+    return get_writer().submit(_execute(sql, params)).result()
+
+
+# --- Async access ---
+# 事件循环同时在转发 ASR/TTS 音频帧，阻塞的数据库调用一律放到专用线程池执行。
+# 线程数与连接池大小一致，保证每个线程都能立即拿到连接。
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="db")
+
+
+async def run_in_db(fn, *args, **kwargs):
+    """Run a blocking data-access function on the DB thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def query_all_async(sql, params=None):
+    return await run_in_db(query_all, sql, params)
+
+
+async def run_write(fn):
+    """Queue ``fn(conn)`` on the writer and await its committed result."""
+    return await asyncio.wrap_future(get_writer().submit(fn))
+
+
+async def execute_query_async(sql, params=None):
+    return await run_write(_execute(sql, params))
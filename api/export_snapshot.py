@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Export stories from scriptbuddy.db into a compact binary snapshot
+
+Usage:
+    python -m api.export_snapshot scripts.snap [--story 1 --story 2]
+
+Serve from it by starting the API with SCRIPTBUDDY_SNAPSHOT=scripts.snap
+"""
+
+import argparse
+import os
+import time
+
+from api.db import close_pool
+from api.services.script_snapshot import write_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export stories into a binary script snapshot")
+    parser.add_argument("path", help="输出文件")
+    parser.add_argument("--story", type=int, action="append", help="只导出指定剧本 (可重复)，默认全部")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        stories, lines = write_snapshot(args.path, args.story)
+    finally:
+        close_pool()
+    elapsed = time.perf_counter() - started
+    size_kb = os.path.getsize(args.path) / 1024
+    print(f"✅ Exported {stories} stories / {lines} lines to {args.path} ({size_kb:.1f} KB) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
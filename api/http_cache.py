@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+from collections.abc import Sequence
+
+from fastapi import Request, Response
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖：未安装时所有接口只返回 JSON
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# 客户端常见的几种 MessagePack 写法都接受，响应统一用 application/msgpack
+MSGPACK_ACCEPT = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# 小于该大小的响应不值得压缩
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+# 客户端每次使用前都要重新验证；未变化时服务端直接回 304
+CACHE_CONTROL = "no-cache"
+
+
+def _as_list(obj):
+    # 服务层的只读序列 (如 ScriptLines) 按列表编码
+    if isinstance(obj, Sequence):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def encode_json(obj):
+    # 与 FastAPI 默认的 JSONResponse 编码一致
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_as_list).encode("utf-8")
+
+
+def encode_msgpack(obj):
+    return msgpack.packb(obj, use_bin_type=True, default=_as_list)
+
+
+def encode(obj, media_type=JSON_MEDIA_TYPE):
+    return encode_msgpack(obj) if media_type == MSGPACK_MEDIA_TYPE else encode_json(obj)
+
+
+class EncodedResponse:
+    """A JSON or MessagePack body encoded once, with its strong ETag and optional gzip form.
+
+    The gzip form is a different byte sequence, so it gets its own strong ETag
+    (``gzip_etag``, the same hash suffixed with ``-gz``).
+    """
+
+    __slots__ = ("body", "gzip_body", "etag", "gzip_etag", "media_type")
+
+    def __init__(self, body, media_type=JSON_MEDIA_TYPE):
+        self.body = body
+        self.media_type = media_type
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+        self.gzip_body = gzip.compress(body, GZIP_LEVEL) if len(body) >= GZIP_MIN_BYTES else None
+
+    @classmethod
+    def from_obj(cls, obj, media_type=JSON_MEDIA_TYPE):
+        return cls(encode(obj, media_type), media_type)
+
+    @property
+    def size(self):
+        return len(self.body) + (len(self.gzip_body) if self.gzip_body else 0)
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match 使用弱比较
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _weighted(header):
+    """解析 Accept / Accept-Encoding 一类的头，逐项返回 (小写的值, q 权重)"""
+    for item in header.split(","):
+        value, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.lower().startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        yield value.lower(), q
+
+
+def accepts_gzip(request: Request):
+    """Accept-Encoding 中 gzip (或未单独列出 gzip 时的 ``*``) 的权重大于 0"""
+    gzip_q = any_q = None
+    for coding, q in _weighted(request.headers.get("accept-encoding", "")):
+        if coding in ("gzip", "x-gzip"):
+            gzip_q = max(gzip_q or 0.0, q)
+        elif coding == "*":
+            any_q = q
+    q = gzip_q if gzip_q is not None else any_q
+    return q is not None and q > 0
+
+
+def preferred_media_type(request: Request):
+    """按 Accept 选择 JSON 或 MessagePack。客户端显式列出 msgpack 且权重不低于 JSON 时才用 msgpack"""
+    accept = request.headers.get("accept")
+    if msgpack is None or not accept:
+        return JSON_MEDIA_TYPE
+    msgpack_q, json_q = 0.0, 0.0
+    for media, q in _weighted(accept):
+        if media in MSGPACK_ACCEPT:
+            msgpack_q = max(msgpack_q, q)
+        elif media in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            json_q = max(json_q, q)
+    return MSGPACK_MEDIA_TYPE if msgpack_q > 0 and msgpack_q >= json_q else JSON_MEDIA_TYPE
+
+
+def cached_response(request: Request, encoded: EncodedResponse, cache_control=CACHE_CONTROL, vary="Accept-Encoding"):
+    """304 if the client already has this version, otherwise the pre-encoded body."""
+    gzipped = encoded.gzip_body is not None and accepts_gzip(request)
+    # 304 与 200 都使用所选编码的 ETag，gzip 与原始字节不共用同一个强校验值
+    etag = encoded.gzip_etag if gzipped else encoded.etag
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": vary}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=encoded.gzip_body, media_type=encoded.media_type, headers=headers)
+    return Response(content=encoded.body, media_type=encoded.media_type, headers=headers)
+
+
+def negotiated_response(request: Request, obj, to_msgpack=None):
+    """不缓存的接口按 Accept 编码；``to_msgpack`` 可把对象转换为 msgpack 专用的结构 (如按列存放的台词)"""
+    media_type = preferred_media_type(request)
+    if media_type == MSGPACK_MEDIA_TYPE and to_msgpack is not None:
+        obj = to_msgpack(obj)
+    return Response(content=encode(obj, media_type), media_type=media_type, headers={"Vary": "Accept"})
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Import a plain-text or Markdown screenplay ("角色：台词" per line) as a new story
+
+Usage:
+    python -m api.import_script play.md [--title 标题] [--description 描述]
+"""
+
+import argparse
+import time
+
+from api.db import close_pool
+from api.services.import_service import import_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a screenplay as a new story")
+    parser.add_argument("path", help="UTF-8 纯文本或 Markdown 文件")
+    parser.add_argument("--title", help="剧本标题，默认取文件中的第一个 # 标题")
+    parser.add_argument("--description", default="")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        result = import_file(args.path, args.title, args.description)
+    finally:
+        close_pool()
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ Imported {result['lines']} lines as story {result['storyId']} in {elapsed:.2f}s")
+    for key, name in result["roleMap"].items():
+        print(f"  {key}: {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,448 @@ import sqlite3
 import os
 import json
 
-DB_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scriptbuddy.db")
+DB_FILE = os.environ.get("SCRIPTBUDDY_DB_FILE") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scriptbuddy.db"
+)
 
-def init_db():
-    print(f"Initializing SQLite database at: {DB_FILE}")
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
+# --- Seed data ---
+
+SEED_CONFIGS = [
+    ('asr', 'appId', '5349866810'),
+    ('asr', 'token', 'j_DA2hGKCvrytiS1fM-1jN5Cqz6Mxpx3'),
+    ('asr', 'secret', '1oJHD2KkFJTMbLgPIx4fAR9XS7qGZNM7'),
+    ('asr', 'cluster', 'volc_auction_streaming_2.0'),
+    ('tts', 'appId', '5349866810'),
+    ('tts', 'token', 'j_DA2hGKCvrytiS1fM-1jN5Cqz6Mxpx3'),
+    ('tts', 'secret', '1oJHD2KkFJTMbLgPIx4fAR9XS7qGZNM7'),
+    ('tts', 'cluster', 'volcano_tts'),
+    ('tts', 'voiceType', 'zh_male_linjiananhai_moon_bigtts'),
+    ('llm', 'apiKey', 'sk-903a962786f34773a1680f6fb6fad64d'),
+    ('llm', 'baseUrl', 'https://api.deepseek.com')
+]
+
+SEED_STORY = (1, '面试练习：自我介绍', '模拟一场简单的HR面试场景。',
+              json.dumps({"甲": "面试官", "乙": "求职者", "合": "旁白/系统"}, ensure_ascii=False))
+
+# sort_order 以 1024 为间隔，插入时取相邻两行的中点
+SEED_LINES = [
+    (1, '甲', '您好，请先简单做一个自我介绍吧。', 3000, 1024),
+    (1, '乙', '好的。面试官您好，我叫陈驰，是一名全栈工程师。', 4000, 2048),
+    (1, '甲', '我看你的简历上写着熟悉 React 和 PHP？', 3000, 3072),
+    (1, '乙', '是的，我即使在 PHP 5.4 的环境下也能写出现代化的代码。', 4000, 4096),
+    (1, '合', '（面试官露出了满意的微笑）', 2000, 5120),
+    (1, '甲', '很有意思。那我们开始技术测试吧。', 3000, 6144),
+    (1, '乙', '没问题，请出题。', 2000, 7168)
+]
+
+# --- Migrations ---
+# 在基础表之上追加的结构。每个迁移只执行一次，已执行的数量记录在 PRAGMA user_version。
+# 新库由 init_db() 执行全部迁移；旧库在服务进程第一次连接时补齐 (见 api/db.py)。
+
+def _add_line_search(cursor):
+    """script_lines.content 的 FTS5 全文索引 (trigram 分词，支持中文子串/前缀匹配)"""
+    cursor.execute('''
+    CREATE VIRTUAL TABLE script_lines_fts USING fts5(
+        content,
+        content='script_lines',
+        content_rowid='id',
+        tokenize='trigram'
+    )
+    ''')
+    # 由触发器同步，任何写入路径 (单条/批量/导入) 都不会遗漏
+    cursor.execute('''
+    CREATE TRIGGER script_lines_fts_ai AFTER INSERT ON script_lines BEGIN
+        INSERT INTO script_lines_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER script_lines_fts_ad AFTER DELETE ON script_lines BEGIN
+        INSERT INTO script_lines_fts(script_lines_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER script_lines_fts_au AFTER UPDATE OF content ON script_lines BEGIN
+        INSERT INTO script_lines_fts(script_lines_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO script_lines_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    ''')
+    cursor.execute("INSERT INTO script_lines_fts(script_lines_fts) VALUES ('rebuild')")
+
+
+def _add_story_stats(cursor):
+    """剧本目录用的冗余统计：台词数、总时长、各角色台词数，由触发器维护"""
+    cursor.execute("ALTER TABLE script_stories ADD COLUMN line_count INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE script_stories ADD COLUMN total_duration_ms INTEGER NOT NULL DEFAULT 0")
+    cursor.execute('''
+    CREATE TABLE script_story_roles (
+        story_id INTEGER NOT NULL,
+        role_key VARCHAR(50) NOT NULL,
+        line_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (story_id, role_key)
+    ) WITHOUT ROWID
+    ''')
+    # 目录按 (created_at, id) 键集分页
+    cursor.execute('CREATE INDEX idx_story_created ON script_stories(created_at, id)')
+
+    cursor.execute('''
+    CREATE TRIGGER script_lines_stats_ai AFTER INSERT ON script_lines BEGIN
+        UPDATE script_stories
+           SET line_count = line_count + 1, total_duration_ms = total_duration_ms + COALESCE(new.duration_ms, 0)
+         WHERE id = new.story_id;
+        INSERT INTO script_story_roles (story_id, role_key, line_count) VALUES (new.story_id, new.role_key, 1)
+            ON CONFLICT (story_id, role_key) DO UPDATE SET line_count = line_count + 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER script_lines_stats_ad AFTER DELETE ON script_lines BEGIN
+        UPDATE script_stories
+           SET line_count = line_count - 1, total_duration_ms = total_duration_ms - COALESCE(old.duration_ms, 0)
+         WHERE id = old.story_id;
+        UPDATE script_story_roles SET line_count = line_count - 1
+         WHERE story_id = old.story_id AND role_key = old.role_key;
+        DELETE FROM script_story_roles
+         WHERE story_id = old.story_id AND role_key = old.role_key AND line_count <= 0;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER script_lines_stats_au AFTER UPDATE OF story_id, role_key, duration_ms ON script_lines BEGIN
+        UPDATE script_stories
+           SET line_count = line_count - 1, total_duration_ms = total_duration_ms - COALESCE(old.duration_ms, 0)
+         WHERE id = old.story_id;
+        UPDATE script_stories
+           SET line_count = line_count + 1, total_duration_ms = total_duration_ms + COALESCE(new.duration_ms, 0)
+         WHERE id = new.story_id;
+        UPDATE script_story_roles SET line_count = line_count - 1
+         WHERE story_id = old.story_id AND role_key = old.role_key;
+        INSERT INTO script_story_roles (story_id, role_key, line_count) VALUES (new.story_id, new.role_key, 1)
+            ON CONFLICT (story_id, role_key) DO UPDATE SET line_count = line_count + 1;
+        DELETE FROM script_story_roles
+         WHERE story_id = old.story_id AND role_key = old.role_key AND line_count <= 0;
+    END
+    ''')
+
+    # 回填已有数据
+    cursor.execute('''
+    UPDATE script_stories SET
+        line_count = (SELECT COUNT(*) FROM script_lines WHERE story_id = script_stories.id),
+        total_duration_ms = (SELECT COALESCE(SUM(duration_ms), 0) FROM script_lines WHERE story_id = script_stories.id)
+    ''')
+    cursor.execute('''
+    INSERT INTO script_story_roles (story_id, role_key, line_count)
+    SELECT story_id, role_key, COUNT(*) FROM script_lines GROUP BY story_id, role_key
+    ''')
+
+
+def _add_change_log(cursor):
+    """台词变更日志：每次 ScriptService 写入使剧本 revision +1，并记录受影响的台词"""
+    cursor.execute("ALTER TABLE script_stories ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+    # 日志只覆盖 revision > change_floor 的变更，更早的已被整理掉
+    cursor.execute("ALTER TABLE script_stories ADD COLUMN change_floor INTEGER NOT NULL DEFAULT 0")
+    cursor.execute('''
+    CREATE TABLE script_changes (
+        story_id INTEGER NOT NULL,
+        revision INTEGER NOT NULL,
+        line_id INTEGER NOT NULL,
+        op VARCHAR(10) NOT NULL,
+        PRIMARY KEY (story_id, revision, line_id)
+    ) WITHOUT ROWID
+    ''')
+
+
+def _add_bulk_load_guard(cursor):
+    """批量导入时跳过逐行维护全文索引和统计的触发器，改为导入结束后一次性补齐"""
+    # 导入期间登记 story_id，导入完成或失败清理时删除
+    cursor.execute('CREATE TABLE script_bulk_loads (story_id INTEGER PRIMARY KEY)')
+    guard = "WHEN NOT EXISTS (SELECT 1 FROM script_bulk_loads WHERE story_id = new.story_id)"
+    cursor.execute('DROP TRIGGER script_lines_fts_ai')
+    cursor.execute(f'''
+    CREATE TRIGGER script_lines_fts_ai AFTER INSERT ON script_lines {guard} BEGIN
+        INSERT INTO script_lines_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    ''')
+    cursor.execute('DROP TRIGGER script_lines_stats_ai')
+    cursor.execute(f'''
+    CREATE TRIGGER script_lines_stats_ai AFTER INSERT ON script_lines {guard} BEGIN
+        UPDATE script_stories
+           SET line_count = line_count + 1, total_duration_ms = total_duration_ms + COALESCE(new.duration_ms, 0)
+         WHERE id = new.story_id;
+        INSERT INTO script_story_roles (story_id, role_key, line_count) VALUES (new.story_id, new.role_key, 1)
+            ON CONFLICT (story_id, role_key) DO UPDATE SET line_count = line_count + 1;
+    END
+    ''')
+
+
+# 台词拆成的短片段：每个位置起的 1 个字和 2 个字，ASCII 字母转小写。
+# 1~2 字词都是等值查找；主键 (gram, story_id, sort_order, line_id) 与结果顺序一致，LIMIT 可以提前结束。
+# 参数化 where 供迁移回填和导入结束后补齐共用
+FILL_LINE_GRAMS = '''
+INSERT OR IGNORE INTO script_line_grams (gram, story_id, sort_order, line_id)
+WITH RECURSIVE pos(n) AS (
+    SELECT 1 UNION ALL
+    SELECT n + 1 FROM pos WHERE n < (SELECT max(length(content)) FROM script_lines l WHERE {where})
+)
+SELECT lower(substr(l.content, pos.n, k.k)), l.story_id, l.sort_order, l.id
+  FROM script_lines l JOIN pos ON pos.n <= length(l.content)
+       CROSS JOIN (SELECT 1 AS k UNION ALL SELECT 2) k
+ WHERE {where}
+'''
+
+
+def _content_grams(row):
+    # 触发器里不能直接用 WITH，放进子查询
+    return f'''
+    SELECT lower(substr({row}.content, n, k)) AS gram FROM (
+        WITH RECURSIVE pos(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM pos WHERE n < length({row}.content))
+        SELECT n FROM pos WHERE n <= length({row}.content)
+    ) CROSS JOIN (SELECT 1 AS k UNION ALL SELECT 2)'''
+
+
+def _add_short_term_search(cursor):
+    """1~2 字检索词的索引：trigram 索引不到的短片段单独建表，避免 LIKE 全表扫描"""
+    # 最初的结构，由 _order_short_term_search 重建
+    cursor.execute('''
+    CREATE TABLE script_line_grams (
+        gram TEXT NOT NULL,
+        story_id INTEGER NOT NULL,
+        line_id INTEGER NOT NULL,
+        PRIMARY KEY (gram, story_id, line_id)
+    ) WITHOUT ROWID
+    ''')
+
+
+def _order_short_term_search(cursor):
+    """片段表按结果顺序 (story_id, sort_order) 建主键，并单独存 1 字片段：短词检索不用再排序、去重"""
+    for trigger in ("script_line_grams_ai", "script_line_grams_ad", "script_line_grams_au"):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    cursor.execute('DROP TABLE script_line_grams')
+    cursor.execute('''
+    CREATE TABLE script_line_grams (
+        gram TEXT NOT NULL,
+        story_id INTEGER NOT NULL,
+        sort_order INTEGER NOT NULL,
+        line_id INTEGER NOT NULL,
+        PRIMARY KEY (gram, story_id, sort_order, line_id)
+    ) WITHOUT ROWID
+    ''')
+    guard = "WHEN NOT EXISTS (SELECT 1 FROM script_bulk_loads WHERE story_id = new.story_id)"
+    delete_old = f'''
+        DELETE FROM script_line_grams
+         WHERE gram IN ({_content_grams("old")})
+           AND story_id = old.story_id AND sort_order = old.sort_order AND line_id = old.id;'''
+    insert_new = f'''
+        INSERT OR IGNORE INTO script_line_grams (gram, story_id, sort_order, line_id)
+            SELECT gram, new.story_id, new.sort_order, new.id FROM ({_content_grams("new")});'''
+    cursor.execute(f'CREATE TRIGGER script_line_grams_ai AFTER INSERT ON script_lines {guard} BEGIN {insert_new} END')
+    cursor.execute(f'CREATE TRIGGER script_line_grams_ad AFTER DELETE ON script_lines BEGIN {delete_old} END')
+    # 移动台词 (改 sort_order) 同样要改写片段
+    cursor.execute(
+        f'CREATE TRIGGER script_line_grams_au AFTER UPDATE OF story_id, content, sort_order ON script_lines '
+        f'BEGIN {delete_old} {insert_new} END'
+    )
+    cursor.execute(FILL_LINE_GRAMS.format(where="1"))
+
+
+def _fill_story_created_at(cursor):
+    """created_at 为 NULL 的剧本会从目录的 (created_at, id) 键集分页里漏掉：已有的补为最早时间 (排序位置不变)，
+    之后写入的 NULL 由触发器改为当前时间"""
+    cursor.execute("UPDATE script_stories SET created_at = '1970-01-01 00:00:00' WHERE created_at IS NULL")
+    cursor.execute('''
+    CREATE TRIGGER script_stories_created_ai AFTER INSERT ON script_stories WHEN new.created_at IS NULL BEGIN
+        UPDATE script_stories SET created_at = CURRENT_TIMESTAMP WHERE id = new.id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER script_stories_created_au AFTER UPDATE OF created_at ON script_stories
+    WHEN new.created_at IS NULL BEGIN
+        UPDATE script_stories SET created_at = CURRENT_TIMESTAMP WHERE id = new.id;
+    END
+    ''')
+
+
+MIGRATIONS = [
+    _add_line_search,
+    _add_story_stats,
+    _add_change_log,
+    _add_bulk_load_guard,
+    _add_short_term_search,
+    _order_short_term_search,
+    _fill_story_created_at,
+]
+
+
+def migrate(conn):
+    """Apply pending migrations to an initialized database. Safe to call repeatedly."""
+    cursor = conn.cursor()
+    has_base = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'script_lines'"
+    ).fetchone()
+    if not has_base:
+        return  # 尚未执行 init_db
+    if cursor.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+        return
+
+    # 写锁内再读一次版本号，避免多个进程重复执行
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for index in range(version, len(MIGRATIONS)):
+            print(f"Applying migration {index + 1}: {MIGRATIONS[index].__name__}")
+            MIGRATIONS[index](cursor)
+        cursor.execute(f"PRAGMA user_version = {max(version, len(MIGRATIONS))}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# --- MySQL ---
+# MySQL 后端直接建出与 SQLite 全部迁移之后等价的结构 (api/db.py 中的 MySQLBackend)。
+# 之后新增的迁移需要同时在这里补上对应的 DDL。
+# - script_lines_fts 由 content 列上的 ngram FULLTEXT 索引代替 (MariaDB 不支持时退化为 LIKE 检索)
+# - 不建 script_line_grams：ngram 默认按 2 字切分，2 字词直接走 FULLTEXT，只有 1 字词走 LIKE
+# - 外键与 SQLite 一致只作说明，不强制
+
+MYSQL_TABLES = ["script_bulk_loads", "script_changes", "script_story_roles", "script_lines", "script_stories", "script_configs"]
+
+MYSQL_SCHEMA = [
+    """
+    CREATE TABLE script_configs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        category VARCHAR(50) NOT NULL DEFAULT '',
+        key_name VARCHAR(50) NOT NULL DEFAULT '',
+        value VARCHAR(500) NOT NULL DEFAULT '',
+        UNIQUE KEY uk_category_key (category, key_name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE script_stories (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        title VARCHAR(100) NOT NULL DEFAULT '',
+        description VARCHAR(255) DEFAULT '',
+        role_map_json TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        line_count INT NOT NULL DEFAULT 0,
+        total_duration_ms BIGINT NOT NULL DEFAULT 0,
+        revision BIGINT NOT NULL DEFAULT 0,
+        change_floor BIGINT NOT NULL DEFAULT 0,
+        KEY idx_story_created (created_at, id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE script_lines (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        story_id INT NOT NULL,
+        role_key VARCHAR(50) NOT NULL DEFAULT '',
+        content TEXT NOT NULL,
+        duration_ms INT DEFAULT 3000,
+        sort_order BIGINT NOT NULL DEFAULT 0,
+        KEY idx_story_order (story_id, sort_order)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE script_story_roles (
+        story_id INT NOT NULL,
+        role_key VARCHAR(50) NOT NULL,
+        line_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (story_id, role_key)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE script_changes (
+        story_id INT NOT NULL,
+        revision BIGINT NOT NULL,
+        line_id BIGINT NOT NULL,
+        op VARCHAR(10) NOT NULL,
+        PRIMARY KEY (story_id, revision, line_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    "CREATE TABLE script_bulk_loads (story_id INT PRIMARY KEY) ENGINE=InnoDB",
+    """
+    CREATE TRIGGER script_lines_stats_ai AFTER INSERT ON script_lines FOR EACH ROW
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM script_bulk_loads WHERE story_id = NEW.story_id) THEN
+            UPDATE script_stories
+               SET line_count = line_count + 1, total_duration_ms = total_duration_ms + COALESCE(NEW.duration_ms, 0)
+             WHERE id = NEW.story_id;
+            INSERT INTO script_story_roles (story_id, role_key, line_count) VALUES (NEW.story_id, NEW.role_key, 1)
+                ON DUPLICATE KEY UPDATE line_count = line_count + 1;
+        END IF;
+    END
+    """,
+    """
+    CREATE TRIGGER script_lines_stats_ad AFTER DELETE ON script_lines FOR EACH ROW
+    BEGIN
+        UPDATE script_stories
+           SET line_count = line_count - 1, total_duration_ms = total_duration_ms - COALESCE(OLD.duration_ms, 0)
+         WHERE id = OLD.story_id;
+        UPDATE script_story_roles SET line_count = line_count - 1
+         WHERE story_id = OLD.story_id AND role_key = OLD.role_key;
+        DELETE FROM script_story_roles
+         WHERE story_id = OLD.story_id AND role_key = OLD.role_key AND line_count <= 0;
+    END
+    """,
+    # MySQL 没有 UPDATE OF 列名，在触发器体内判断
+    """
+    CREATE TRIGGER script_lines_stats_au AFTER UPDATE ON script_lines FOR EACH ROW
+    BEGIN
+        IF NOT (OLD.story_id <=> NEW.story_id AND OLD.role_key <=> NEW.role_key
+                AND OLD.duration_ms <=> NEW.duration_ms) THEN
+            UPDATE script_stories
+               SET line_count = line_count - 1, total_duration_ms = total_duration_ms - COALESCE(OLD.duration_ms, 0)
+             WHERE id = OLD.story_id;
+            UPDATE script_stories
+               SET line_count = line_count + 1, total_duration_ms = total_duration_ms + COALESCE(NEW.duration_ms, 0)
+             WHERE id = NEW.story_id;
+            UPDATE script_story_roles SET line_count = line_count - 1
+             WHERE story_id = OLD.story_id AND role_key = OLD.role_key;
+            INSERT INTO script_story_roles (story_id, role_key, line_count) VALUES (NEW.story_id, NEW.role_key, 1)
+                ON DUPLICATE KEY UPDATE line_count = line_count + 1;
+            DELETE FROM script_story_roles
+             WHERE story_id = OLD.story_id AND role_key = OLD.role_key AND line_count <= 0;
+        END IF;
+    END
+    """,
+]
+
+MYSQL_FULLTEXT = "ALTER TABLE script_lines ADD FULLTEXT INDEX ft_script_lines_content (content) WITH PARSER ngram"
+
+
+def init_mysql(conn):
+    """在 ``conn`` (api.db.MySQLConnection) 所连的库中重建全部表并写入演示数据"""
+    import mysql.connector
+
+    print("Initializing MySQL database...")
+    for table in MYSQL_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    for statement in MYSQL_SCHEMA:
+        conn.execute(statement)
+    try:
+        conn.execute(MYSQL_FULLTEXT)
+    except mysql.connector.Error as e:
+        print(f"FULLTEXT index not created, search falls back to LIKE: {e}")
+
+    conn.executemany("INSERT INTO script_configs (category, key_name, value) VALUES (?, ?, ?)", SEED_CONFIGS)
+    conn.execute("INSERT INTO script_stories (id, title, description, role_map_json) VALUES (?, ?, ?, ?)", SEED_STORY)
+    conn.executemany(
+        "INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES (?, ?, ?, ?, ?)",
+        SEED_LINES
+    )
+    print("✅ Database initialized successfully!")
+
+
+def init_db(db_file=DB_FILE):
+    print(f"Initializing SQLite database at: {db_file}")
+    if os.path.exists(db_file):
+        os.remove(db_file)
         print("Removed existing database")
+    # WAL 模式下的附属文件也要一并清理
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
 
     # 1. Create Tables
@@ -58,47 +491,32 @@ def init_db():
     print("Inserting seed data...")
 
     # Configs
-    configs = [
-        ('asr', 'appId', '5349866810'),
-        ('asr', 'token', 'j_DA2hGKCvrytiS1fM-1jN5Cqz6Mxpx3'),
-        ('asr', 'secret', '1oJHD2KkFJTMbLgPIx4fAR9XS7qGZNM7'),
-        ('asr', 'cluster', 'volc_auction_streaming_2.0'),
-        ('tts', 'appId', '5349866810'),
-        ('tts', 'token', 'j_DA2hGKCvrytiS1fM-1jN5Cqz6Mxpx3'),
-        ('tts', 'secret', '1oJHD2KkFJTMbLgPIx4fAR9XS7qGZNM7'),
-        ('tts', 'cluster', 'volcano_tts'),
-        ('tts', 'voiceType', 'zh_male_linjiananhai_moon_bigtts'),
-        ('llm', 'apiKey', 'sk-903a962786f34773a1680f6fb6fad64d'),
-        ('llm', 'baseUrl', 'https://api.deepseek.com')
-    ]
-    cursor.executemany("INSERT INTO script_configs (category, key_name, value) VALUES (?, ?, ?)", configs)
+    cursor.executemany("INSERT INTO script_configs (category, key_name, value) VALUES (?, ?, ?)", SEED_CONFIGS)
 
     # Story
-    cursor.execute(
-        "INSERT INTO script_stories (id, title, description, role_map_json) VALUES (?, ?, ?, ?)",
-        (1, '面试练习：自我介绍', '模拟一场简单的HR面试场景。',
-         json.dumps({"甲": "面试官", "乙": "求职者", "合": "旁白/系统"}, ensure_ascii=False))
-    )
+    cursor.execute("INSERT INTO script_stories (id, title, description, role_map_json) VALUES (?, ?, ?, ?)", SEED_STORY)
 
     # Lines
-    lines = [
-        (1, '甲', '您好，请先简单做一个自我介绍吧。', 3000, 1),
-        (1, '乙', '好的。面试官您好，我叫陈驰，是一名全栈工程师。', 4000, 2),
-        (1, '甲', '我看你的简历上写着熟悉 React 和 PHP？', 3000, 3),
-        (1, '乙', '是的，我即使在 PHP 5.4 的环境下也能写出现代化的代码。', 4000, 4),
-        (1, '合', '（面试官露出了满意的微笑）', 2000, 5),
-        (1, '甲', '很有意思。那我们开始技术测试吧。', 3000, 6),
-        (1, '乙', '没问题，请出题。', 2000, 7)
-    ]
     cursor.executemany(
         "INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES (?, ?, ?, ?, ?)",
-        lines
+        SEED_LINES
     )
 
     conn.commit()
+
+    # 3. Apply migrations
+    migrate(conn)
     conn.close()
     print("✅ Database initialized successfully!")
-    print(f"Database location: {DB_FILE}")
+    print(f"Database location: {db_file}")
 
 if __name__ == "__main__":
-    init_db()
+    if os.environ.get("SCRIPTBUDDY_DB_BACKEND") == "mysql":
+        from api.db import MySQLConnection
+        conn = MySQLConnection()
+        try:
+            init_mysql(conn)
+        finally:
+            conn.close()
+    else:
+        init_db()
@@ -1,17 +1,33 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from api.services.config_service import ConfigService
-from api.services.script_service import ScriptService
+from api.services.script_service import ScriptService, columnar_lines, columnar_script
+from api.services.search_service import SearchService
+from api.services.catalog_service import CatalogService
+from api.services.import_service import ImportService
+from api.services.script_store import script_store
+from api.services.script_events import script_events, encode_event, RESYNC
+from api.db import get_writer
+from api.http_cache import EncodedResponse, cached_response, negotiated_response, preferred_media_type
 from api.proxy.asr_proxy import asr_websocket_endpoint
+from api.proxy.upstream_pool import asr_pool
 from api.proxy.tts_proxy import tts_websocket_endpoint
 
 # ... (omitted)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # 关闭预热的 ASR 上游连接
+    await asr_pool.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # 允许跨域
 app.add_middleware(
@@ -33,6 +49,56 @@ async def ws_asr(websocket: WebSocket):
 async def ws_tts(websocket: WebSocket):
     await tts_websocket_endpoint(websocket)
 
+@app.websocket("/api/ws/script")
+async def ws_script(websocket: WebSocket, id: int = 1, since: int = -1):
+    """订阅剧本的实时修改：先下发 since 之后的增量 (或完整快照)，之后每次写入提交后推送增量"""
+    await websocket.accept()
+    subscription = script_events.subscribe(id)
+    try:
+        # 先订阅再读初始状态，期间提交的写入不会漏掉
+        initial = await ScriptService.get_changes(id, since)
+        if initial is None:
+            await websocket.close(code=4404, reason="Script not found")
+            return
+        script_events.seen(id, initial["revision"])
+        sent = initial["revision"]
+        await websocket.send_text(encode_event(dict(initial, type="changes")))
+
+        async def push():
+            nonlocal sent
+            while True:
+                item = await subscription.get()
+                if item is RESYNC:
+                    # 积压过多被丢弃，补发一次合并后的增量
+                    event = await ScriptService.get_changes(id, sent)
+                    if event is None:
+                        return
+                    revision, text = event["revision"], encode_event(dict(event, type="changes"))
+                else:
+                    revision, text = item
+                if revision <= sent:
+                    continue
+                await websocket.send_text(text)
+                sent = revision
+
+        async def receive():
+            # 客户端不需要发送消息，只用来感知断开
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+
+        tasks = [asyncio.create_task(push()), asyncio.create_task(receive())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if not task.cancelled() and task.exception() is not None and \
+                    not isinstance(task.exception(), WebSocketDisconnect):
+                print(f"Script subscription error: {task.exception()}")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        script_events.unsubscribe(subscription)
+
 # 允许跨域
 app.add_middleware(
     CORSMiddleware,
@@ -44,17 +110,76 @@ app.add_middleware(
 
 # --- Config API ---
 @app.get("/api/config")
-async def get_config():
-    """下发给前端的配置 (仅 LLM)"""
-    return ConfigService.get_public_config()
+async def get_config(request: Request):
+    """下发给前端的配置 (仅 LLM)，支持 If-None-Match"""
+    return cached_response(request, await ConfigService.get_public_response())
 
 # --- Script API ---
 @app.get("/api/script")
-async def get_script(id: int = 1):
-    script = ScriptService.get_script_by_id(id)
-    if not script:
+async def get_script(request: Request, id: int = 1):
+    # 命中缓存时直接比较 ETag / 下发预编码字节，不访问数据库也不重新编码 JSON
+    encoded = await ScriptService.get_script_response(id, preferred_media_type(request))
+    if encoded is None:
+        raise HTTPException(status_code=404, detail="Script not found")
+    return cached_response(request, encoded, vary="Accept, Accept-Encoding")
+
+@app.get("/api/stories")
+async def list_stories(request: Request, cursor: Optional[str] = None, limit: int = 20):
+    """剧本目录，按创建时间倒序键集分页"""
+    try:
+        return negotiated_response(request, await CatalogService.list_stories(cursor, limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/scripts")
+async def get_scripts(request: Request, ids: str):
+    """批量读取多个剧本：ids=1,2,3，返回 {story_id: script}，不存在的剧本不出现在结果中"""
+    try:
+        story_ids = [int(part) for part in ids.split(",") if part.strip()]
+        if not story_ids:
+            raise ValueError("ids is empty")
+        scripts = await ScriptService.get_scripts_by_ids(story_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return negotiated_response(
+        request, scripts, lambda scripts: {story_id: columnar_script(s) for story_id, s in scripts.items()}
+    )
+
+@app.get("/api/script/lines")
+async def get_script_lines(request: Request, id: int = 1, cursor: Optional[str] = None, limit: int = 200):
+    """键集分页读取台词，用返回的 nextCursor 请求下一页"""
+    if await ScriptService.get_story_meta(id) is None:
+        raise HTTPException(status_code=404, detail="Script not found")
+    try:
+        page = await ScriptService.get_lines_page(id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return negotiated_response(request, page, lambda page: dict(page, lines=columnar_lines(page["lines"])))
+
+@app.get("/api/script/stream")
+async def stream_script(id: int = 1):
+    """NDJSON 流式下发剧本，客户端收到首批台词即可开始练习"""
+    if await ScriptService.get_story_meta(id) is None:
+        raise HTTPException(status_code=404, detail="Script not found")
+    return StreamingResponse(ScriptService.iter_script_ndjson(id), media_type="application/x-ndjson")
+
+@app.get("/api/script/changes")
+async def get_script_changes(since: int, id: int = 1):
+    """自 revision ``since`` 以来的增量；日志已被整理时返回完整快照 (full=true)"""
+    changes = await ScriptService.get_changes(id, since)
+    if changes is None:
         raise HTTPException(status_code=404, detail="Script not found")
-    return script
+    return changes
+
+# --- Search API ---
+@app.get("/api/search")
+async def search_lines(q: str, story_id: Optional[int] = None, limit: int = 20):
+    """按内容检索台词 (可限定剧本)，结果按相关度排序"""
+    try:
+        results = await SearchService.search_lines(q, story_id, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results}
 
 # --- Admin API (Simple) ---
 class ScriptLineModel(BaseModel):
@@ -64,26 +189,101 @@ class ScriptLineModel(BaseModel):
     role: Optional[str] = None
     content: Optional[str] = None
     duration: Optional[int] = 3000
-    sort: Optional[int] = 0
+    sort: Optional[int] = None       # 显式排序键；一般留空，由服务端分配
+    after_id: Optional[int] = None   # 插入/移动到该台词之后，0 表示最前
+
+class ScriptBatchModel(BaseModel):
+    story_id: int = 1
+    ops: List[ScriptLineModel]
+
+ADMIN_TEMPLATE = os.path.join(os.path.dirname(__file__), "templates/admin.html")
+_admin_page = None
 
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_page():
-    # Load HTML directly
-    with open(os.path.join(os.path.dirname(__file__), "templates/admin.html"), "r") as f:
-        return f.read()
+async def admin_page(request: Request):
+    # 页面只在第一次访问时读取并编码 (含 ETag / gzip)，修改模板后需重启服务
+    global _admin_page
+    if _admin_page is None:
+        with open(ADMIN_TEMPLATE, "rb") as f:
+            _admin_page = EncodedResponse(f.read(), "text/html; charset=utf-8")
+    return cached_response(request, _admin_page)
+
+@app.get("/api/admin/lines")
+async def admin_lines(request: Request, id: int = 1, offset: int = 0, limit: int = 200):
+    """按行号读取一段台词 (后台编辑器按可见区域取数)，返回 {meta, revision, total, offset, lines}"""
+    try:
+        page = await ScriptService.get_lines_range(id, offset, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Script not found")
+    return negotiated_response(request, page, lambda page: dict(page, lines=columnar_lines(page["lines"])))
 
 @app.post("/api/admin")
 async def admin_action(data: ScriptLineModel):
-    # TODO: Implement admin logic in ScriptService
     if data.action == "add":
-        ScriptService.add_line(data)
+        try:
+            new_id = await ScriptService.add_line(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"status": "ok", "id": new_id}
     elif data.action == "update":
-        ScriptService.update_line(data)
+        try:
+            updated = await ScriptService.update_line(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if updated is None:
+            raise HTTPException(status_code=404, detail="Line not found")
     elif data.action == "delete":
         if data.id:
-            ScriptService.delete_line(data.id)
+            if await ScriptService.delete_line(data.id) is None:
+                raise HTTPException(status_code=404, detail="Line not found")
+    elif data.action == "move":
+        if data.id is None or data.after_id is None:
+            raise HTTPException(status_code=400, detail="move requires id and after_id")
+        try:
+            moved = await ScriptService.move_line(data.story_id, data.id, data.after_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if moved is None:
+            raise HTTPException(status_code=404, detail="Line not found")
+    return {"status": "ok"}
+
+@app.get("/api/admin/stats")
+async def admin_stats():
+    """缓存命中率与写队列统计"""
+    writer = get_writer()
+    return {
+        "scriptStore": script_store.stats(),
+        "writer": {"commits": writer.commits, "operations": writer.operations},
+        "subscriptions": script_events.stats(),
+        "asrPool": asr_pool.stats()
+    }
+
+@app.post("/api/admin/import")
+async def admin_import(request: Request, title: Optional[str] = None, description: str = ""):
+    """导入 "角色：台词" 格式的纯文本/Markdown 剧本 (请求体为 UTF-8 文本)，创建一个新剧本"""
+    try:
+        result = await ImportService.import_upload(request.stream(), title, description)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "ok", **result}
+
+@app.post("/api/admin/config/reload")
+async def admin_reload_config():
+    """凭证更新后立即刷新配置快照"""
+    await ConfigService.reload()
     return {"status": "ok"}
 
+@app.post("/api/admin/batch")
+async def admin_batch(data: ScriptBatchModel):
+    """按顺序原子执行多条台词编辑，返回每个操作对应的台词 ID"""
+    try:
+        ids = await ScriptService.apply_batch(data.story_id, data.ops)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "ok", "ids": ids}
+
 
 if __name__ == "__main__":
     import uvicorn
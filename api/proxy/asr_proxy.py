@@ -1,171 +1,126 @@
 import asyncio
 import json
-import struct
 import logging
-import uuid
-import gzip
-import websockets
+import os
 from fastapi import WebSocket, WebSocketDisconnect
+from api.proxy.protocol import (
+    CompressionBits, MsgType, MsgTypeFlagBits, SerializationBits,
+    build_audio_only_request, build_full_client_request, forward_frame, parse_frame
+)
+from api.proxy.compression import CompressionStats, default_policy
+from api.proxy.inspection import PROXY_LOG_LEVEL, FrameInspector, should_trace
+from api.proxy.upstream_pool import asr_pool
 from api.services.config_service import ConfigService
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("asr_proxy")
-logger.setLevel(logging.DEBUG)
+logger.setLevel(PROXY_LOG_LEVEL)
 
-# VolcEngine Binary Protocol Constants
-class MsgType:
-    FullClientRequest = 0b0001
-    AudioOnlyClient = 0b0010
-    FullServerResponse = 0b1001
-    AudioOnlyServer = 0b1011
-    Error = 0b1111
+# 浏览器的音频帧已是上游可接受的格式 (Raw，未压缩或 gzip) 时只改写头部和 sequence，
+# 载荷原样转发；关闭后退回解压再按压缩策略重新编码的路径
+AUDIO_PASSTHROUGH = os.environ.get("SCRIPTBUDDY_ASR_AUDIO_PASSTHROUGH", "1") != "0"
+PASSTHROUGH_COMPRESSIONS = (CompressionBits.None_, CompressionBits.Gzip)
 
-class MsgTypeFlag:
-    NoSeq = 0b0000
-    PositiveSeq = 0b0001
-    NegativeSeq = 0b0010
-    NegativeSeqLast = 0b0011
 
-class SerializationType:
-    Raw = 0b0000
-    JSON = 0b0001
+async def relay_client_frame(data: bytes, frame_no: int, stats: CompressionStats,
+                             passthrough: bool = None, policy=default_policy):
+    """Turn one frame from the browser into the frame sent to VolcEngine.
 
-class CompressionType:
-    NoCompression = 0b0000
-    Gzip = 0b0001
-
-
-def build_full_client_request(payload_bytes: bytes, use_compression: bool = True) -> bytes:
-    """Build a FullClientRequest frame for ASR.
-
-    Frame format for FullClientRequest with NoSeq flag:
-    - Header (4 bytes)
-    - Payload Size (4 bytes, big endian)
-    - Payload (variable, optionally compressed)
-    """
-    # Compress payload if requested
-    if use_compression:
-        payload_bytes = gzip.compress(payload_bytes)
-        compression = CompressionType.Gzip
-    else:
-        compression = CompressionType.NoCompression
-
-    header = bytes([
-        0x11,  # version=1, headerSize=1
-        (MsgType.FullClientRequest << 4) | MsgTypeFlag.NoSeq,
-        (SerializationType.JSON << 4) | compression,
-        0x00
-    ])
-    payload_size = struct.pack(">I", len(payload_bytes))
-    return header + payload_size + payload_bytes
-
-
-def build_audio_only_request(audio_data: bytes, sequence: int, is_last: bool, use_compression: bool = True) -> bytes:
-    """Build an AudioOnlyClient frame for ASR.
-
-    Frame format for AudioOnlyClient with sequence:
-    - Header (4 bytes)
-    - Sequence (4 bytes, signed int, big endian) - negative if last
-    - Payload Size (4 bytes, big endian)
-    - Payload (audio data, optionally compressed)
+    Frames that cannot be parsed are returned unchanged. Payloads that have to
+    be re-encoded are (de)compressed according to ``policy``.
     """
-    # Compress audio data if requested
-    if use_compression:
-        audio_data = gzip.compress(audio_data)
-        compression = CompressionType.Gzip
-    else:
-        compression = CompressionType.NoCompression
-
-    flag = MsgTypeFlag.NegativeSeqLast if is_last else MsgTypeFlag.PositiveSeq
-
-    header = bytes([
-        0x11,
-        (MsgType.AudioOnlyClient << 4) | flag,
-        (SerializationType.Raw << 4) | compression,
-        0x00
-    ])
-
-    seq_value = -sequence if is_last else sequence
-    seq_bytes = struct.pack(">i", seq_value)
-    payload_size = struct.pack(">I", len(audio_data))
-
-    return header + seq_bytes + payload_size + audio_data
-
-
-def parse_client_frame(data: bytes) -> tuple:
-    """Parse incoming frame from browser client.
-
-    Returns: (msg_type, flags, payload_or_audio, sequence)
-    """
-    if len(data) < 8:
-        logger.warning(f"Frame too short: {len(data)} bytes")
-        return (None, None, None, 0)
-
-    header = data[0:4]
-    version = (header[0] >> 4) & 0x0F
-    header_size = header[0] & 0x0F
-    msg_type = (header[1] >> 4) & 0x0F
-    flags = header[1] & 0x0F
-    serialization = (header[2] >> 4) & 0x0F
-    compression = header[2] & 0x0F
-
-    logger.debug(f"🎤 [ASR] Frame: version={version}, headerSize={header_size}, msgType={msg_type}, flags={flags}, serialization={serialization}, compression={compression}")
-
-    actual_header_size = header_size * 4
-    cursor = actual_header_size
-
-    sequence = 0
-    # For FullClientRequest with NoSeq (flags=0), NO sequence field
-    # For AudioOnly with PositiveSeq/NegativeSeq, read sequence
-    if flags in [MsgTypeFlag.PositiveSeq, MsgTypeFlag.NegativeSeq, MsgTypeFlag.NegativeSeqLast]:
-        if len(data) < cursor + 4:
-            logger.warning("Frame too short for sequence")
-            return (None, None, None, 0)
-        sequence = struct.unpack(">i", data[cursor:cursor+4])[0]
-        cursor += 4
-        logger.debug(f"🎤 [ASR] Sequence: {sequence}")
-
-    if len(data) < cursor + 4:
-        logger.warning("Frame too short for payload size")
-        return (None, None, None, 0)
-
-    payload_size = struct.unpack(">I", data[cursor:cursor+4])[0]
-    cursor += 4
-
-    logger.debug(f"🎤 [ASR] Payload size: {payload_size}, remaining: {len(data) - cursor}")
-
-    if len(data) < cursor + payload_size:
-        logger.warning(f"Frame too short for payload: expected {payload_size}, got {len(data) - cursor}")
-        return (None, None, None, 0)
+    if passthrough is None:
+        passthrough = AUDIO_PASSTHROUGH
+    try:
+        frame = parse_frame(data)
+    except ValueError as e:
+        logger.warning("🎤 [ASR Proxy] Could not parse frame (%s), forwarding as-is (raw=%d bytes)", e, len(data))
+        return data
 
-    payload_bytes = data[cursor:cursor+payload_size]
+    logger.debug("🎤 [ASR Proxy] Frame #%d: %s", frame_no, frame)
 
-    # Decompress if needed
-    if compression == CompressionType.Gzip:
+    if frame.type == MsgType.FullClientRequest:
         try:
-            payload_bytes = gzip.decompress(payload_bytes)
-            logger.debug(f"🎤 [ASR] Decompressed payload: {len(payload_bytes)} bytes")
+            payload = await policy.frame_data(frame, stats)
+            json.loads(bytes(payload))
         except Exception as e:
-            logger.error(f"🎤 [ASR] Failed to decompress: {e}")
-            return (None, None, None, 0)
-
-    if msg_type == MsgType.FullClientRequest:
-        # JSON payload
-        try:
-            payload = json.loads(payload_bytes.decode('utf-8'))
-            logger.debug(f"🎤 [ASR] Parsed FullClientRequest JSON: {list(payload.keys())}")
-            return (msg_type, flags, payload, sequence)
-        except json.JSONDecodeError as e:
-            logger.error(f"🎤 [ASR] JSON parse error: {e}")
-            logger.debug(f"🎤 [ASR] Raw bytes (first 100): {payload_bytes[:100]}")
-            return (msg_type, flags, None, sequence)
-    elif msg_type == MsgType.AudioOnlyClient:
-        # Audio payload
-        return (msg_type, flags, payload_bytes, sequence)
+            # Payload parsing failed, forward original frame
+            logger.warning("🎤 [ASR Proxy] FullClientRequest with unreadable payload (%s), forwarding as-is", e)
+            return data
+
+        # For ASR v3 API, authentication is done via headers only
+        # No need to inject app credentials into payload
+        new_frame = build_full_client_request(*await policy.compress(payload, stats))
+        logger.debug("🎤 [ASR Proxy] Client → Volc #1: %d bytes (rebuilt)", len(new_frame))
+        return new_frame
+
+    if frame.type == MsgType.AudioOnlyClient:
+        sequence = frame.sequence
+        is_last = frame.is_last or sequence < 0
+        abs_seq = abs(sequence) if sequence != 0 else frame_no
+
+        if (passthrough and frame.serialization == SerializationBits.Raw
+                and frame.compression in PASSTHROUGH_COMPRESSIONS):
+            new_frame = forward_frame(
+                data, frame,
+                MsgTypeFlagBits.NegativeSeq if is_last else MsgTypeFlagBits.PositiveSeq,
+                -abs_seq if is_last else abs_seq
+            )
+        else:
+            # Audio frame - rebuild with correct format
+            audio = await policy.frame_data(frame, stats)
+            payload, compression = await policy.compress(audio, stats, audio=True)
+            new_frame = build_audio_only_request(payload, abs_seq, is_last, compression)
+
+        if frame_no <= 3 or frame_no % 50 == 0:
+            logger.debug("🎤 [ASR Proxy] Client → Volc #%d: %d bytes (audio, last=%s)", frame_no, len(new_frame), is_last)
+        return new_frame
+
+    # Unknown frame type, forward as-is
+    logger.warning("🎤 [ASR Proxy] Unknown frame type %s, forwarding as-is (raw=%d bytes)", frame.type, len(data))
+    return data
+
+
+async def inspect_server_frame(message, frame_no: int, inspector: FrameInspector, stats: CompressionStats,
+                               policy=default_policy):
+    """Decode one upstream frame for logging; the frame itself is forwarded untouched."""
+    if not isinstance(message, bytes):
+        inspector.log("🎤 [ASR Proxy] Volc → Client #%d: text message, %d chars", frame_no, len(message))
+        return
+    try:
+        frame = parse_frame(message)
+        inspector.log("🎤 [ASR] Response #%d: %s", frame_no, frame)
 
-    logger.debug(f"🎤 [ASR] Unknown msg_type: {msg_type}")
-    return (msg_type, flags, payload_bytes, sequence)
+        if frame.type == MsgType.FullServerResponse:
+            if frame.payload:
+                payload_bytes = await policy.frame_data(frame, stats)
+                # Parse JSON and extract recognition result
+                try:
+                    result = json.loads(bytes(payload_bytes)).get("result", {})
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    inspector.log("🎤 [ASR Proxy] Response: %s...",
+                                  bytes(payload_bytes[:200]).decode('utf-8', errors='ignore'))
+                    return
+                text = result.get("text", "")
+                if text and result.get("utterance_end", False):
+                    logger.info("🎤 [ASR] ✅ Final: \"%s\"", text)
+                elif text:
+                    inspector.log("🎤 [ASR] Partial: \"%s\"", text)
+        elif frame.type == MsgType.Error:
+            if frame.payload:
+                error_bytes = await policy.frame_data(frame, stats)
+                error_str = bytes(error_bytes).decode('utf-8', errors='ignore')
+                # Try to parse as JSON for better formatting
+                try:
+                    error_msg = json.loads(error_str).get("message", error_str)
+                except Exception:
+                    error_msg = error_str
+                logger.error("🎤 [ASR Proxy] ❌ Error %d: %s", frame.error_code, error_msg)
+            else:
+                logger.error("🎤 [ASR Proxy] ❌ Error code: %d", frame.error_code)
+    except Exception as parse_err:
+        inspector.log("🎤 [ASR Proxy] Volc → Client #%d: %d bytes (parse failed: %s)", frame_no, len(message), parse_err)
 
 
 async def asr_websocket_endpoint(client_ws: WebSocket):
@@ -173,7 +128,7 @@ async def asr_websocket_endpoint(client_ws: WebSocket):
     logger.info("🎤 [ASR Proxy] Client connected")
 
     # 1. Get Config
-    all_configs = ConfigService.get_all_configs()
+    all_configs = await ConfigService.get_all_configs()
     asr_config = all_configs.get("asr", {})
 
     app_key = asr_config.get("appId")        # V2L_APPID → app_key
@@ -183,38 +138,30 @@ async def asr_websocket_endpoint(client_ws: WebSocket):
     # V2 API works with ACCESS_TOKEN (verified by test)
     access_key = access_token
 
-    logger.info(f"🎤 [ASR Proxy] Config loaded:")
-    logger.info(f"  - appKey: {app_key}")
-    logger.info(f"  - accessKey: {access_key}")
-    logger.info(f"  - cluster: {cluster}")
-    logger.info(f"  - Using V3 API (bigmodel)")
+    logger.info("🎤 [ASR Proxy] Config loaded:")
+    logger.info("  - appKey: %s", app_key)
+    logger.debug("  - accessKey: %.8s...", access_key)
+    logger.info("  - cluster: %s", cluster)
+    logger.info("  - Using V3 API (bigmodel)")
 
     if not (app_key and access_key):
         logger.error("🎤 [ASR Proxy] ❌ Server config missing!")
         await client_ws.close(code=1008, reason="Server Config Missing")
         return
 
-    # 2. Build Headers (matching official demo: sauc_websocket_demo.py)
-    reqid = str(uuid.uuid4())
-    extra_headers = {
-        "X-Api-Resource-Id": "volc.bigasr.sauc.duration",
-        "X-Api-Request-Id": reqid,
-        "X-Api-Access-Key": access_key,
-        "X-Api-App-Key": app_key
-    }
-
-    # Use V3 API endpoint (same as official demo)
-    volc_url = "wss://openspeech.bytedance.com/api/v3/sauc/bigmodel"
-    logger.info(f"🎤 [ASR Proxy] Connecting to VolcEngine: {volc_url}")
-    logger.info(f"🎤 [ASR Proxy] Headers: {extra_headers}")
+    # 2. Take a pre-authenticated upstream connection (headers as in the official demo: sauc_websocket_demo.py)
+    logger.info(f"🎤 [ASR Proxy] Connecting to VolcEngine: {asr_pool.url}")
 
     try:
-        async with websockets.connect(volc_url, additional_headers=extra_headers, max_size=10*1024*1024) as volc_ws:
-            logger.info("🎤 [ASR Proxy] ✓ Connected to VolcEngine")
+        async with asr_pool.connection((app_key, access_key)) as upstream:
+            volc_ws = upstream.ws
+            logger.info(f"🎤 [ASR Proxy] ✓ Connected to VolcEngine (request id {upstream.request_id})")
             
             client_to_volc_count = 0
             client_to_volc_bytes = 0
             volc_to_client_count = 0
+            compression_stats = CompressionStats()
+            inspector = FrameInspector(logger, traced=should_trace(client_ws))
             
             async def client_to_volc():
                 nonlocal client_to_volc_count, client_to_volc_bytes
@@ -224,42 +171,8 @@ async def asr_websocket_endpoint(client_ws: WebSocket):
                         client_to_volc_count += 1
                         client_to_volc_bytes += len(data)
                         
-                        msg_type, flags, payload, sequence = parse_client_frame(data)
-                        
-                        logger.debug(f"🎤 [ASR Proxy] Frame #{client_to_volc_count}: msg_type={msg_type}, flags={flags}, payload_type={type(payload).__name__}")
-                        
-                        if msg_type == MsgType.FullClientRequest:
-                            if isinstance(payload, dict):
-                                # For ASR v3 API, authentication is done via headers only
-                                # No need to inject app credentials into payload
-                                logger.debug(f"🎤 [ASR Proxy] Forwarding FullClientRequest from client")
+                        await volc_ws.send(await relay_client_frame(data, client_to_volc_count, compression_stats))
 
-                                new_payload_bytes = json.dumps(payload).encode('utf-8')
-                                new_frame = build_full_client_request(new_payload_bytes)
-
-                                logger.debug(f"🎤 [ASR Proxy] Client → Volc #1: {len(new_frame)} bytes (rebuilt)")
-                                await volc_ws.send(new_frame)
-                            else:
-                                # Payload parsing failed, forward original frame
-                                logger.warning(f"🎤 [ASR Proxy] FullClientRequest but payload={payload}, forwarding as-is")
-                                await volc_ws.send(data)
-                            
-                        elif msg_type == MsgType.AudioOnlyClient:
-                            # Audio frame - rebuild with correct format
-                            is_last = sequence < 0
-                            abs_seq = abs(sequence) if sequence != 0 else client_to_volc_count
-                            
-                            new_frame = build_audio_only_request(payload, abs_seq, is_last)
-                            
-                            if client_to_volc_count <= 3 or client_to_volc_count % 50 == 0:
-                                logger.debug(f"🎤 [ASR Proxy] Client → Volc #{client_to_volc_count}: {len(new_frame)} bytes (audio, last={is_last})")
-                            
-                            await volc_ws.send(new_frame)
-                        else:
-                            # Unknown frame type, forward as-is
-                            logger.warning(f"🎤 [ASR Proxy] Unknown frame type {msg_type}, forwarding as-is (raw={len(data)} bytes)")
-                            await volc_ws.send(data)
-                            
                 except WebSocketDisconnect:
                     logger.info(f"🎤 [ASR Proxy] Client disconnected. Total: {client_to_volc_count} frames, {client_to_volc_bytes} bytes")
                 except Exception as e:
@@ -272,91 +185,15 @@ async def asr_websocket_endpoint(client_ws: WebSocket):
                 try:
                     async for message in volc_ws:
                         volc_to_client_count += 1
-                        msg_len = len(message) if isinstance(message, bytes) else len(message.encode())
-
-                        # Try to decode and log the response
-                        try:
-                            if isinstance(message, bytes) and len(message) > 8:
-                                header = message[0:4]
-                                msg_type = (header[1] >> 4) & 0x0F
-                                flags = header[1] & 0x0F
-                                serialization = (header[2] >> 4) & 0x0F
-                                compression = header[2] & 0x0F
-
-                                logger.debug(f"🎤 [ASR] Response header: type={msg_type}, flags={flags}, ser={serialization}, comp={compression}, raw={header.hex()}")
-
-                                if msg_type == MsgType.FullServerResponse:
-                                    payload_size = struct.unpack(">I", message[4:8])[0]
-                                    if payload_size > 0 and len(message) >= 8 + payload_size:
-                                        payload_bytes = message[8:8+payload_size]
-
-                                        # Decompress if gzipped
-                                        if compression == CompressionType.Gzip:
-                                            try:
-                                                payload_bytes = gzip.decompress(payload_bytes)
-                                            except:
-                                                pass
-
-                                        payload_str = payload_bytes.decode('utf-8', errors='ignore')
-
-                                        # Parse JSON and extract recognition result
-                                        try:
-                                            resp_json = json.loads(payload_str)
-                                            result = resp_json.get("result", {})
-                                            text = result.get("text", "")
-                                            is_final = result.get("utterance_end", False)
-
-                                            if text:
-                                                if is_final:
-                                                    logger.info(f"🎤 [ASR] ✅ Final: \"{text}\"")
-                                                else:
-                                                    logger.debug(f"🎤 [ASR] Partial: \"{text}\"")
-                                            else:
-                                                logger.debug(f"🎤 [ASR Proxy] Volc → Client #{volc_to_client_count}: {msg_len} bytes")
-                                        except json.JSONDecodeError:
-                                            logger.debug(f"🎤 [ASR Proxy] Response: {payload_str[:200]}...")
-                                elif msg_type == MsgType.Error:
-                                    # Parse error response (format: header + [seq] + error_code + payload_size + payload)
-                                    try:
-                                        cursor = 4  # after header
-                                        # Check if sequence is present (flags & 0x01)
-                                        if flags & 0x01:
-                                            cursor += 4  # skip sequence
-
-                                        error_code = struct.unpack(">i", message[cursor:cursor+4])[0]
-                                        cursor += 4
-                                        error_payload_size = struct.unpack(">I", message[cursor:cursor+4])[0]
-                                        cursor += 4
-
-                                        if error_payload_size > 0 and len(message) >= cursor + error_payload_size:
-                                            error_bytes = message[cursor:cursor+error_payload_size]
-                                            if compression == CompressionType.Gzip:
-                                                try:
-                                                    error_bytes = gzip.decompress(error_bytes)
-                                                except:
-                                                    pass
-                                            error_str = error_bytes.decode('utf-8', errors='ignore')
-                                            # Try to parse as JSON for better formatting
-                                            try:
-                                                error_json = json.loads(error_str)
-                                                error_msg = error_json.get("message", error_str)
-                                                logger.error(f"🎤 [ASR Proxy] ❌ Error {error_code}: {error_msg}")
-                                            except:
-                                                logger.error(f"🎤 [ASR Proxy] ❌ Error {error_code}: {error_str}")
-                                        else:
-                                            logger.error(f"🎤 [ASR Proxy] ❌ Error code: {error_code}")
-                                    except Exception as err_parse:
-                                        logger.error(f"🎤 [ASR Proxy] ❌ Error response: {msg_len} bytes (parse failed: {err_parse})")
-                                else:
-                                    logger.debug(f"🎤 [ASR Proxy] Volc → Client #{volc_to_client_count}: {msg_len} bytes (type={msg_type})")
-                        except Exception as parse_err:
-                            logger.debug(f"🎤 [ASR Proxy] Volc → Client #{volc_to_client_count}: {msg_len} bytes")
-
+                        # 快速路径：原样转发，只有抽样帧、错误帧和跟踪中的会话才解码检查；先转发再检查，不拖慢这一帧
                         await client_ws.send_bytes(message)
+                        if inspector.should_inspect(message):
+                            await inspect_server_frame(message, volc_to_client_count, inspector, compression_stats)
                 except Exception as e:
                     logger.error(f"🎤 [ASR Proxy] ❌ Volc→Client Error: {e}")
                 finally:
                     logger.info(f"🎤 [ASR Proxy] Session ended. Responses from Volc: {volc_to_client_count}")
+                    logger.info(f"🎤 [ASR Proxy] Compression: {compression_stats}")
 
             await asyncio.gather(client_to_volc(), volc_to_client())
 
@@ -0,0 +1,123 @@
+"""Gzip policy for payloads the ASR/TTS proxies re-encode.
+
+Small payloads are sent uncompressed. PCM frames of a few KB barely shrink,
+so the gzip header and CPU cost outweigh the savings. Audio uses a fast
+level, and a session stops compressing audio once it has seen that its
+audio does not compress. Payloads above ``OFFLOAD_MIN_BYTES`` are
+(de)compressed on a small thread pool so a large frame cannot stall the
+event loop that relays every other session. zlib releases the GIL while it
+works.
+"""
+import asyncio
+import gzip
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.proxy.protocol import CompressionBits
+
+COMPRESS_MIN_BYTES = int(os.environ.get("SCRIPTBUDDY_PROXY_COMPRESS_MIN_BYTES", "1024"))
+AUDIO_GZIP_LEVEL = int(os.environ.get("SCRIPTBUDDY_PROXY_AUDIO_GZIP_LEVEL", "1"))
+JSON_GZIP_LEVEL = int(os.environ.get("SCRIPTBUDDY_PROXY_JSON_GZIP_LEVEL", "6"))
+OFFLOAD_MIN_BYTES = int(os.environ.get("SCRIPTBUDDY_PROXY_OFFLOAD_BYTES", str(64 * 1024)))
+COMPRESS_WORKERS = int(os.environ.get("SCRIPTBUDDY_PROXY_COMPRESS_WORKERS", "2"))
+# 会话压缩过这么多音频帧之后，若整体节省不到 AUDIO_MIN_SAVING，后续音频帧不再压缩
+AUDIO_PROBE_FRAMES = 20
+AUDIO_MIN_SAVING = 0.05
+
+_executor = ThreadPoolExecutor(max_workers=COMPRESS_WORKERS, thread_name_prefix="proxy-gzip")
+
+
+def _timed(fn, payload, *args):
+    # thread_time 只计当前线程的 CPU 时间，在线程池里执行时也准确
+    started = time.thread_time()
+    result = fn(payload, *args)
+    return result, time.thread_time() - started
+
+
+class CompressionStats:
+    """Per-session counters for the gzip work a proxy session did."""
+
+    __slots__ = ("compressed", "skipped", "offloaded", "decompressed",
+                 "bytes_in", "bytes_out", "audio_in", "audio_out", "audio_frames", "cpu_seconds")
+
+    def __init__(self):
+        self.compressed = self.skipped = self.offloaded = self.decompressed = 0
+        self.bytes_in = self.bytes_out = self.audio_in = self.audio_out = self.audio_frames = 0
+        self.cpu_seconds = 0.0
+
+    @property
+    def bytes_saved(self):
+        """压缩后实际少发的字节数"""
+        return self.bytes_in - self.bytes_out
+
+    def audio_worth_compressing(self):
+        if self.audio_frames < AUDIO_PROBE_FRAMES:
+            return True
+        return self.audio_in - self.audio_out >= self.audio_in * AUDIO_MIN_SAVING
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__} | {"bytes_saved": self.bytes_saved}
+
+    def __str__(self):
+        return (f"{self.compressed} compressed, {self.skipped} sent as-is, {self.decompressed} decompressed, "
+                f"{self.offloaded} offloaded; saved {self.bytes_saved} bytes, CPU {self.cpu_seconds * 1000:.1f}ms")
+
+
+class CompressionPolicy:
+    """Decides whether, how hard and where to gzip a payload."""
+
+    def __init__(self, min_bytes=COMPRESS_MIN_BYTES, audio_level=AUDIO_GZIP_LEVEL, json_level=JSON_GZIP_LEVEL,
+                 offload_bytes=OFFLOAD_MIN_BYTES, executor=None):
+        self.min_bytes = min_bytes
+        self.audio_level = audio_level
+        self.json_level = json_level
+        self.offload_bytes = offload_bytes
+        self.executor = executor or _executor
+
+    async def _run(self, stats, size, fn, payload, *args):
+        if size >= self.offload_bytes:
+            stats.offloaded += 1
+            loop = asyncio.get_running_loop()
+            result, cpu = await loop.run_in_executor(self.executor, _timed, fn, payload, *args)
+        else:
+            result, cpu = _timed(fn, payload, *args)
+        stats.cpu_seconds += cpu
+        return result
+
+    async def compress(self, payload, stats: CompressionStats, audio: bool = False):
+        """返回 (载荷, 压缩方式)；不值得压缩时原样返回载荷"""
+        size = len(payload)
+        if size < self.min_bytes or (audio and not stats.audio_worth_compressing()):
+            stats.skipped += 1
+            return payload, CompressionBits.None_
+
+        level = self.audio_level if audio else self.json_level
+        compressed = await self._run(stats, size, gzip.compress, payload, level)
+        if audio:
+            stats.audio_frames += 1
+            stats.audio_in += size
+            stats.audio_out += min(size, len(compressed))
+        if len(compressed) >= size:
+            # 压缩后反而更大：CPU 已经花了，但仍发送原始数据
+            stats.skipped += 1
+            return payload, CompressionBits.None_
+        stats.compressed += 1
+        stats.bytes_in += size
+        stats.bytes_out += len(compressed)
+        return compressed, CompressionBits.Gzip
+
+    async def decompress(self, payload, stats: CompressionStats):
+        stats.decompressed += 1
+        # 解压的开销取决于解压后的大小：gzip 尾部的 ISIZE 字段 (小端 uint32) 就是它
+        size = max(len(payload), int.from_bytes(payload[-4:], "little")) if len(payload) >= 4 else len(payload)
+        return await self._run(stats, size, gzip.decompress, payload)
+
+    async def frame_data(self, frame, stats: CompressionStats):
+        """与 ``Frame.data()`` 相同，但按策略计时，大载荷放到线程池解压"""
+        if frame.compression == CompressionBits.Gzip:
+            return await self.decompress(frame.payload, stats)
+        return frame.payload
+
+
+default_policy = CompressionPolicy()
@@ -0,0 +1,68 @@
+"""Which relayed frames a proxy session decodes for logging.
+
+The proxies forward upstream frames byte for byte. Decoding a frame just to
+log it (parse, gunzip, ``json.loads``) happens only for:
+
+- every ``INSPECT_EVERY``-th frame (the first frame included);
+- error frames, which are recognised from the header byte without parsing;
+- every frame of a traced session. ``?trace=1`` is honoured only from
+  client addresses in ``TRACE_CLIENTS`` (server configuration, empty by
+  default), and tracing applies to all sessions when the proxy logger is
+  at DEBUG.
+"""
+import ipaddress
+import logging
+import os
+
+from api.proxy.protocol import MsgType
+
+# 代理日志默认 INFO；调到 DEBUG 时所有会话逐帧检查并输出
+PROXY_LOG_LEVEL = os.environ.get("SCRIPTBUDDY_PROXY_LOG_LEVEL", "INFO").upper()
+# 每隔多少帧抽样检查一帧 (0 表示只检查错误帧)
+INSPECT_EVERY = int(os.environ.get("SCRIPTBUDDY_PROXY_INSPECT_EVERY", "50"))
+# 允许用 ?trace=1 跟踪单个会话的客户端地址 (逗号分隔的 IP 或网段)；默认为空，不接受客户端的跟踪请求
+TRACE_CLIENTS = [
+    ipaddress.ip_network(item.strip(), strict=False)
+    for item in os.environ.get("SCRIPTBUDDY_PROXY_TRACE_CLIENTS", "").split(",") if item.strip()
+]
+
+_ERROR_TYPE_BYTE = MsgType.Error << 4
+
+
+class FrameInspector:
+    """Per-session sampling decision for upstream frames."""
+
+    __slots__ = ("logger", "traced", "level", "sample_every", "frames")
+
+    def __init__(self, logger, traced=False, sample_every=INSPECT_EVERY):
+        self.logger = logger
+        self.traced = traced or logger.isEnabledFor(logging.DEBUG)
+        # 单个会话开启跟踪时逐帧信息按 INFO 输出，不必把整个 logger 调到 DEBUG
+        self.level = logging.INFO if traced else logging.DEBUG
+        self.sample_every = sample_every
+        self.frames = 0
+
+    def should_inspect(self, message):
+        self.frames += 1
+        if self.traced or not isinstance(message, bytes):
+            return True
+        # 错误帧总是检查：只看消息类型所在的第二个字节
+        if len(message) > 1 and message[1] & 0xF0 == _ERROR_TYPE_BYTE:
+            return True
+        return self.sample_every > 0 and (self.frames - 1) % self.sample_every == 0
+
+    def log(self, msg, *args):
+        """逐帧的明细日志：跟踪中的会话按 INFO 输出，否则按 DEBUG"""
+        self.logger.log(self.level, msg, *args)
+
+
+def should_trace(client_ws, allowed=None):
+    """客户端带 ?trace=1 且来源地址在 ``allowed`` (默认 TRACE_CLIENTS) 中时跟踪该会话"""
+    allowed = TRACE_CLIENTS if allowed is None else allowed
+    if not allowed or client_ws.query_params.get("trace") != "1" or client_ws.client is None:
+        return False
+    try:
+        address = ipaddress.ip_address(client_ws.client.host)
+    except ValueError:
+        return False
+    return any(address in network for network in allowed)
@@ -0,0 +1,214 @@
+"""VolcEngine binary protocol codec shared by the ASR and TTS proxies.
+
+Frame layout (big endian)::
+
+    byte 0   version (4 bits) | header size in 4-byte words (4 bits)
+    byte 1   message type (4 bits) | flags (4 bits)
+    byte 2   serialization (4 bits) | compression (4 bits)
+    byte 3   reserved, then (header size - 1) words of header extension
+    [int32]  sequence    -- when flags has bit 0 set (PositiveSeq / NegativeSeq)
+    [uint32] error code  -- Error frames only
+    uint32   payload size
+    payload
+
+Headers are packed and unpacked with precompiled ``struct.Struct`` objects.
+:func:`parse_frame` returns the payload as a ``memoryview`` into the received
+buffer, and :func:`build_frame` copies the payload exactly once, into the
+outgoing frame. ``doc/L2V_volcengine_binary_demo`` is the vendor's reference
+SDK and is kept as-is for comparison.
+"""
+import gzip
+import json
+import struct
+from enum import IntEnum
+from typing import NamedTuple
+
+
+class MsgType(IntEnum):
+    """Message type enumeration"""
+    Invalid = 0
+    FullClientRequest = 0b1
+    AudioOnlyClient = 0b10
+    FullServerResponse = 0b1001
+    AudioOnlyServer = 0b1011
+    FrontEndResultServer = 0b1100
+    Error = 0b1111
+
+    ServerACK = AudioOnlyServer  # Alias
+
+
+class MsgTypeFlagBits(IntEnum):
+    """Message type flag bits"""
+    NoSeq = 0  # Non-terminal packet with no sequence
+    PositiveSeq = 0b1  # Non-terminal packet with sequence > 0
+    LastNoSeq = 0b10  # Last packet with no sequence
+    NegativeSeq = 0b11  # Last packet with sequence < 0
+    WithEvent = 0b100  # Payload contains event number (int32)
+
+
+class SerializationBits(IntEnum):
+    """Serialization method bits"""
+    Raw = 0
+    JSON = 0b1
+
+
+class CompressionBits(IntEnum):
+    """Compression method bits"""
+    None_ = 0
+    Gzip = 0b1
+
+
+# version 1，头部 1 个字 (4 字节)
+VERSION_AND_HEADER_SIZE = 0x11
+
+_SEQ_BIT = 0b1
+_LAST_BIT = 0b10
+_EVENT_BIT = 0b100
+
+_HEADER = struct.Struct(">BBB")
+_SIZE = struct.Struct(">I")
+_SEQ_SIZE = struct.Struct(">iI")
+_CODE_SIZE = struct.Struct(">II")
+_SEQ_CODE_SIZE = struct.Struct(">iII")
+# 构建时头部与定长字段一次 pack 完成
+_PREFIX = struct.Struct(">BBBxI")
+_PREFIX_SEQ = struct.Struct(">BBBxiI")
+_PREFIX_CODE = struct.Struct(">BBBxII")
+
+
+class Frame(NamedTuple):
+    """A parsed frame; ``payload`` is a view into the buffer it was parsed from."""
+    type: int
+    flag: int
+    serialization: int
+    compression: int
+    sequence: int
+    error_code: int
+    payload: memoryview
+
+    @property
+    def is_last(self):
+        return bool(self.flag & _LAST_BIT)
+
+    def data(self):
+        """解压后的载荷；未压缩时直接返回视图，不复制"""
+        if self.compression == CompressionBits.Gzip:
+            return gzip.decompress(self.payload)
+        return self.payload
+
+    def json(self):
+        return json.loads(bytes(self.data()))
+
+    def __str__(self):
+        try:
+            name = MsgType(self.type).name
+        except ValueError:
+            name = f"MsgType({self.type})"
+        parts = [f"MsgType: {name}"]
+        if self.flag & _SEQ_BIT:
+            parts.append(f"Sequence: {self.sequence}")
+        if self.type == MsgType.Error:
+            # 错误帧的载荷是错误信息，直接带上
+            try:
+                message = bytes(self.data()).decode("utf-8", "ignore")
+            except Exception:
+                message = f"<{len(self.payload)} bytes>"
+            parts += [f"ErrorCode: {self.error_code}", f"Payload: {message}"]
+        else:
+            parts.append(f"PayloadSize: {len(self.payload)}")
+        return ", ".join(parts)
+
+
+def parse_frame(data) -> Frame:
+    """解析一帧；帧不完整或格式不支持时抛 ValueError"""
+    try:
+        first, type_and_flag, ser_and_comp = _HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError(f"Frame too short: {len(data)} bytes") from None
+    msg_type, flag = type_and_flag >> 4, type_and_flag & 0x0F
+    if flag & _EVENT_BIT:
+        raise ValueError("Event frames are not supported")
+
+    cursor = (first & 0x0F) * 4
+    sequence = error_code = 0
+    try:
+        if msg_type == MsgType.Error:
+            if flag & _SEQ_BIT:
+                sequence, error_code, size = _SEQ_CODE_SIZE.unpack_from(data, cursor)
+                cursor += 12
+            else:
+                error_code, size = _CODE_SIZE.unpack_from(data, cursor)
+                cursor += 8
+        elif flag & _SEQ_BIT:
+            sequence, size = _SEQ_SIZE.unpack_from(data, cursor)
+            cursor += 8
+        else:
+            size, = _SIZE.unpack_from(data, cursor)
+            cursor += 4
+    except struct.error:
+        raise ValueError(f"Frame too short for header fields: {len(data)} bytes") from None
+
+    end = cursor + size
+    if end > len(data):
+        raise ValueError(f"Frame too short for payload: expected {size}, got {len(data) - cursor}")
+    return Frame(msg_type, flag, ser_and_comp >> 4, ser_and_comp & 0x0F, sequence, error_code,
+                 memoryview(data)[cursor:end])
+
+
+def build_frame(msg_type, payload=b"", flag=MsgTypeFlagBits.NoSeq, sequence=0,
+                serialization=SerializationBits.JSON, compression=CompressionBits.None_,
+                error_code=0) -> bytes:
+    """构建一帧；``payload`` 可以是任意 bytes-like (包括 parse_frame 返回的视图)"""
+    type_and_flag = (msg_type << 4) | flag
+    ser_and_comp = (serialization << 4) | compression
+    size = len(payload)
+    if msg_type == MsgType.Error:
+        prefix = _PREFIX_CODE.pack(VERSION_AND_HEADER_SIZE, type_and_flag, ser_and_comp, error_code, size)
+    elif flag & _SEQ_BIT:
+        prefix = _PREFIX_SEQ.pack(VERSION_AND_HEADER_SIZE, type_and_flag, ser_and_comp, sequence, size)
+    else:
+        prefix = _PREFIX.pack(VERSION_AND_HEADER_SIZE, type_and_flag, ser_and_comp, size)
+    # bytes + 缓冲区对象只分配一次，载荷只复制这一次
+    return prefix + payload
+
+
+def forward_frame(data, frame: Frame, flag, sequence=0):
+    """转发已解析的帧：只改写头部和 sequence，载荷连同其压缩方式原样保留
+
+    头部已经符合要求时直接返回 ``data``，不复制；布局相同 (头部 1 个字、同样带或不带
+    sequence) 时复制一次后就地改写定长字段；否则用新头部拼接载荷视图。
+    """
+    if frame.type == MsgType.Error:
+        raise ValueError("Error frames cannot be forwarded")
+    type_and_flag = (frame.type << 4) | flag
+    ser_and_comp = (frame.serialization << 4) | frame.compression
+    size = len(frame.payload)
+    if flag & _SEQ_BIT:
+        prefix = _PREFIX_SEQ.pack(VERSION_AND_HEADER_SIZE, type_and_flag, ser_and_comp, sequence, size)
+    else:
+        prefix = _PREFIX.pack(VERSION_AND_HEADER_SIZE, type_and_flag, ser_and_comp, size)
+
+    n = len(prefix)
+    if len(data) != n + size:
+        return prefix + frame.payload
+    if data[:n] == prefix:
+        return data
+    buffer = bytearray(data)
+    buffer[:n] = prefix
+    return buffer
+
+
+def build_full_client_request(payload_bytes, compression=CompressionBits.None_) -> bytes:
+    """FullClientRequest (NoSeq, JSON)；``compression`` 为载荷已采用的压缩方式"""
+    return build_frame(MsgType.FullClientRequest, payload_bytes, compression=compression)
+
+
+def build_audio_only_request(audio_data, sequence: int, is_last: bool, compression=CompressionBits.None_) -> bytes:
+    """AudioOnlyClient，最后一包的 sequence 取负；``compression`` 为载荷已采用的压缩方式"""
+    return build_frame(
+        MsgType.AudioOnlyClient, audio_data,
+        flag=MsgTypeFlagBits.NegativeSeq if is_last else MsgTypeFlagBits.PositiveSeq,
+        sequence=-sequence if is_last else sequence,
+        serialization=SerializationBits.Raw,
+        compression=compression,
+    )
@@ -1,236 +1,19 @@
 import asyncio
-import io
 import json
-import struct
 import logging
 import uuid
-from dataclasses import dataclass
-from enum import IntEnum
-from typing import List, Callable
 
-import websockets
 from fastapi import WebSocket, WebSocketDisconnect
+from api.proxy.compression import CompressionStats, default_policy
+from api.proxy.inspection import PROXY_LOG_LEVEL, FrameInspector, should_trace
+from api.proxy.protocol import MsgType, SerializationBits, build_frame, parse_frame
+from api.proxy.upstream_pool import connect_upstream
 from api.services.config_service import ConfigService
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("tts_proxy")
-logger.setLevel(logging.DEBUG)
-
-
-# ===============================================================
-# VolcEngine Binary Protocol (matching official SDK implementation)
-# ===============================================================
-
-class MsgType(IntEnum):
-    """Message type enumeration"""
-    Invalid = 0
-    FullClientRequest = 0b1
-    AudioOnlyClient = 0b10
-    FullServerResponse = 0b1001
-    AudioOnlyServer = 0b1011
-    FrontEndResultServer = 0b1100
-    Error = 0b1111
-
-    ServerACK = AudioOnlyServer  # Alias
-
-
-class MsgTypeFlagBits(IntEnum):
-    """Message type flag bits"""
-    NoSeq = 0  # Non-terminal packet with no sequence
-    PositiveSeq = 0b1  # Non-terminal packet with sequence > 0
-    LastNoSeq = 0b10  # Last packet with no sequence
-    NegativeSeq = 0b11  # Last packet with sequence < 0
-    WithEvent = 0b100  # Payload contains event number (int32)
-
-
-class VersionBits(IntEnum):
-    """Version bits"""
-    Version1 = 1
-
-
-class HeaderSizeBits(IntEnum):
-    """Header size bits (in units of 4 bytes)"""
-    HeaderSize4 = 1
-
-
-class SerializationBits(IntEnum):
-    """Serialization method bits"""
-    Raw = 0
-    JSON = 0b1
-
-
-class CompressionBits(IntEnum):
-    """Compression method bits"""
-    None_ = 0
-    Gzip = 0b1
-
-
-@dataclass
-class Message:
-    """Message object for VolcEngine TTS binary protocol"""
-
-    version: VersionBits = VersionBits.Version1
-    header_size: HeaderSizeBits = HeaderSizeBits.HeaderSize4
-    type: MsgType = MsgType.Invalid
-    flag: MsgTypeFlagBits = MsgTypeFlagBits.NoSeq
-    serialization: SerializationBits = SerializationBits.JSON
-    compression: CompressionBits = CompressionBits.None_
-
-    sequence: int = 0
-    error_code: int = 0
-    payload: bytes = b""
-
-    @classmethod
-    def from_bytes(cls, data: bytes) -> "Message":
-        """Create message object from bytes"""
-        if len(data) < 3:
-            raise ValueError(f"Data too short: expected at least 3 bytes, got {len(data)}")
-
-        type_and_flag = data[1]
-        msg_type = MsgType(type_and_flag >> 4)
-        flag = MsgTypeFlagBits(type_and_flag & 0b00001111)
-
-        msg = cls(type=msg_type, flag=flag)
-        msg.unmarshal(data)
-        return msg
-
-    def marshal(self) -> bytes:
-        """Serialize message to bytes"""
-        buffer = io.BytesIO()
-
-        # Write header (4 bytes)
-        header = [
-            (self.version << 4) | self.header_size,
-            (self.type << 4) | self.flag,
-            (self.serialization << 4) | self.compression,
-        ]
-
-        header_size = 4 * self.header_size
-        if padding := header_size - len(header):
-            header.extend([0] * padding)
-
-        buffer.write(bytes(header))
-
-        # Write other fields
-        writers = self._get_writers()
-        for writer in writers:
-            writer(buffer)
-
-        return buffer.getvalue()
-
-    def unmarshal(self, data: bytes) -> None:
-        """Deserialize message from bytes"""
-        buffer = io.BytesIO(data)
-
-        # Read version and header size
-        version_and_header_size = buffer.read(1)[0]
-        self.version = VersionBits(version_and_header_size >> 4)
-        self.header_size = HeaderSizeBits(version_and_header_size & 0b00001111)
-
-        # Skip second byte (type and flag already parsed in from_bytes)
-        buffer.read(1)
-
-        # Read serialization and compression methods
-        serialization_compression = buffer.read(1)[0]
-        self.serialization = SerializationBits(serialization_compression >> 4)
-        self.compression = CompressionBits(serialization_compression & 0b00001111)
-
-        # Skip header padding
-        header_size = 4 * self.header_size
-        read_size = 3
-        if padding_size := header_size - read_size:
-            buffer.read(padding_size)
-
-        # Read other fields
-        readers = self._get_readers()
-        for reader in readers:
-            reader(buffer)
-
-    def _get_writers(self) -> List[Callable[[io.BytesIO], None]]:
-        """Get list of writer functions"""
-        writers = []
-
-        if self.type in [
-            MsgType.FullClientRequest,
-            MsgType.FullServerResponse,
-            MsgType.FrontEndResultServer,
-            MsgType.AudioOnlyClient,
-            MsgType.AudioOnlyServer,
-        ]:
-            if self.flag in [MsgTypeFlagBits.PositiveSeq, MsgTypeFlagBits.NegativeSeq]:
-                writers.append(self._write_sequence)
-        elif self.type == MsgType.Error:
-            writers.append(self._write_error_code)
-
-        writers.append(self._write_payload)
-        return writers
-
-    def _get_readers(self) -> List[Callable[[io.BytesIO], None]]:
-        """Get list of reader functions"""
-        readers = []
-
-        if self.type in [
-            MsgType.FullClientRequest,
-            MsgType.FullServerResponse,
-            MsgType.FrontEndResultServer,
-            MsgType.AudioOnlyClient,
-            MsgType.AudioOnlyServer,
-        ]:
-            if self.flag in [MsgTypeFlagBits.PositiveSeq, MsgTypeFlagBits.NegativeSeq]:
-                readers.append(self._read_sequence)
-        elif self.type == MsgType.Error:
-            readers.append(self._read_error_code)
-
-        readers.append(self._read_payload)
-        return readers
-
-    def _write_sequence(self, buffer: io.BytesIO) -> None:
-        """Write sequence number"""
-        buffer.write(struct.pack(">i", self.sequence))
-
-    def _write_error_code(self, buffer: io.BytesIO) -> None:
-        """Write error code"""
-        buffer.write(struct.pack(">I", self.error_code))
-
-    def _write_payload(self, buffer: io.BytesIO) -> None:
-        """Write payload"""
-        size = len(self.payload)
-        buffer.write(struct.pack(">I", size))
-        buffer.write(self.payload)
-
-    def _read_sequence(self, buffer: io.BytesIO) -> None:
-        """Read sequence number"""
-        sequence_bytes = buffer.read(4)
-        if sequence_bytes:
-            self.sequence = struct.unpack(">i", sequence_bytes)[0]
-
-    def _read_error_code(self, buffer: io.BytesIO) -> None:
-        """Read error code"""
-        error_code_bytes = buffer.read(4)
-        if error_code_bytes:
-            self.error_code = struct.unpack(">I", error_code_bytes)[0]
-
-    def _read_payload(self, buffer: io.BytesIO) -> None:
-        """Read payload"""
-        size_bytes = buffer.read(4)
-        if size_bytes:
-            size = struct.unpack(">I", size_bytes)[0]
-            if size > 0:
-                self.payload = buffer.read(size)
-
-    def __str__(self) -> str:
-        """String representation"""
-        if self.type in [MsgType.AudioOnlyServer, MsgType.AudioOnlyClient]:
-            if self.flag in [MsgTypeFlagBits.PositiveSeq, MsgTypeFlagBits.NegativeSeq]:
-                return f"MsgType: {self.type.name}, Sequence: {self.sequence}, PayloadSize: {len(self.payload)}"
-            return f"MsgType: {self.type.name}, PayloadSize: {len(self.payload)}"
-        elif self.type == MsgType.Error:
-            return f"MsgType: {self.type.name}, ErrorCode: {self.error_code}, Payload: {self.payload.decode('utf-8', 'ignore')}"
-        else:
-            if self.flag in [MsgTypeFlagBits.PositiveSeq, MsgTypeFlagBits.NegativeSeq]:
-                return f"MsgType: {self.type.name}, Sequence: {self.sequence}, Payload: {self.payload.decode('utf-8', 'ignore')}"
-            return f"MsgType: {self.type.name}, Payload: {self.payload.decode('utf-8', 'ignore')}"
+logger.setLevel(PROXY_LOG_LEVEL)
 
 
 def get_cluster(voice_type: str) -> str:
@@ -240,25 +23,30 @@ def get_cluster(voice_type: str) -> str:
     return "volcano_tts"
 
 
-async def full_client_request(websocket, payload: bytes) -> None:
-    """Send full client request message"""
-    msg = Message(type=MsgType.FullClientRequest, flag=MsgTypeFlagBits.NoSeq)
-    msg.payload = payload
-    logger.debug(f"Sending: {msg}")
-    await websocket.send(msg.marshal())
+async def full_client_request(websocket, payload: bytes, stats: CompressionStats = None, policy=default_policy) -> None:
+    """Send full client request message, compressed according to ``policy``"""
+    payload, compression = await policy.compress(payload, stats or CompressionStats())
+    frame = build_frame(MsgType.FullClientRequest, payload, compression=compression)
+    logger.debug("Sending: FullClientRequest, PayloadSize: %d, Compression: %s", len(payload), compression.name)
+    await websocket.send(frame)
 
 
-async def receive_message(websocket) -> Message:
-    """Receive message from websocket"""
-    data = await websocket.recv()
-    if isinstance(data, str):
-        raise ValueError(f"Unexpected text message: {data}")
-    elif isinstance(data, bytes):
-        msg = Message.from_bytes(data)
-        logger.debug(f"Received: {msg}")
-        return msg
+def inspect_server_frame(message, frame_no: int, inspector: FrameInspector) -> None:
+    """Decode one upstream frame for logging; the frame itself is forwarded untouched."""
+    if not isinstance(message, bytes):
+        inspector.log("🔊 [TTS Proxy] Volc → Client #%d: text message, %d chars", frame_no, len(message))
+        return
+    try:
+        parsed_msg = parse_frame(message)
+    except Exception:
+        inspector.log("🔊 [TTS Proxy] Volc → Client #%d: %d bytes (raw)", frame_no, len(message))
+        return
+    if parsed_msg.type == MsgType.Error:
+        logger.error("🔊 [TTS Proxy] ❌ Volc Error: %s", parsed_msg)
+    elif parsed_msg.type == MsgType.AudioOnlyServer:
+        inspector.log("🔊 [TTS Proxy] Volc → Client #%d: Audio %d bytes, seq=%d", frame_no, len(message), parsed_msg.sequence)
     else:
-        raise ValueError(f"Unexpected message type: {type(data)}")
+        inspector.log("🔊 [TTS Proxy] Volc → Client #%d: %s", frame_no, parsed_msg)
 
 
 # ===============================================================
@@ -270,14 +58,14 @@ async def tts_websocket_endpoint(client_ws: WebSocket):
     logger.info("🔊 [TTS Proxy] Client connected")
 
     # 1. Get Config
-    all_configs = ConfigService.get_all_configs()
+    all_configs = await ConfigService.get_all_configs()
     tts_config = all_configs.get("tts", {})
 
     app_id = tts_config.get("appId")
     token = tts_config.get("token")
     voice_type = tts_config.get("voiceType", "zh_male_linjiananhai_moon_bigtts")
 
-    logger.debug(f"🔊 [TTS Proxy] Config loaded - appId: {app_id[:8] if app_id else 'None'}...")
+    logger.debug("🔊 [TTS Proxy] Config loaded - appId: %.8s...", app_id)
 
     if not (app_id and token):
         logger.error("🔊 [TTS Proxy] ❌ Server config missing!")
@@ -297,11 +85,7 @@ async def tts_websocket_endpoint(client_ws: WebSocket):
     logger.info(f"🔊 [TTS Proxy] Connecting to VolcEngine: {volc_url}")
 
     try:
-        async with websockets.connect(
-            volc_url,
-            additional_headers=extra_headers,
-            max_size=10 * 1024 * 1024
-        ) as volc_ws:
+        async with connect_upstream(volc_url, extra_headers) as volc_ws:
             logger.info(f"🔊 [TTS Proxy] ✓ Connected to VolcEngine")
             if hasattr(volc_ws, 'response') and volc_ws.response:
                 log_id = volc_ws.response.headers.get('x-tt-logid', 'N/A')
@@ -310,6 +94,8 @@ async def tts_websocket_endpoint(client_ws: WebSocket):
             client_to_volc_count = 0
             volc_to_client_count = 0
             volc_to_client_bytes = 0
+            compression_stats = CompressionStats()
+            inspector = FrameInspector(logger, traced=should_trace(client_ws))
 
             async def client_to_volc():
                 nonlocal client_to_volc_count
@@ -317,16 +103,16 @@ async def tts_websocket_endpoint(client_ws: WebSocket):
                     while True:
                         data = await client_ws.receive_bytes()
                         client_to_volc_count += 1
-                        logger.debug(f"🔊 [TTS Proxy] Client → Volc #{client_to_volc_count}: {len(data)} bytes")
+                        logger.debug("🔊 [TTS Proxy] Client → Volc #%d: %d bytes", client_to_volc_count, len(data))
 
-                        # Parse the client's frame using our Message class
+                        # Parse the client's frame with the shared codec
                         try:
-                            client_msg = Message.from_bytes(data)
-                            logger.debug(f"🔊 [TTS Proxy] Parsed client message: {client_msg}")
+                            client_msg = parse_frame(data)
+                            logger.debug("🔊 [TTS Proxy] Parsed client message: %s", client_msg)
 
                             if client_msg.serialization == SerializationBits.JSON and client_msg.payload:
                                 # Parse JSON payload
-                                payload = json.loads(client_msg.payload.decode('utf-8'))
+                                payload = json.loads(bytes(await default_policy.frame_data(client_msg, compression_stats)))
 
                                 # Inject app credentials (matching demo format)
                                 payload["app"] = {
@@ -345,18 +131,19 @@ async def tts_websocket_endpoint(client_ws: WebSocket):
                                 if "request" in payload and "reqid" not in payload["request"]:
                                     payload["request"]["reqid"] = str(uuid.uuid4())
 
-                                logger.debug(f"🔊 [TTS Proxy] Injected app credentials. Text: {payload.get('request', {}).get('text', '')[:30]}...")
+                                logger.debug("🔊 [TTS Proxy] Injected app credentials. Text: %.30s...",
+                                             payload.get('request', {}).get('text', ''))
 
                                 # Rebuild and send the frame
                                 new_payload_bytes = json.dumps(payload).encode('utf-8')
-                                await full_client_request(volc_ws, new_payload_bytes)
+                                await full_client_request(volc_ws, new_payload_bytes, compression_stats)
                             else:
                                 # Non-JSON or no payload, forward as-is
                                 logger.debug("🔊 [TTS Proxy] Forwarding non-JSON frame as-is")
                                 await volc_ws.send(data)
 
                         except Exception as parse_error:
-                            logger.warning(f"🔊 [TTS Proxy] Could not parse frame ({parse_error}), forwarding as-is")
+                            logger.warning("🔊 [TTS Proxy] Could not parse frame (%s), forwarding as-is", parse_error)
                             await volc_ws.send(data)
 
                 except WebSocketDisconnect:
@@ -369,27 +156,16 @@ async def tts_websocket_endpoint(client_ws: WebSocket):
                 try:
                     async for message in volc_ws:
                         volc_to_client_count += 1
-                        msg_len = len(message) if isinstance(message, bytes) else len(message.encode())
-                        volc_to_client_bytes += msg_len
-
-                        # Parse the message to log details
-                        if isinstance(message, bytes):
-                            try:
-                                parsed_msg = Message.from_bytes(message)
-                                if parsed_msg.type == MsgType.Error:
-                                    logger.error(f"🔊 [TTS Proxy] ❌ Volc Error: {parsed_msg}")
-                                elif parsed_msg.type == MsgType.AudioOnlyServer:
-                                    logger.debug(f"🔊 [TTS Proxy] Volc → Client #{volc_to_client_count}: Audio {msg_len} bytes, seq={parsed_msg.sequence}")
-                                else:
-                                    logger.debug(f"🔊 [TTS Proxy] Volc → Client #{volc_to_client_count}: {parsed_msg}")
-                            except Exception:
-                                logger.debug(f"🔊 [TTS Proxy] Volc → Client #{volc_to_client_count}: {msg_len} bytes (raw)")
-
+                        volc_to_client_bytes += len(message)
+                        # 快速路径：原样转发，只有抽样帧、错误帧和跟踪中的会话才解码检查
+                        if inspector.should_inspect(message):
+                            inspect_server_frame(message, volc_to_client_count, inspector)
                         await client_ws.send_bytes(message)
                 except Exception as e:
                     logger.error(f"🔊 [TTS Proxy] ❌ Volc→Client Error: {e}")
                 finally:
                     logger.info(f"🔊 [TTS Proxy] Session stats: {volc_to_client_count} messages, {volc_to_client_bytes} bytes from Volc")
+                    logger.info(f"🔊 [TTS Proxy] Compression: {compression_stats}")
 
             await asyncio.gather(client_to_volc(), volc_to_client())
 
@@ -0,0 +1,277 @@
+"""Pre-warmed upstream connections for the ASR proxy.
+
+Opening ``wss://…/sauc/bigmodel`` costs a TCP + TLS + WebSocket handshake
+(with the credentials checked upstream) every time the user starts a turn.
+:class:`UpstreamPool` keeps a few connections open and authenticated so that
+a client connect takes one from a deque instead.
+
+- How many to keep comes from recent demand: the peak number of sessions
+  started within any ``POOL_CHECK_INTERVAL`` over the last
+  ``POOL_DEMAND_WINDOW`` seconds, capped at ``POOL_MAX_IDLE``. With no recent
+  demand the pool drains and its maintenance task stops.
+- Idle connections are pinged every ``POOL_CHECK_INTERVAL`` and dropped once
+  they fail to answer or are older than ``POOL_MAX_IDLE_AGE``, which is kept
+  below the upstream's idle timeout.
+- A connection serves exactly one session. Each one carries its own
+  ``X-Api-Request-Id``, and the session closes it when it ends.
+- A change to the ASR credentials drains the pool.
+"""
+import asyncio
+import contextlib
+import os
+import time
+import uuid
+from collections import Counter, deque
+
+import websockets
+from websockets.protocol import State
+
+from api.services.config_service import ConfigService
+
+ASR_URL = os.environ.get("SCRIPTBUDDY_ASR_URL", "wss://openspeech.bytedance.com/api/v3/sauc/bigmodel")
+ASR_RESOURCE_ID = "volc.bigasr.sauc.duration"
+UPSTREAM_MAX_SIZE = 10 * 1024 * 1024
+
+# 最多保留的空闲连接数 (0 表示不预热，每次会话现建连接)
+POOL_MAX_IDLE = int(os.environ.get("SCRIPTBUDDY_ASR_POOL_MAX_IDLE", "4"))
+# 空闲连接的最长存活时间 (秒)，需小于上游的空闲超时
+POOL_MAX_IDLE_AGE = float(os.environ.get("SCRIPTBUDDY_ASR_POOL_MAX_IDLE_AGE", "20"))
+# 健康检查间隔 (秒)，也是统计需求峰值的时间粒度
+POOL_CHECK_INTERVAL = float(os.environ.get("SCRIPTBUDDY_ASR_POOL_CHECK_INTERVAL", "5"))
+# 按最近多少秒内的需求决定预热数量
+POOL_DEMAND_WINDOW = float(os.environ.get("SCRIPTBUDDY_ASR_POOL_DEMAND_WINDOW", "120"))
+POOL_PING_TIMEOUT = 5.0
+
+# websockets 14 起 connect 的参数名由 extra_headers 改为 additional_headers
+_HEADERS_KWARG = "additional_headers" if int(websockets.__version__.split(".")[0]) >= 14 else "extra_headers"
+
+
+def connect_upstream(url, headers, **kwargs):
+    """``websockets.connect``，请求头参数名兼容新旧版本"""
+    kwargs.setdefault("max_size", UPSTREAM_MAX_SIZE)
+    kwargs[_HEADERS_KWARG] = headers
+    return websockets.connect(url, **kwargs)
+
+
+def asr_credentials(asr_config):
+    """从 asr 配置取出 (app_key, access_key)；缺少任一项时返回 None"""
+    app_key, access_key = asr_config.get("appId"), asr_config.get("token")
+    return (app_key, access_key) if app_key and access_key else None
+
+
+class UpstreamConnection:
+    __slots__ = ("ws", "request_id", "credentials", "opened_at", "checked_at")
+
+    def __init__(self, ws, request_id, credentials, opened_at):
+        self.ws = ws
+        self.request_id = request_id
+        self.credentials = credentials
+        self.opened_at = opened_at
+        self.checked_at = opened_at
+
+    def is_open(self):
+        return self.ws.state is State.OPEN
+
+
+class UpstreamPool:
+    """Idle, authenticated ASR upstream connections, sized from recent demand.
+
+    Everything except ``_on_config_change`` runs on the event loop, so no
+    locking is needed. ``acquire`` pops the newest idle connection (O(1)) and
+    only opens one inline on a miss; one maintenance task per pool does the
+    health checks, expiry and refilling.
+    """
+
+    def __init__(self, url=ASR_URL, max_idle=POOL_MAX_IDLE, max_idle_age=POOL_MAX_IDLE_AGE,
+                 check_interval=POOL_CHECK_INTERVAL, demand_window=POOL_DEMAND_WINDOW,
+                 ping_timeout=POOL_PING_TIMEOUT):
+        self.url = url
+        self.max_idle = max_idle
+        self.max_idle_age = max_idle_age
+        self.check_interval = check_interval
+        self.demand_window = demand_window
+        self.ping_timeout = ping_timeout
+        self.loop = None
+        self._idle = deque()        # UpstreamConnection，右端最新
+        self._demand = deque()      # acquire 的时间戳
+        self._credentials = None
+        self._task = None
+        self._wakeup = None
+        self._closing = set()
+        self.hits = self.misses = self.opened = self.expired = self.failed_checks = 0
+
+    async def _open(self, credentials):
+        request_id = str(uuid.uuid4())
+        app_key, access_key = credentials
+        headers = {
+            "X-Api-Resource-Id": ASR_RESOURCE_ID,
+            "X-Api-Request-Id": request_id,
+            "X-Api-Access-Key": access_key,
+            "X-Api-App-Key": app_key,
+        }
+        ws = await connect_upstream(self.url, headers)
+        self.opened += 1
+        return UpstreamConnection(ws, request_id, credentials, time.monotonic())
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # 换了事件循环 (如测试)：旧循环上的连接和任务已不可用
+            self.loop = loop
+            self._idle.clear()
+            self._closing.clear()
+            self._task = None
+            self._wakeup = asyncio.Event()
+
+    def _discard(self, conn):
+        task = self.loop.create_task(conn.ws.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _usable(self, conn, now):
+        return conn.is_open() and now - conn.opened_at < self.max_idle_age
+
+    async def acquire(self, credentials):
+        """取一条已就绪的上游连接，没有时当场建立；连接只供一个会话使用，用完由调用方关闭"""
+        self._bind()
+        now = time.monotonic()
+        self._demand.append(now)
+        if credentials != self._credentials:
+            self.drain()
+            self._credentials = credentials
+
+        conn = None
+        while self._idle:
+            candidate = self._idle.pop()
+            if self._usable(candidate, now):
+                conn = candidate
+                break
+            self.expired += 1
+            self._discard(candidate)
+
+        self._wakeup.set()
+        if self._task is None and self.max_idle > 0:
+            self._task = self.loop.create_task(self._maintain())
+        if conn is not None:
+            self.hits += 1
+            return conn
+        self.misses += 1
+        return await self._open(credentials)
+
+    @contextlib.asynccontextmanager
+    async def connection(self, credentials):
+        conn = await self.acquire(credentials)
+        try:
+            yield conn
+        finally:
+            await conn.ws.close()
+
+    def target_size(self, now=None):
+        """最近 demand_window 秒内，单个 check_interval 里开始的会话数的峰值"""
+        now = time.monotonic() if now is None else now
+        while self._demand and now - self._demand[0] > self.demand_window:
+            self._demand.popleft()
+        if not self._demand:
+            return 0
+        peak = max(Counter(int(t // self.check_interval) for t in self._demand).values())
+        return min(self.max_idle, peak)
+
+    async def _healthy(self, conn):
+        try:
+            pong = await conn.ws.ping()
+            await asyncio.wait_for(pong, self.ping_timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _check(self, now):
+        """丢弃过期、已关闭和 ping 不通的空闲连接"""
+        for conn in list(self._idle):
+            if not self._usable(conn, now):
+                self._idle.remove(conn)
+                self.expired += 1
+                self._discard(conn)
+        due = [conn for conn in self._idle if now - conn.checked_at >= self.check_interval]
+        if not due:
+            return
+        results = await asyncio.gather(*(self._healthy(conn) for conn in due))
+        checked_at = time.monotonic()
+        for conn, healthy in zip(due, results):
+            conn.checked_at = checked_at
+            if not healthy and conn in self._idle:
+                self._idle.remove(conn)
+                self.failed_checks += 1
+                self._discard(conn)
+
+    async def _prewarm(self, credentials):
+        try:
+            conn = await self._open(credentials)
+        except Exception as e:
+            print(f"ASR upstream pre-connect failed: {e}")
+            return
+        # 建好后立即入池 (中间没有 await)：维护任务被取消时不会漏掉已建立的连接
+        if credentials != self._credentials or len(self._idle) >= self.max_idle:
+            # 建连期间凭证变了，或已经补满
+            self._discard(conn)
+        else:
+            self._idle.append(conn)
+
+    async def _refill(self, now):
+        credentials = self._credentials
+        missing = self.target_size(now) - len(self._idle)
+        if missing > 0 and credentials is not None:
+            await asyncio.gather(*(self._prewarm(credentials) for _ in range(missing)))
+
+    async def _maintain(self):
+        try:
+            while True:
+                self._wakeup.clear()
+                now = time.monotonic()
+                await self._check(now)
+                await self._refill(now)
+                if not self._idle and self.target_size() == 0:
+                    return
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), self.check_interval)
+        finally:
+            self._task = None
+
+    def drain(self):
+        """关闭所有空闲连接并停止补充，直到下一次 acquire 带来新凭证"""
+        self._credentials = None
+        while self._idle:
+            self._discard(self._idle.pop())
+
+    def _on_config_change(self, old, new):
+        # 在配置刷新线程中调用
+        if asr_credentials(old.configs.get("asr", {})) == asr_credentials(new.configs.get("asr", {})):
+            return
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.drain)
+
+    async def close(self):
+        """应用关闭时调用：停止维护任务并关闭空闲连接"""
+        self._bind()
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self.drain()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "idle": len(self._idle),
+            "target": self.target_size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "opened": self.opened,
+            "expired": self.expired,
+            "failedChecks": self.failed_checks,
+        }
+
+
+asr_pool = UpstreamPool()
+ConfigService.subscribe(asr_pool._on_config_change)
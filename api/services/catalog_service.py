@@ -0,0 +1,67 @@
+import base64
+import json
+
+from api.db import query_all, run_in_db
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(story):
+    raw = json.dumps([story['created_at'], story['id']]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, story_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(created_at), int(story_id)
+    except (ValueError, TypeError):
+        raise ValueError(f"invalid cursor '{cursor}'")
+
+
+def _load_page(cursor, limit):
+    # 新的剧本在前；(created_at, id) 上的键集分页，每页代价与总剧本数无关
+    columns = "id, title, description, role_map_json, created_at, line_count, total_duration_ms"
+    if cursor:
+        created_at, story_id = decode_cursor(cursor)
+        stories = query_all(
+            f"SELECT {columns} FROM script_stories WHERE (created_at, id) < (?, ?) "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            (created_at, story_id, limit)
+        )
+    else:
+        stories = query_all(
+            f"SELECT {columns} FROM script_stories ORDER BY created_at DESC, id DESC LIMIT ?", (limit,)
+        )
+
+    role_counts = {story['id']: {} for story in stories}
+    if stories:
+        placeholders = ", ".join(["?"] * len(stories))
+        rows = query_all(
+            f"SELECT story_id, role_key, line_count FROM script_story_roles WHERE story_id IN ({placeholders})",
+            tuple(role_counts)
+        )
+        for row in rows:
+            role_counts[row['story_id']][row['role_key']] = row['line_count']
+
+    items = [{
+        "id": story['id'],
+        "title": story['title'],
+        "description": story['description'],
+        "roleMap": json.loads(story['role_map_json']) if story['role_map_json'] else {},
+        "createdAt": story['created_at'],
+        "lineCount": story['line_count'],
+        "totalDuration": story['total_duration_ms'],
+        "roleCounts": role_counts[story['id']]
+    } for story in stories]
+    next_cursor = encode_cursor(stories[-1]) if len(stories) == limit else None
+    return {"stories": items, "nextCursor": next_cursor}
+
+
+class CatalogService:
+    @staticmethod
+    async def list_stories(cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """剧本目录 (新的在前)，含台词数、总时长和各角色台词数"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        return await run_in_db(_load_page, cursor, limit)
@@ -1,32 +1,123 @@
-from api.db import query_all
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from api.db import query_all, run_in_db
+from api.http_cache import EncodedResponse
+
+# 配置快照的有效期 (秒)。其他进程 (如 update_credentials.py) 改库后最迟这么久生效，
+# 也可以调用 POST /api/admin/config/reload 立即刷新。
+CONFIG_TTL_SECONDS = float(os.environ.get("SCRIPTBUDDY_CONFIG_TTL", "30"))
+
+
+class ConfigSnapshot:
+    """An immutable view of ``script_configs`` taken at one point in time."""
+
+    __slots__ = ("configs", "public", "public_response", "loaded_at")
+
+    def __init__(self, configs, loaded_at):
+        self.configs = MappingProxyType({cat: MappingProxyType(values) for cat, values in configs.items()})
+        public = {"llm": dict(configs.get("llm", {}))}
+        self.public = MappingProxyType(public)
+        # /api/config 的响应体随快照一起编码，条件请求不再访问数据库
+        self.public_response = EncodedResponse.from_obj(public)
+        self.loaded_at = loaded_at
+
+    def is_fresh(self, now=None):
+        return (now or time.monotonic()) - self.loaded_at < CONFIG_TTL_SECONDS
+
+
+def _load_configs():
+    """从数据库加载所有配置"""
+    sql = "SELECT category, key_name, value FROM script_configs"
+    rows = query_all(sql)
+
+    config = {
+        "asr": {},
+        "tts": {},
+        "llm": {}
+    }
+
+    for row in rows:
+        cat = row['category']
+        key = row['key_name']
+        val = row['value']
+
+        if cat in config:
+            config[cat][key] = val
+
+    return config
+
 
 class ConfigService:
+    _snapshot = None
+    _invalidated = False
+    _refresh_lock = threading.Lock()
+    _listeners = []
+
+    @staticmethod
+    async def get_snapshot():
+        """当前配置快照。过期或被失效时重新加载，并发请求只会触发一次查询"""
+        snapshot = ConfigService._snapshot
+        if snapshot is not None and not ConfigService._invalidated and snapshot.is_fresh():
+            return snapshot
+        return await run_in_db(ConfigService._refresh, False)
+
+    @staticmethod
+    async def get_all_configs():
+        """所有配置 (只读映射)。会话在建立时取一次，整个会话期间保持一致"""
+        return (await ConfigService.get_snapshot()).configs
+
     @staticmethod
-    def get_all_configs():
-        """从数据库加载所有配置"""
-        sql = "SELECT category, key_name, value FROM script_configs"
-        rows = query_all(sql)
-        
-        config = {
-            "asr": {},
-            "tts": {},
-            "llm": {}
-        }
-        
-        for row in rows:
-            cat = row['category']
-            key = row['key_name']
-            val = row['value']
-            
-            if cat in config:
-                config[cat][key] = val
-                
-        return config
-
-    @staticmethod
-    def get_public_config():
+    async def get_public_config():
         """只返回前端需要的配置 (DeepSeek)，隐藏 VolcEngine Key"""
-        full_config = ConfigService.get_all_configs()
-        return {
-            "llm": full_config.get("llm", {})
-        }
+        return {"llm": dict((await ConfigService.get_snapshot()).public["llm"])}
+
+    @staticmethod
+    async def get_public_response():
+        return (await ConfigService.get_snapshot()).public_response
+
+    @staticmethod
+    async def reload():
+        """立即从数据库重新加载 (凭证更新后调用)"""
+        return await run_in_db(ConfigService._refresh, True)
+
+    @staticmethod
+    def invalidate():
+        """让当前快照失效，下一次读取时重新加载"""
+        ConfigService._invalidated = True
+
+    @staticmethod
+    def subscribe(listener):
+        """注册 ``listener(old_snapshot, new_snapshot)``，配置内容变化时在刷新线程中调用"""
+        ConfigService._listeners.append(listener)
+
+    @staticmethod
+    def unsubscribe(listener):
+        if listener in ConfigService._listeners:
+            ConfigService._listeners.remove(listener)
+
+    @staticmethod
+    def _refresh(force):
+        with ConfigService._refresh_lock:
+            current = ConfigService._snapshot
+            # 排队等锁期间可能已被其他请求刷新
+            if not force and not ConfigService._invalidated and current is not None and current.is_fresh():
+                return current
+            ConfigService._invalidated = False
+            try:
+                snapshot = ConfigSnapshot(_load_configs(), time.monotonic())
+            except Exception:
+                ConfigService._invalidated = True
+                raise
+            # 整体替换引用：正在使用旧快照的会话不受影响
+            ConfigService._snapshot = snapshot
+
+        if current is not None and snapshot.configs != current.configs:
+            for listener in list(ConfigService._listeners):
+                try:
+                    listener(current, snapshot)
+                except Exception as e:
+                    print(f"Config listener failed: {e}")
+        return snapshot
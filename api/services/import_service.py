@@ -0,0 +1,244 @@
+import io
+import json
+import re
+import tempfile
+
+from api.db import get_backend, get_writer, run_in_db
+from api.init_db import FILL_LINE_GRAMS
+from api.services.script_service import SORT_GAP
+from api.services.script_store import script_store
+
+# 导入按块提交，每个写事务最多写入这么多行；块与块之间其他写入可以进入写线程
+IMPORT_BATCH_SIZE = 5000
+
+# 按字数估算台词时长
+DURATION_PER_CHAR_MS = 200
+MIN_DURATION_MS = 1000
+
+# 按出场顺序分配的角色键，与前端的 甲/乙/合 约定一致
+ROLE_KEYS = "甲乙丙丁戊己庚辛壬癸"
+NARRATOR_KEY = "合"
+NARRATOR_NAMES = {"合", "旁白", "全体", "众人", "合唱", "系统", "narrator", "all"}
+
+DEFAULT_TITLE = "未命名剧本"
+
+# 上传内容超过该大小时转存到临时文件，内存占用与文件大小无关
+UPLOAD_SPOOL_BYTES = 1024 * 1024
+# 攒够这么多字节再交给线程池写入临时文件，减少线程切换
+UPLOAD_WRITE_BYTES = 64 * 1024
+
+# "角色：台词"，兼容半角冒号、Markdown 列表/引用前缀和 **粗体** 角色名。
+# 角色名不含空白且不能全是数字，"10:30 他们出发了"、"第一幕 场景：客厅" 不是台词
+_SPEAKER_RE = re.compile(
+    r"^(?:[-*+]\s+|>\s*)?(?:\*\*|__)?(?P<role>(?!\d+(?:\*\*|__)?\s*[：:])"
+    r"[^\s：:，。！？,.!?*_()（）][^\s：:，。！？,.!?*_]{0,19}?)(?:\*\*|__)?"
+    r"\s*[：:]\s*(?:\*\*|__)?\s*(?P<content>.*)$"
+)
+_RULE_RE = re.compile(r"^([-*_])\s*(\1\s*){2,}$")
+
+
+def estimate_duration(content):
+    return max(MIN_DURATION_MS, len(content) * DURATION_PER_CHAR_MS)
+
+
+class ScreenplayParser:
+    """Parses "角色：台词" style plain text or Markdown one line at a time.
+
+    ``parse`` is a generator over ``(speaker, content)`` and only ever buffers
+    the current line, so memory stays flat for any file size. A line without a
+    speaker continues the previous line, unless it is a parenthesised stage
+    direction, which becomes a narrator line. The first ``# heading`` is kept
+    as ``title``.
+    """
+
+    def __init__(self):
+        self.title = None
+
+    def parse(self, lines):
+        speaker, content = None, None
+        in_fence = False
+        for raw in lines:
+            text = raw.strip()
+            if text.startswith("```"):
+                in_fence = not in_fence
+                continue
+            if in_fence or not text or _RULE_RE.match(text) or (text.startswith("<!--") and text.endswith("-->")):
+                continue
+            if text.startswith("#"):
+                if self.title is None:
+                    self.title = text.lstrip("#").strip() or None
+                continue
+
+            match = _SPEAKER_RE.match(text)
+            if match and match.group("content"):
+                if content:
+                    yield speaker, content
+                speaker, content = match.group("role").strip(), match.group("content").strip()
+            elif text[0] in "(（" and text[-1] in ")）":
+                if content:
+                    yield speaker, content
+                speaker, content = NARRATOR_KEY, text
+            elif content:
+                content = content + text
+        if content:
+            yield speaker, content
+
+
+class RoleMapper:
+    """Maps speaker names to role keys and builds ``role_map_json`` as it goes."""
+
+    def __init__(self):
+        self.role_map = {}    # role_key -> 显示名
+        self._keys = {}       # speaker -> role_key
+        self._used = set()    # 已分配的 role_key
+        self._free = list(ROLE_KEYS)
+
+    def key_for(self, speaker):
+        key = self._keys.get(speaker)
+        if key is not None:
+            return key
+        if speaker.lower() in NARRATOR_NAMES:
+            key = NARRATOR_KEY
+        elif speaker in self._free:
+            # 剧本本身就用 甲/乙 命名时保持原样
+            key = speaker
+            self._free.remove(key)
+        elif self._free:
+            key = self._free.pop(0)
+        else:
+            # 天干用完后以名字作键；与已分配的键重名 (如名字就叫 "甲") 时加序号
+            key, n = speaker, 2
+            while key in self._used:
+                key, n = f"{speaker}{n}", n + 1
+        self._keys[speaker] = key
+        self._used.add(key)
+        # 舞台说明默认记为 "合"，之后出现的 旁白/众人 等名字更适合显示
+        if self.role_map.get(key) in (None, NARRATOR_KEY):
+            self.role_map[key] = speaker
+        return key
+
+
+def _begin_op(title, description):
+    def op(conn):
+        story_id = conn.execute(
+            "INSERT INTO script_stories (title, description, role_map_json) VALUES (?, ?, '{}')",
+            (title or DEFAULT_TITLE, description or "")
+        ).lastrowid
+        # 逐行触发器 (全文索引、统计) 对该剧本暂停，改为每块写入后整块补齐，快数倍
+        conn.execute("INSERT INTO script_bulk_loads (story_id) VALUES (?)", (story_id,))
+        return story_id
+    return op
+
+
+def _chunk_op(story_id, batch):
+    def op(conn):
+        conn.executemany(
+            "INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES (?, ?, ?, ?, ?)",
+            batch
+        )
+        if get_backend().name == "sqlite":
+            # MySQL 的 FULLTEXT 索引由 InnoDB 自己维护，不经过触发器
+            span = (story_id, batch[0][4], batch[-1][4])
+            conn.execute(
+                "INSERT INTO script_lines_fts(rowid, content) "
+                "SELECT id, content FROM script_lines WHERE story_id = ? AND sort_order BETWEEN ? AND ?", span
+            )
+            conn.execute(FILL_LINE_GRAMS.format(where="l.story_id = ? AND l.sort_order BETWEEN ? AND ?"), span * 2)
+    return op
+
+
+def _finish_op(story_id, title, roles, count, total_duration, role_counts):
+    def op(conn):
+        conn.executemany(
+            "INSERT INTO script_story_roles (story_id, role_key, line_count) VALUES (?, ?, ?)",
+            [(story_id, key, n) for key, n in role_counts.items()]
+        )
+        conn.execute("DELETE FROM script_bulk_loads WHERE story_id=?", (story_id,))
+
+        # 新剧本从 revision 1 开始，之前没有可用的增量日志
+        conn.execute(
+            "UPDATE script_stories SET title=?, role_map_json=?, line_count=?, total_duration_ms=?, "
+            "revision=1, change_floor=1 WHERE id=?",
+            (title, json.dumps(roles.role_map, ensure_ascii=False), count, total_duration, story_id)
+        )
+    return op
+
+
+def _discard_op(story_id):
+    def op(conn):
+        # 已写入的块都已建好索引，逐行删除触发器与之一致
+        conn.execute("DELETE FROM script_lines WHERE story_id=?", (story_id,))
+        conn.execute("DELETE FROM script_story_roles WHERE story_id=?", (story_id,))
+        conn.execute("DELETE FROM script_stories WHERE id=?", (story_id,))
+        conn.execute("DELETE FROM script_bulk_loads WHERE story_id=?", (story_id,))
+    return op
+
+
+def import_lines(lines, title=None, description=""):
+    """解析并导入为新剧本，返回 {storyId, lines, roleMap}。阻塞调用，不能在写线程内执行。
+
+    每 IMPORT_BATCH_SIZE 行作为一个写操作提交，长剧本不会长时间独占写线程；
+    导入完成前剧本的 revision 为 0，失败时删除已写入的部分
+    """
+    submit = get_writer().submit
+    parser, roles = ScreenplayParser(), RoleMapper()
+    story_id = submit(_begin_op(title, description)).result()
+    try:
+        batch, count, total_duration, role_counts = [], 0, 0, {}
+        for speaker, content in parser.parse(lines):
+            count += 1
+            key, duration = roles.key_for(speaker), estimate_duration(content)
+            total_duration += duration
+            role_counts[key] = role_counts.get(key, 0) + 1
+            batch.append((story_id, key, content, duration, count * SORT_GAP))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                submit(_chunk_op(story_id, batch)).result()
+                batch = []
+        if batch:
+            submit(_chunk_op(story_id, batch)).result()
+        if count == 0:
+            raise ValueError("no '角色：台词' lines found")
+        submit(_finish_op(
+            story_id, title or parser.title or DEFAULT_TITLE, roles, count, total_duration, role_counts
+        )).result()
+    except Exception:
+        submit(_discard_op(story_id)).result()
+        raise
+    finally:
+        # 导入期间读到的不完整剧本不能留在缓存里
+        script_store.invalidate(story_id)
+    return {"storyId": story_id, "lines": count, "roleMap": roles.role_map}
+
+
+def import_file(path, title=None, description=""):
+    """同步导入一个文件 (命令行工具使用)，写入仍经由写线程"""
+    with open(path, encoding="utf-8-sig") as f:
+        return import_lines(f, title, description)
+
+
+class ImportService:
+    @staticmethod
+    async def import_screenplay(stream, title=None, description=""):
+        """从二进制文件对象流式导入为新剧本，返回 {storyId, lines, roleMap}"""
+        lines = io.TextIOWrapper(stream, encoding="utf-8-sig")
+        try:
+            # 解析在数据库线程池中进行，写入按块交给写线程
+            return await run_in_db(import_lines, lines, title, description)
+        finally:
+            lines.detach()
+
+    @staticmethod
+    async def import_upload(chunks, title=None, description=""):
+        """导入 HTTP 请求体：边接收边写入临时文件，接收完毕后在写线程中解析入库"""
+        with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES) as spool:
+            # 超过 UPLOAD_SPOOL_BYTES 后写的是磁盘文件，放到线程池里，不阻塞事件循环
+            buffer = bytearray()
+            async for chunk in chunks:
+                buffer += chunk
+                if len(buffer) >= UPLOAD_WRITE_BYTES:
+                    await run_in_db(spool.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await run_in_db(spool.write, bytes(buffer))
+            spool.seek(0)
+            return await ImportService.import_screenplay(spool, title, description)
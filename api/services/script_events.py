@@ -0,0 +1,143 @@
+import asyncio
+import json
+import os
+
+# 每个订阅者最多积压的推送条数。客户端跟不上时丢弃积压，改为补发一次合并后的增量
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("SCRIPTBUDDY_SUBSCRIBER_QUEUE_SIZE", "64"))
+
+# 队列中的补发标记
+RESYNC = object()
+
+
+def encode_event(event):
+    """推送消息只编码一次，所有订阅者共享同一个字符串"""
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+
+
+class Subscription:
+    __slots__ = ("story_id", "queue", "dropped", "lagging")
+
+    def __init__(self, story_id, queue_size):
+        self.story_id = story_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.lagging = False
+
+    def offer(self, item):
+        if self.lagging:
+            # 补发时会一并带上，无需排队
+            self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # 不等待慢客户端：清空积压，只留一个补发标记
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(RESYNC)
+            self.lagging = True
+
+    async def get(self):
+        item = await self.queue.get()
+        if item is RESYNC:
+            self.lagging = False
+        return item
+
+
+class ScriptEventHub:
+    """Fans committed script changes out to live subscribers, per story.
+
+    Everything except ``notify_threadsafe`` runs on the event loop, so no
+    locking is needed. Writers only mark a story dirty; one task per story
+    loads the delta since the last published revision and hands the encoded
+    event to every subscriber's bounded queue without awaiting any of them.
+    """
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.loop = None
+        self._topics = {}      # story_id -> set(Subscription)
+        self._revisions = {}   # story_id -> 已推送的 revision
+        self._dirty = set()
+        self._tasks = {}       # story_id -> 正在推送的任务
+        self.published = 0
+
+    def subscribe(self, story_id):
+        self.loop = asyncio.get_running_loop()
+        subscription = Subscription(story_id, self.queue_size)
+        self._topics.setdefault(story_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self._topics.get(subscription.story_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._topics[subscription.story_id]
+            self._revisions.pop(subscription.story_id, None)
+
+    def has_subscribers(self, story_id):
+        return story_id in self._topics
+
+    def revision(self, story_id):
+        return self._revisions.get(story_id)
+
+    def seen(self, story_id, revision):
+        """订阅者拿到初始状态后调用，作为之后增量的起点"""
+        if story_id in self._topics and story_id not in self._revisions:
+            self._revisions[story_id] = revision
+
+    def publish(self, story_id, event):
+        """把 ``event`` (含 revision) 放进该剧本所有订阅者的队列，已推送过的 revision 忽略"""
+        revision = event["revision"]
+        last = self._revisions.get(story_id)
+        if last is not None and revision <= last:
+            return
+        self._revisions[story_id] = revision
+        item = (revision, encode_event(event))
+        for subscription in self._topics.get(story_id, ()):
+            subscription.offer(item)
+        self.published += 1
+
+    def notify(self, story_id, load):
+        """写入提交后调用。``load(story_id, since)`` 为读取增量的协程函数；连续写入合并为一次推送"""
+        if story_id not in self._topics:
+            return
+        self._dirty.add(story_id)
+        if story_id not in self._tasks:
+            self._tasks[story_id] = asyncio.get_running_loop().create_task(self._drain(story_id, load))
+
+    def notify_threadsafe(self, story_id, load):
+        """供写线程回调 (如后台整理) 使用"""
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.notify, story_id, load)
+
+    async def _drain(self, story_id, load):
+        try:
+            while story_id in self._dirty and story_id in self._topics:
+                self._dirty.discard(story_id)
+                since = self._revisions.get(story_id)
+                try:
+                    event = await load(story_id, -1 if since is None else since)
+                except Exception as e:
+                    print(f"Error loading script changes for story {story_id}: {e}")
+                    return
+                if event is not None:
+                    self.publish(story_id, dict(event, type="changes"))
+        finally:
+            self._dirty.discard(story_id)
+            del self._tasks[story_id]
+
+    def stats(self):
+        return {
+            "stories": len(self._topics),
+            "subscribers": sum(len(subscribers) for subscribers in self._topics.values()),
+            "published": self.published,
+            "dropped": sum(s.dropped for subscribers in self._topics.values() for s in subscribers),
+        }
+
+
+script_events = ScriptEventHub()
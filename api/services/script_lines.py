@@ -0,0 +1,158 @@
+import json
+import sys
+from array import array
+from collections.abc import Sequence
+from itertools import accumulate
+from json.encoder import encode_basestring
+
+# duration_ms 可以为 NULL，数组里用 -1 表示
+NO_DURATION = -1
+
+
+def _encode_text(text):
+    # 即 json.dumps(ensure_ascii=False) 对字符串的转义，拼接结果与整体 encode_json 逐字节一致
+    return encode_basestring(text).encode("utf-8")
+
+
+def _decode_text(fragment):
+    if b"\\" not in fragment:
+        return fragment[1:-1].decode("utf-8")
+    return json.loads(fragment)
+
+
+class ScriptLines(Sequence):
+    """Read-only, array-backed list of a script's lines.
+
+    Each column is a typed ``array`` (ids, sort keys, durations, role indices)
+    and every distinct line text is stored once, already JSON-escaped, in a
+    single UTF-8 buffer addressed by (offset, length). A resident line costs
+    a few dozen bytes plus its text instead of a dict with five boxed values.
+
+    Indexing and iteration still yield the usual line dicts, built on demand;
+    :meth:`to_json` and :meth:`columns` serialize without materializing them.
+    """
+
+    __slots__ = ("ids", "sorts", "durations", "role_index", "roles", "_role_json",
+                 "text", "text_offsets", "text_lengths")
+
+    def __init__(self, rows=()):
+        """``rows`` 为 (id, role, content, duration, sort) 元组，按台词顺序给出"""
+        # 先转成列再整列构建数组，比逐行 append 快一倍多
+        columns = tuple(zip(*rows)) or ((),) * 5
+        ids, roles, contents, durations, sorts = columns
+        self.ids, self.sorts = array("q", ids), array("q", sorts)
+        self.durations = array("q", [NO_DURATION if d is None else d for d in durations])
+
+        self.roles = list(dict.fromkeys(roles))
+        role_of = {role: i for i, role in enumerate(self.roles)}
+        self.role_index = array("H", map(role_of.__getitem__, roles))
+        self._role_json = [_encode_text(role) for role in self.roles]
+
+        # 相同的台词 (如 "好的。") 只存一份
+        unique = list(dict.fromkeys(contents))
+        fragments = [_encode_text(text) for text in unique]
+        lengths = [len(fragment) for fragment in fragments]
+        slots = dict(zip(unique, zip(accumulate(lengths, initial=0), lengths)))
+        self.text = b"".join(fragments)
+        self.text_offsets = array("Q", [slots[text][0] for text in contents])
+        self.text_lengths = array("I", [slots[text][1] for text in contents])
+
+    @classmethod
+    def from_columns(cls, ids, sorts, durations, role_index, roles, text, text_offsets, text_lengths):
+        """由现成的列直接构建，不逐行处理 (快照读取使用)。
+
+        ``text`` 为 JSON 转义后 (含引号) 的台词文本所在的缓冲区，支持切片得到 bytes 即可 (如 mmap)
+        """
+        lines = cls.__new__(cls)
+        lines.ids, lines.sorts, lines.durations, lines.role_index = ids, sorts, durations, role_index
+        lines.roles = list(roles)
+        lines._role_json = [_encode_text(role) for role in lines.roles]
+        lines.text, lines.text_offsets, lines.text_lengths = text, text_offsets, text_lengths
+        return lines
+
+    @classmethod
+    def from_lines(cls, lines):
+        """由 ``{"id", "role", "content", "duration", "sort"}`` 字典构建"""
+        return cls((l["id"], l["role"], l["content"], l["duration"], l["sort"]) for l in lines)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _content_fragment(self, i):
+        offset = self.text_offsets[i]
+        return self.text[offset:offset + self.text_lengths[i]]
+
+    def _line(self, i):
+        duration = self.durations[i]
+        return {
+            "id": self.ids[i],
+            "role": self.roles[self.role_index[i]],
+            "content": _decode_text(self._content_fragment(i)),
+            "duration": None if duration == NO_DURATION else duration,
+            "sort": self.sorts[i]
+        }
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._line(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("line index out of range")
+        return self._line(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._line(i)
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, (str, bytes)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<ScriptLines {len(self)} lines, {self.nbytes} bytes>"
+
+    @property
+    def nbytes(self):
+        """常驻内存的估算值 (各数组与文本缓冲区，不含共享的角色字符串)"""
+        arrays = (self.ids, self.sorts, self.durations, self.role_index, self.text_offsets, self.text_lengths)
+        return (sys.getsizeof(self.text) + sum(a.itemsize * len(a) for a in arrays)
+                + sum(len(r) for r in self._role_json))
+
+    def _contents(self):
+        # 每段不同的文本只解码一次：拼成一个 JSON 数组整体 loads，重复的台词共享同一个 str
+        unique = {}
+        for offset, length in zip(self.text_offsets, self.text_lengths):
+            unique.setdefault(offset, length)
+        text = self.text
+        decoded = json.loads(b"[" + b",".join(text[o:o + n] for o, n in unique.items()) + b"]")
+        by_offset = dict(zip(unique, decoded))
+        return [by_offset[offset] for offset in self.text_offsets]
+
+    def to_json(self):
+        """编码为 JSON 数组，与 ``encode_json(list(self))`` 逐字节相同"""
+        ids, sorts, durations, role_index = self.ids, self.sorts, self.durations, self.role_index
+        offsets, lengths, text, role_json = self.text_offsets, self.text_lengths, self.text, self._role_json
+        parts = []
+        for i in range(len(ids)):
+            duration = durations[i]
+            offset = offsets[i]
+            parts.append(b'{"id":%d,"role":%s,"content":%s,"duration":%s,"sort":%d}' % (
+                ids[i], role_json[role_index[i]], text[offset:offset + lengths[i]],
+                b"null" if duration == NO_DURATION else b"%d" % duration, sorts[i]
+            ))
+        return b"[" + b",".join(parts) + b"]"
+
+    def columns(self):
+        """按列存放的台词 (msgpack 响应使用)，结构同 ``columnar_lines``"""
+        return {
+            "id": self.ids.tolist(),
+            "roles": list(self.roles),
+            "role": self.role_index.tolist(),
+            "content": self._contents(),
+            "duration": [None if d == NO_DURATION else d for d in self.durations],
+            "sort": self.sorts.tolist(),
+        }
@@ -1,49 +1,701 @@
+import itertools
 import json
-from api.db import query_all, execute_query
+import os
+import threading
+from api.db import get_backend, get_pool, get_writer, query_all, query_all_async, run_in_db, run_write
+from api.http_cache import EncodedResponse, JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, encode_json
+from api.services.script_events import script_events
+from api.services.script_lines import ScriptLines
+from api.services.script_snapshot import get_snapshot, mark_stale, snapshot_script, snapshot_scripts
+from api.services.script_store import script_store
+
+BATCH_ACTIONS = ("add", "update", "delete", "move")
+
+# 排序键间隔：新台词追加在末尾 + SORT_GAP，插入到两行之间时取中点，
+# 只写被插入/移动的那一行。某处间隔用尽后由写线程在后台重新编号整个剧本。
+SORT_GAP = 1024
+
+_compaction_pending = set()
+_compaction_lock = threading.Lock()
+
+# 每个剧本的变更日志至少保留最近这么多个 revision，更早的按批整理掉；
+# 落后更多的客户端从 /api/script/changes 拿到完整快照。
+CHANGE_LOG_RETENTION = int(os.environ.get("SCRIPTBUDDY_CHANGE_LOG_RETENTION", "1000"))
+
+# 批量操作类型 -> 变更日志中的 op
+CHANGE_OPS = {"add": "insert", "update": "update", "move": "update", "delete": "delete"}
+
+
+def _next_sort_after(conn, story_id, prev, exclude_id=None):
+    """``prev`` 之后第一行的排序键 (走 idx_story_order 范围扫描)"""
+    sql = "SELECT sort_order FROM script_lines WHERE story_id=? AND sort_order > ? AND id != ? ORDER BY sort_order LIMIT 1"
+    if prev is None:
+        sql = "SELECT sort_order FROM script_lines WHERE story_id=? AND id != ? ORDER BY sort_order LIMIT 1"
+        row = conn.execute(sql, (story_id, exclude_id or 0)).fetchone()
+    else:
+        row = conn.execute(sql, (story_id, prev, exclude_id or 0)).fetchone()
+    return row[0] if row else None
+
+
+def _sort_key_after(conn, story_id, after_id, exclude_id=None):
+    """计算插入到 ``after_id`` 之后的排序键。
+
+    ``after_id`` 为 None 表示追加到末尾，为 0 表示插到最前面。
+    间隔已用尽时就地重新编号该剧本后再计算；间隔即将用尽时安排后台整理。
+    """
+    _lock_story(conn, story_id)
+    if after_id is None:
+        row = conn.execute(
+            "SELECT MAX(sort_order) FROM script_lines WHERE story_id=? AND id != ?", (story_id, exclude_id or 0)
+        ).fetchone()
+        return (row[0] or 0) + SORT_GAP
+
+    for attempt in range(2):
+        if after_id == 0:
+            prev = None
+        else:
+            row = conn.execute(
+                "SELECT sort_order FROM script_lines WHERE id=? AND story_id=?", (after_id, story_id)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"line {after_id} not found in story {story_id}")
+            prev = row[0]
+        nxt = _next_sort_after(conn, story_id, prev, exclude_id)
+
+        if nxt is None:
+            return (prev or 0) + SORT_GAP
+        if prev is None:
+            prev = nxt - 2 * SORT_GAP
+        if nxt - prev >= 2:
+            key = (prev + nxt) // 2
+            if min(key - prev, nxt - key) <= 1:
+                _schedule_compaction(story_id)
+            return key
+        # 相邻两行之间已无整数空间 (后台整理尚未执行)，只能同步重新编号
+        _renumber_story(conn, story_id)
+    raise RuntimeError(f"could not allocate sort key in story {story_id}")
+
+
+def _lock_story(conn, story_id):
+    # MySQL 上多个写线程并发：先锁住剧本行，同一剧本的排序键计算与写入串行执行。
+    # SQLite 只有一个写线程，本身就是串行的
+    if get_backend().name == "mysql":
+        conn.execute("SELECT id FROM script_stories WHERE id=? FOR UPDATE", (story_id,))
+
+
+_RENUMBER_SQL = {
+    "sqlite": """
+        WITH ordered AS (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY sort_order, id) AS position
+            FROM script_lines WHERE story_id = ?
+        )
+        UPDATE script_lines SET sort_order = ordered.position * ?
+        FROM ordered WHERE script_lines.id = ordered.id
+        """,
+    "mysql": """
+        UPDATE script_lines AS l JOIN (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY sort_order, id) AS position
+            FROM script_lines WHERE story_id = ?
+        ) AS ordered ON l.id = ordered.id
+        SET l.sort_order = ordered.position * ?
+        """,
+}
+
+
+def _renumber_story(conn, story_id):
+    _lock_story(conn, story_id)
+    conn.execute(_RENUMBER_SQL[get_backend().name], (story_id, SORT_GAP))
+    # 所有台词的 sort 都变了：不逐行记日志，直接整理掉该剧本的日志，落后的客户端改拉快照
+    revision = _bump_revision(conn, story_id)
+    if revision is not None:
+        _compact_changes(conn, story_id, revision)
+
+
+def _bump_revision(conn, story_id):
+    # 不用 RETURNING (MySQL 不支持)；同一事务内紧接着读回，行锁保证读到的是自己写入的值
+    conn.execute("UPDATE script_stories SET revision = revision + 1 WHERE id=?", (story_id,))
+    row = conn.execute("SELECT revision FROM script_stories WHERE id=?", (story_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _compact_changes(conn, story_id, floor):
+    conn.execute("DELETE FROM script_changes WHERE story_id=? AND revision <= ?", (story_id, floor))
+    conn.execute(
+        "UPDATE script_stories SET change_floor = CASE WHEN change_floor > ? THEN change_floor ELSE ? END WHERE id=?",
+        (floor, floor, story_id)
+    )
+
+
+def _log_changes(conn, story_id, changes):
+    """一次写操作记为一个新 revision。``changes`` 为 [(line_id, op), ...]，返回新 revision"""
+    revision = _bump_revision(conn, story_id)
+    if revision is None:
+        return None
+    # 同一 revision 内多次改动同一行时保留第一次的 op (先 insert 后 update 仍算 insert)
+    first = {}
+    for line_id, op in changes:
+        first.setdefault(line_id, op)
+    conn.executemany(
+        "INSERT INTO script_changes (story_id, revision, line_id, op) VALUES (?, ?, ?, ?)",
+        [(story_id, revision, line_id, op) for line_id, op in first.items()]
+    )
+    if revision % CHANGE_LOG_RETENTION == 0:
+        _compact_changes(conn, story_id, revision - CHANGE_LOG_RETENTION)
+    return revision
+
+
+def _schedule_compaction(story_id):
+    # 同一剧本只排队一次；整理作为普通写操作在写线程后续批次中执行，不阻塞当前请求
+    with _compaction_lock:
+        if story_id in _compaction_pending:
+            return
+        _compaction_pending.add(story_id)
+
+    def compact(conn):
+        with _compaction_lock:
+            _compaction_pending.discard(story_id)
+        _renumber_story(conn, story_id)
+
+    def committed(_):
+        # 重新编号改变了 sort 字段，提交后让缓存失效并通知订阅者 (在写线程中执行)
+        mark_stale(story_id)
+        script_store.invalidate(story_id)
+        script_events.notify_threadsafe(story_id, ScriptService.get_changes)
+
+    get_writer().submit(compact).add_done_callback(committed)
+
+
+def _insert_line(conn, story_id, op):
+    sort = op.sort if op.sort is not None and op.after_id is None else _sort_key_after(conn, story_id, op.after_id)
+    return conn.execute(
+        "INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES (?, ?, ?, ?, ?)",
+        (story_id, op.role, op.content, op.duration, sort)
+    ).lastrowid
+
+
+def _has_line_fields(op):
+    # role_key / content 是 NOT NULL 列：缺少时在写入前按请求错误拒绝，而不是撞上约束
+    return op.role is not None and op.content is not None
+
+
+def _add_line(conn, data):
+    line_id = _insert_line(conn, data.story_id, data)
+    _log_changes(conn, data.story_id, [(line_id, "insert")])
+    return line_id
+
+
+def _line_story(conn, line_id):
+    row = conn.execute("SELECT story_id FROM script_lines WHERE id=?", (line_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _update_line(conn, data):
+    """返回台词所在的剧本；台词不存在时返回 None，不记 revision"""
+    story_id = _line_story(conn, data.id)
+    if story_id is None:
+        return None
+    # sort 为空时保持原位置
+    changed = conn.execute(
+        "UPDATE script_lines SET role_key=?, content=?, duration_ms=?, sort_order=COALESCE(?, sort_order) WHERE id=? AND story_id=?",
+        (data.role, data.content, data.duration, data.sort, data.id, story_id)
+    ).rowcount
+    if not changed:
+        return None
+    _log_changes(conn, story_id, [(data.id, "update")])
+    return story_id
+
+
+def _delete_line(conn, line_id):
+    story_id = _line_story(conn, line_id)
+    if story_id is None:
+        return None
+    if not conn.execute("DELETE FROM script_lines WHERE id=? AND story_id=?", (line_id, story_id)).rowcount:
+        return None
+    _log_changes(conn, story_id, [(line_id, "delete")])
+    return story_id
+
+
+def _move_line(conn, story_id, line_id, after_id):
+    """返回 line_id；该台词不在剧本中时返回 None，不做任何修改"""
+    if line_id == after_id:
+        raise ValueError(f"line {line_id} cannot be moved after itself")
+    if _line_story(conn, line_id) != story_id:
+        return None
+    sort = _sort_key_after(conn, story_id, after_id, exclude_id=line_id)
+    if not conn.execute("UPDATE script_lines SET sort_order=? WHERE id=? AND story_id=?", (sort, line_id, story_id)).rowcount:
+        return None
+    return line_id
+
+
+def _require_lines(conn, story_id, indexed_ops):
+    """批量操作引用的台词必须都在该剧本中，否则整批以 ValueError 拒绝"""
+    ids = sorted({op.id for _, op in indexed_ops})
+    placeholders = ",".join("?" * len(ids))
+    found = {row[0] for row in conn.execute(
+        f"SELECT id FROM script_lines WHERE story_id=? AND id IN ({placeholders})", (story_id, *ids)
+    )}
+    for index, op in indexed_ops:
+        if op.id not in found:
+            raise ValueError(f"ops[{index}]: line {op.id} not found in story {story_id}")
+
+
+# 批量读取一次最多的剧本数
+MAX_BULK_STORIES = 100
+
+# 分页参数
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+
+def _format_line(line):
+    return {
+        "id": line['id'],
+        "role": line['role_key'],
+        "content": line['content'],
+        "duration": line['duration_ms'],
+        "sort": line['sort_order']
+    }
+
+
+def columnar_lines(lines):
+    """台词按列存放 (msgpack 响应使用)：整数列为紧凑的 msgpack 整数数组，角色为 ``roles`` 中的下标"""
+    if isinstance(lines, ScriptLines):
+        return lines.columns()
+    roles, role_index = [], {}
+    for line in lines:
+        if line["role"] not in role_index:
+            role_index[line["role"]] = len(roles)
+            roles.append(line["role"])
+    return {
+        "id": [line["id"] for line in lines],
+        "roles": roles,
+        "role": [role_index[line["role"]] for line in lines],
+        "content": [line["content"] for line in lines],
+        "duration": [line["duration"] for line in lines],
+        "sort": [line["sort"] for line in lines],
+    }
+
+
+def columnar_script(script):
+    return {"meta": script["meta"], "lines": columnar_lines(script["lines"])}
+
+
+def _line_row(line):
+    return line['id'], line['role_key'], line['content'], line['duration_ms'], line['sort_order']
+
+
+def encode_script_json(script):
+    """整本剧本的 JSON 响应体。台词直接由 ScriptLines 序列化，不生成逐行 dict"""
+    lines = script["lines"]
+    if not isinstance(lines, ScriptLines):
+        return encode_json(script)
+    return b'{"meta":' + encode_json(script["meta"]) + b',"lines":' + lines.to_json() + b"}"
+
+
+def _encode_script_response(script, media_type):
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return EncodedResponse.from_obj(columnar_script(script), media_type)
+    return EncodedResponse(encode_script_json(script))
+
+
+def _format_meta(story):
+    return {
+        "title": story['title'],
+        "description": story['description'],
+        "roleMap": json.loads(story['role_map_json']) if story['role_map_json'] else {},
+        "revision": story['revision']
+    }
+
+
+def _load_scripts(story_ids):
+    """用两条 IN 查询读取多个剧本，按 story_id 一次遍历分组。不存在的剧本不出现在结果中"""
+    placeholders = ", ".join(["?"] * len(story_ids))
+    stories = query_all(f"SELECT * FROM script_stories WHERE id IN ({placeholders})", tuple(story_ids))
+    lines = query_all(
+        f"SELECT * FROM script_lines WHERE story_id IN ({placeholders}) ORDER BY story_id, sort_order, id",
+        tuple(story_ids)
+    )
+    # 结果已按 story_id 排序，逐段构建各剧本的 ScriptLines
+    grouped = {story_id: ScriptLines(_line_row(line) for line in group)
+               for story_id, group in itertools.groupby(lines, key=lambda line: line['story_id'])}
+    return {story['id']: {"meta": _format_meta(story), "lines": grouped.get(story['id']) or ScriptLines()}
+            for story in stories}
+
+
+def _load_changes(story_id, since):
+    """``since`` 之后的增量；日志已被整理或 ``since`` 不合法时返回完整快照。不存在的剧本返回 None"""
+    with get_pool().connection() as conn:
+        # 同一个读事务内读取 revision 和日志，两者对应同一时刻的快照
+        get_backend().begin_read(conn)
+        try:
+            story = conn.execute("SELECT * FROM script_stories WHERE id=?", (story_id,)).fetchone()
+            if story is None:
+                return None
+            revision = story['revision']
+
+            if since < story['change_floor'] or since > revision:
+                lines = conn.execute(
+                    "SELECT * FROM script_lines WHERE story_id=? ORDER BY sort_order, id", (story_id,)
+                ).fetchall()
+                script = {"meta": _format_meta(story), "lines": [_format_line(line) for line in lines]}
+                return {"revision": revision, "full": True, "script": script}
+
+            # 每行取 since 之后的第一条日志 (按主键回查该条的 op)，
+            # 再结合台词当前是否存在判断是新增、修改还是删除
+            rows = conn.execute(
+                """
+                SELECT c.line_id, c.op, l.* FROM (
+                    SELECT line_id, MIN(revision) AS revision FROM script_changes
+                    WHERE story_id = ? AND revision > ? GROUP BY line_id
+                ) AS m
+                JOIN script_changes AS c ON c.story_id = ? AND c.revision = m.revision AND c.line_id = m.line_id
+                LEFT JOIN script_lines AS l ON l.id = c.line_id AND l.story_id = ?
+                ORDER BY l.sort_order, c.line_id
+                """,
+                (story_id, since, story_id, story_id)
+            ).fetchall()
+        finally:
+            conn.rollback()
+
+    inserted, updated, deleted = [], [], []
+    for row in rows:
+        if row['id'] is None:
+            # 期间新增又删除的台词客户端从未见过，不必下发
+            if row['op'] != "insert":
+                deleted.append(row['line_id'])
+        elif row['op'] == "insert":
+            inserted.append(_format_line(row))
+        else:
+            updated.append(_format_line(row))
+    return {"revision": revision, "full": False, "inserted": inserted, "updated": updated, "deleted": deleted}
+
+
+def encode_cursor(line):
+    """台词在 (sort_order, id) 上的位置，作为下一页的游标"""
+    return f"{line['sort']}:{line['id']}"
+
+
+def decode_cursor(cursor):
+    try:
+        sort, line_id = cursor.split(":")
+        return int(sort), int(line_id)
+    except (AttributeError, ValueError):
+        raise ValueError(f"invalid cursor '{cursor}'")
+
+
+def _open_stream(story_id):
+    """为流式输出占用一个池连接并开启读事务，之后各页都在同一快照内读取。
+
+    返回 (conn, meta)；剧本不存在时归还连接，返回 (None, None)
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        get_backend().begin_read(conn)
+        story = conn.execute("SELECT * FROM script_stories WHERE id = ?", (story_id,)).fetchone()
+    except Exception:
+        pool.release(conn)
+        raise
+    if story is None:
+        pool.release(conn)
+        return None, None
+    return conn, _format_meta(story)
+
+
+def _stream_page(conn, story_id, after, limit):
+    if after is None:
+        sql = "SELECT * FROM script_lines WHERE story_id = ? ORDER BY sort_order ASC, id ASC LIMIT ?"
+        params = (story_id, limit)
+    else:
+        sql = ("SELECT * FROM script_lines WHERE story_id = ? AND (sort_order, id) > (?, ?) "
+               "ORDER BY sort_order ASC, id ASC LIMIT ?")
+        params = (story_id, *after, limit)
+    return [_format_line(line) for line in conn.execute(sql, params).fetchall()]
+
+
+def _committed(story_id):
+    """写操作提交后：让缓存和快照失效，并把增量推送给该剧本的订阅者 (不等待推送完成)"""
+    mark_stale(story_id)
+    script_store.invalidate(story_id)
+    script_events.notify(story_id, ScriptService.get_changes)
+
 
 class ScriptService:
     @staticmethod
-    def get_script_by_id(story_id):
+    async def get_script_by_id(story_id):
+        """读取完整剧本，优先命中进程内缓存。``lines`` 为只读的 ScriptLines，与缓存共享"""
+        script = script_store.get(story_id)
+        if script is not None:
+            return script
+
+        # 查询前记下版本号，期间若有写入则不回填缓存
+        version = script_store.version(story_id)
+
+        # 配置了快照时从 mmap 中解码，只查一次 revision 确认快照没有过期
+        if get_snapshot() is not None:
+            script = await run_in_db(snapshot_script, story_id)
+            if script is not None:
+                script_store.put(story_id, script, version)
+                return script
+
         # 1. Meta
-        sql_story = "SELECT * FROM script_stories WHERE id = %s LIMIT 1"
-        stories = query_all(sql_story, (story_id,))
-        if not stories:
+        meta = await ScriptService.get_story_meta(story_id)
+        if meta is None:
             return None
-        story = stories[0]
 
         # 2. Lines
-        sql_lines = "SELECT * FROM script_lines WHERE story_id = %s ORDER BY sort_order ASC"
-        lines = query_all(sql_lines, (story_id,))
-
-        output_lines = []
-        for line in lines:
-            output_lines.append({
-                "id": line['id'],
-                "role": line['role_key'],
-                "content": line['content'],
-                "duration": line['duration_ms']
-            })
+        sql_lines = "SELECT * FROM script_lines WHERE story_id = ? ORDER BY sort_order ASC, id ASC"
+        lines = await query_all_async(sql_lines, (story_id,))
+
+        script = {
+            "meta": meta,
+            "lines": ScriptLines(_line_row(line) for line in lines)
+        }
+        script_store.put(story_id, script, version)
+        return script
+
+    @staticmethod
+    async def get_scripts_by_ids(story_ids):
+        """批量读取剧本，返回 {story_id: script}。缓存未命中的剧本合并为固定两条查询"""
+        story_ids = list(dict.fromkeys(story_ids))
+        if len(story_ids) > MAX_BULK_STORIES:
+            raise ValueError(f"at most {MAX_BULK_STORIES} stories per request")
+
+        result, missing, versions = {}, [], {}
+        for story_id in story_ids:
+            script = script_store.get(story_id)
+            if script is not None:
+                result[story_id] = script
+            else:
+                missing.append(story_id)
+                versions[story_id] = script_store.version(story_id)
+
+        if missing and get_snapshot() is not None:
+            for story_id, script in (await run_in_db(snapshot_scripts, missing)).items():
+                script_store.put(story_id, script, versions[story_id])
+                result[story_id] = script
+            missing = [story_id for story_id in missing if story_id not in result]
+
+        if missing:
+            loaded = await run_in_db(_load_scripts, missing)
+            for story_id, script in loaded.items():
+                script_store.put(story_id, script, versions[story_id])
+                result[story_id] = script
+        # 保持请求中的顺序
+        return {story_id: result[story_id] for story_id in story_ids if story_id in result}
+
+    @staticmethod
+    async def get_script_response(story_id, media_type=JSON_MEDIA_TYPE):
+        """剧本的预编码响应体 (含 ETag)，每个版本每种格式只编码一次。msgpack 格式的台词按列存放"""
+        encoded = script_store.get_encoded(story_id, media_type)
+        if encoded is not None:
+            return encoded
+        script = await ScriptService.get_script_by_id(story_id)
+        if script is None:
+            return None
+        # 整本编码和 gzip 压缩都是 CPU 密集操作，放到线程池里，不阻塞事件循环
+        encoded = await run_in_db(_encode_script_response, script, media_type)
+        script_store.attach_encoded(story_id, script, encoded)
+        return encoded
+
+    @staticmethod
+    async def get_story_meta(story_id):
+        sql_story = "SELECT * FROM script_stories WHERE id = ? LIMIT 1"
+        stories = await query_all_async(sql_story, (story_id,))
+        if not stories:
+            return None
+        return _format_meta(stories[0])
+
+    @staticmethod
+    async def get_changes(story_id, since):
+        """剧本自 revision ``since`` 以来的变更 (新增/修改/删除的台词)，日志不足时退化为完整快照"""
+        return await run_in_db(_load_changes, story_id, since)
+
+    @staticmethod
+    async def get_lines_page(story_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """按 (sort_order, id) 键集分页读取台词，返回本页台词和下一页游标 (末页为 None)"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if cursor:
+            sort, line_id = decode_cursor(cursor)
+            sql = ("SELECT * FROM script_lines WHERE story_id = ? AND (sort_order, id) > (?, ?) "
+                   "ORDER BY sort_order ASC, id ASC LIMIT ?")
+            params = (story_id, sort, line_id, limit)
+        else:
+            sql = "SELECT * FROM script_lines WHERE story_id = ? ORDER BY sort_order ASC, id ASC LIMIT ?"
+            params = (story_id, limit)
+        lines = [_format_line(line) for line in await query_all_async(sql, params)]
+        next_cursor = encode_cursor(lines[-1]) if len(lines) == limit else None
+        return {"lines": lines, "nextCursor": next_cursor}
 
+    @staticmethod
+    async def get_lines_range(story_id, offset=0, limit=DEFAULT_PAGE_SIZE):
+        """按行号取一段台词 (后台编辑器的虚拟列表按可见区域取数)，从缓存的整本剧本中切片。
+
+        返回 {meta, revision, total, offset, lines}；剧本不存在时返回 None
+        """
+        if offset < 0:
+            raise ValueError("offset must not be negative")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        script = await ScriptService.get_script_by_id(story_id)
+        if script is None:
+            return None
+        lines = script["lines"]
         return {
-            "meta": {
-                "title": story['title'],
-                "description": story['description'],
-                "roleMap": json.loads(story['role_map_json']) if story['role_map_json'] else {}
-            },
-            "lines": output_lines
+            "meta": script["meta"],
+            "revision": script["meta"]["revision"],
+            "total": len(lines),
+            "offset": offset,
+            "lines": lines[offset:offset + limit]
         }
 
     @staticmethod
-    def add_line(data):
-        sql = "INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES (%s, %s, %s, %s, %s)"
-        execute_query(sql, (data.story_id, data.role, data.content, data.duration, data.sort))
+    async def iter_script_ndjson(story_id, chunk_size=STREAM_CHUNK_SIZE):
+        """以 NDJSON 逐行输出剧本：首行为 {"meta": ...}，之后每行一句台词。
+
+        每次只从数据库取一页 (键集游标)，不会把整本剧本读进内存。所有页在同一个读事务内读取，
+        输出期间的写入不会造成漏行或重复，内容与首行 meta 中的 revision 一致
+        """
+        conn, meta = await run_in_db(_open_stream, story_id)
+        if conn is None:
+            return
+        try:
+            yield (json.dumps({"meta": meta}, ensure_ascii=False) + "\n").encode("utf-8")
+            after = None
+            while True:
+                lines = await run_in_db(_stream_page, conn, story_id, after, chunk_size)
+                if lines:
+                    yield "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+                if len(lines) < chunk_size:
+                    return
+                after = (lines[-1]["sort"], lines[-1]["id"])
+        finally:
+            # 客户端中途断开时同样结束读事务、归还连接
+            await run_in_db(get_pool().release, conn)
+
+    @staticmethod
+    async def add_line(data):
+        """新增台词。位置由 ``after_id`` 决定 (缺省追加到末尾)，显式 ``sort`` 仍按原值写入。
+        缺少 role/content 或锚点不存在时抛 ValueError"""
+        if not _has_line_fields(data):
+            raise ValueError("add requires role and content")
+        new_id = await run_write(lambda conn: _add_line(conn, data))
+        _committed(data.story_id)
+        return new_id
+
+    @staticmethod
+    async def update_line(data):
+        """返回台词所在的剧本 ID；台词不存在时返回 None，缺少 role/content 时抛 ValueError"""
+        if not _has_line_fields(data):
+            raise ValueError("update requires role and content")
+        story_id = await run_write(lambda conn: _update_line(conn, data))
+        if story_id is not None:
+            _committed(story_id)
+        return story_id
+
+    @staticmethod
+    async def move_line(story_id, line_id, after_id):
+        """把台词移动到 ``after_id`` 之后 (0 表示最前)，只改写被移动的这一行；台词不在该剧本中时返回 None"""
+        def op(conn):
+            moved = _move_line(conn, story_id, line_id, after_id)
+            if moved is not None:
+                _log_changes(conn, story_id, [(line_id, "update")])
+            return moved
+        moved = await run_write(op)
+        if moved is not None:
+            _committed(story_id)
+        return moved
 
     @staticmethod
-    def update_line(data):
-        sql = "UPDATE script_lines SET role_key=%s, content=%s, duration_ms=%s, sort_order=%s WHERE id=%s"
-        execute_query(sql, (data.role, data.content, data.duration, data.sort, data.id))
+    async def delete_line(line_id):
+        """返回台词所在的剧本 ID；台词不存在时返回 None"""
+        story_id = await run_write(lambda conn: _delete_line(conn, line_id))
+        if story_id is not None:
+            _committed(story_id)
+        return story_id
 
     @staticmethod
-    def delete_line(line_id):
-        sql = "DELETE FROM script_lines WHERE id=%s"
-        execute_query(sql, (line_id,))
+    async def apply_batch(story_id, ops):
+        """按顺序原子地执行一组 add/update/delete/move 操作，返回每个操作对应的台词 ID"""
+        if not ops:
+            # 空批次不产生新 revision
+            return []
+        for index, op in enumerate(ops):
+            if op.action not in BATCH_ACTIONS:
+                raise ValueError(f"ops[{index}]: unknown action '{op.action}'")
+            if op.action in ("add", "update") and not _has_line_fields(op):
+                raise ValueError(f"ops[{index}]: {op.action} requires role and content")
+            if op.action != "add" and op.id is None:
+                raise ValueError(f"ops[{index}]: {op.action} requires id")
+            if op.action == "move" and op.sort is None and op.after_id is None:
+                raise ValueError(f"ops[{index}]: move requires after_id or sort")
+        try:
+            ids = await run_write(lambda conn: ScriptService._apply_batch(conn, story_id, ops))
+        except get_backend().IntegrityError as e:
+            # 其余约束 (如剧本不存在) 同样是请求本身的问题
+            raise ValueError(f"batch rejected: {e}") from e
+        _committed(story_id)
+        return ids
+
+    @staticmethod
+    def _apply_batch(conn, story_id, ops):
+        # 在写线程内执行，整批处于同一个 SAVEPOINT 中：任何一步失败则全部回滚。
+        # 相邻的同类操作合并成一次 executemany。
+        _lock_story(conn, story_id)
+        ids = []
+        for action, indexed in itertools.groupby(enumerate(ops), key=lambda item: item[1].action):
+            indexed = list(indexed)
+            group = [op for _, op in indexed]
+            if action == "add":
+                if any(op.after_id is not None for op in group):
+                    ids.extend(_insert_line(conn, story_id, op) for op in group)
+                    continue
+                # 纯追加：一次算出末尾位置，整组 executemany
+                tail = _sort_key_after(conn, story_id, None) - SORT_GAP
+                rows = []
+                for op in group:
+                    if op.sort is None:
+                        tail += SORT_GAP
+                    rows.append((story_id, op.role, op.content, op.duration, tail if op.sort is None else op.sort))
+                ids.extend(get_backend().insert_many(
+                    conn,
+                    "INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                ))
+                continue
+
+            # 不存在或属于其他剧本的台词：整批拒绝，而不是当作已执行返回
+            _require_lines(conn, story_id, indexed)
+            if action == "move" and any(op.after_id is not None for op in group):
+                for index, op in indexed:
+                    if op.after_id is not None:
+                        moved = _move_line(conn, story_id, op.id, op.after_id)
+                    else:
+                        moved = conn.execute("UPDATE script_lines SET sort_order=? WHERE id=? AND story_id=?",
+                                             (op.sort, op.id, story_id)).rowcount
+                    if not moved:
+                        raise ValueError(f"ops[{index}]: line {op.id} not found in story {story_id}")
+                    ids.append(op.id)
+                continue
+
+            if action == "update":
+                matched = conn.executemany(
+                    "UPDATE script_lines SET role_key=?, content=?, duration_ms=?, sort_order=COALESCE(?, sort_order) WHERE id=? AND story_id=?",
+                    [(op.role, op.content, op.duration, op.sort, op.id, story_id) for op in group]
+                ).rowcount
+            elif action == "delete":
+                matched = conn.executemany(
+                    "DELETE FROM script_lines WHERE id=? AND story_id=?",
+                    [(op.id, story_id) for op in group]
+                ).rowcount
+            else:
+                matched = conn.executemany(
+                    "UPDATE script_lines SET sort_order=? WHERE id=? AND story_id=?",
+                    [(op.sort, op.id, story_id) for op in group]
+                ).rowcount
+            if matched != len(group):
+                # 同一组里重复删除同一行等情况：前面的检查已通过，但有操作没有生效
+                raise ValueError(f"ops[{indexed[0][0]}..{indexed[-1][0]}]: only {matched} of {len(group)} {action} ops matched a line")
+            ids.extend(op.id for op in group)
+        _log_changes(conn, story_id, [(line_id, CHANGE_OPS[op.action]) for line_id, op in zip(ids, ops)])
+        return ids
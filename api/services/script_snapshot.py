@@ -0,0 +1,354 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from api.db import get_backend, get_pool, query_all
+from api.services.script_lines import NO_DURATION, ScriptLines, _decode_text, _encode_text
+
+# 快照文件路径 (可选)。设置后 ScriptService 优先从快照读取剧本，适合冷启动和只读的边缘节点
+SNAPSHOT_FILE = os.environ.get("SCRIPTBUDDY_SNAPSHOT")
+# 每隔多少秒检查一次快照文件是否被替换、以及其他进程是否改过快照中的剧本 (按 revision 批量比对)
+SNAPSHOT_CHECK_INTERVAL = float(os.environ.get("SCRIPTBUDDY_SNAPSHOT_CHECK_INTERVAL", "5"))
+
+# --- 文件格式 (小端) ---
+# header | story records | role index | line columns | string index | string data
+#
+# header:  magic, format version, story/line/role/string 数量, 各分区的起始偏移
+# story:   id, revision, title/description/role_map_json 的字符串号, 首行序号, 行数, 首个角色序号, 角色数
+#          (按 id 升序，可二分查找)
+# role:    各剧本出场角色的字符串号 (I)，台词的 role 列是剧本内的角色序号
+# line:    按列存放，每列覆盖全部台词，同一剧本的行连续且已排好序：
+#          id (q), sort_order (q), duration_ms (q，NULL 存 NO_DURATION), role (H),
+#          content 在文件中的绝对偏移 (Q) 与长度 (I)
+# string:  (offset, length) 定长索引 + 数据。字符串存 JSON 转义后的形式 (含引号)，相同的只存一份
+#
+# 读取剧本时各列整段拷贝成 array，台词文本直接引用 mmap，不逐行解析也不解码字符串。
+MAGIC = b"SBSNAP\0\0"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<8sIIIII4x5Q")
+STORY = struct.Struct("<qqIIIIIII4x")
+STRING = struct.Struct("<QI4x")
+LINE_COLUMNS = ("q", "q", "q", "H", "Q", "I")   # id, sort, duration, role, content offset, content length
+ROLE_TYPE = "I"
+MAX_ROLES = 0xFFFF
+
+assert [array(t).itemsize for t in LINE_COLUMNS + (ROLE_TYPE,)] == [8, 8, 8, 2, 8, 4, 4]
+_LINE_BYTES = sum(array(t).itemsize for t in LINE_COLUMNS)
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class StringTable:
+    """Deduplicating table of JSON-escaped strings used while writing a snapshot."""
+
+    def __init__(self):
+        self._ids = {}
+        self.slots = []       # sid -> (数据区内偏移, 长度)
+        self.data = bytearray()
+
+    def add(self, text):
+        text = text or ""
+        sid = self._ids.get(text)
+        if sid is None:
+            raw = _encode_text(text)
+            sid = self._ids[text] = len(self.slots)
+            self.slots.append((len(self.data), len(raw)))
+            self.data += raw
+        return sid
+
+    def __len__(self):
+        return len(self.slots)
+
+
+def _pack(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def write_snapshot(path, story_ids=None, conn=None):
+    """把指定剧本 (默认全部) 导出为快照文件，原子替换 ``path``。返回 (剧本数, 台词数)"""
+    if conn is None:
+        with get_pool().connection() as conn:
+            return write_snapshot(path, story_ids, conn)
+
+    # 单个读事务内导出，剧本与台词属于同一时刻
+    get_backend().begin_read(conn)
+    try:
+        if story_ids:
+            placeholders = ", ".join(["?"] * len(story_ids))
+            stories = conn.execute(
+                f"SELECT * FROM script_stories WHERE id IN ({placeholders}) ORDER BY id", tuple(story_ids)
+            ).fetchall()
+        else:
+            stories = conn.execute("SELECT * FROM script_stories ORDER BY id").fetchall()
+
+        strings = StringTable()
+        story_records, role_sids = bytearray(), []
+        ids, sorts, durations, roles, contents = [], [], [], [], []
+        for story in stories:
+            first, first_role, story_roles = len(ids), len(role_sids), {}
+            for line in conn.execute(
+                "SELECT id, sort_order, role_key, content, duration_ms FROM script_lines "
+                "WHERE story_id=? ORDER BY sort_order, id", (story['id'],)
+            ):
+                ids.append(line[0])
+                sorts.append(line[1])
+                durations.append(NO_DURATION if line[4] is None else line[4])
+                roles.append(story_roles.setdefault(line[2], len(story_roles)))
+                contents.append(strings.add(line[3]))
+            if len(story_roles) > MAX_ROLES:
+                raise SnapshotError(f"story {story['id']}: more than {MAX_ROLES} roles")
+            role_sids += [strings.add(role) for role in story_roles]
+            story_records += STORY.pack(
+                story['id'], story['revision'], strings.add(story['title']), strings.add(story['description']),
+                strings.add(story['role_map_json']), first, len(ids) - first, first_role, len(story_roles)
+            )
+    finally:
+        conn.rollback()
+
+    stories_at = HEADER.size
+    roles_at = stories_at + len(story_records)
+    lines_at = roles_at + len(role_sids) * array(ROLE_TYPE).itemsize
+    index_at = lines_at + len(ids) * _LINE_BYTES
+    data_at = index_at + len(strings) * STRING.size
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(stories), len(ids), len(role_sids), len(strings),
+                         stories_at, roles_at, lines_at, index_at, data_at)
+    offsets = [data_at + strings.slots[sid][0] for sid in contents]
+    lengths = [strings.slots[sid][1] for sid in contents]
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(story_records)
+        f.write(_pack(ROLE_TYPE, role_sids))
+        for typecode, values in zip(LINE_COLUMNS, (ids, sorts, durations, roles, offsets, lengths)):
+            f.write(_pack(typecode, values))
+        f.write(b"".join(STRING.pack(*slot) for slot in strings.slots))
+        f.write(strings.data)
+    os.replace(tmp, path)
+    return len(stories), len(ids)
+
+
+class ScriptSnapshot:
+    """Read-only view over a memory-mapped snapshot file.
+
+    Opening only validates the header. A script is assembled from the
+    mapping without parsing: each line column is one slice copied into an
+    ``array``, and the ``ScriptLines`` text buffer is the mapping itself, so
+    line contents stay JSON-escaped bytes in the page cache until serialized.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._mmap.size() < HEADER.size:
+                raise SnapshotError(f"{path}: truncated snapshot")
+            (magic, version, self.story_count, self.line_count, self.role_count, self.string_count,
+             self._stories_at, self._roles_at, self._lines_at, self._index_at,
+             self._data_at) = HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise SnapshotError(f"{path}: not a version {FORMAT_VERSION} script snapshot")
+            if self._data_at > self._mmap.size():
+                raise SnapshotError(f"{path}: truncated snapshot")
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def close(self):
+        self._mmap.close()
+
+    def string(self, sid):
+        offset, length = STRING.unpack_from(self._mmap, self._index_at + sid * STRING.size)
+        start = self._data_at + offset
+        return _decode_text(self._mmap[start:start + length])
+
+    def _record(self, index):
+        return STORY.unpack_from(self._mmap, self._stories_at + index * STORY.size)
+
+    def _story(self, story_id):
+        # story 记录按 id 升序，二分查找
+        lo, hi = 0, self.story_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = self._record(mid)
+            if record[0] == story_id:
+                return record
+            if record[0] < story_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def story_ids(self):
+        return [self._record(i)[0] for i in range(self.story_count)]
+
+    def revisions(self):
+        """{story_id: 导出时的 revision}"""
+        return dict(self._record(i)[:2] for i in range(self.story_count))
+
+    def __contains__(self, story_id):
+        return self._story(story_id) is not None
+
+    def _meta(self, record):
+        role_map = self.string(record[4])
+        return {
+            "title": self.string(record[2]),
+            "description": self.string(record[3]),
+            "roleMap": json.loads(role_map) if role_map else {},
+            "revision": record[1]
+        }
+
+    def get_meta(self, story_id):
+        record = self._story(story_id)
+        return None if record is None else self._meta(record)
+
+    def _column(self, typecode, at, first, count):
+        column = array(typecode)
+        start = at + first * column.itemsize
+        column.frombytes(self._mmap[start:start + count * column.itemsize])
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column
+
+    def _lines(self, record):
+        first, count, first_role, role_count = record[5:9]
+        roles = [self.string(sid) for sid in self._column(ROLE_TYPE, self._roles_at, first_role, role_count)]
+        columns, at = [], self._lines_at
+        for typecode in LINE_COLUMNS:
+            columns.append(self._column(typecode, at, first, count))
+            at += self.line_count * columns[-1].itemsize
+        ids, sorts, durations, role_index, offsets, lengths = columns
+        return ScriptLines.from_columns(ids, sorts, durations, role_index, roles, self._mmap, offsets, lengths)
+
+    def iter_lines(self, story_id):
+        record = self._story(story_id)
+        return iter(()) if record is None else iter(self._lines(record))
+
+    def get_script(self, story_id):
+        """与 ScriptService.get_script_by_id 相同的结构；剧本不在快照中时返回 None"""
+        record = self._story(story_id)
+        if record is None:
+            return None
+        return {"meta": self._meta(record), "lines": self._lines(record)}
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+# use_snapshot 指定后不再跟随 SNAPSHOT_FILE
+_pinned = False
+# 已加载文件的 (mtime, size)；None 表示文件不存在或无法打开，_UNCHECKED 表示还没看过
+_UNCHECKED = object()
+_file_state = _UNCHECKED
+_file_checked_at = 0.0
+_revisions_checked_at = None
+# 快照中的内容已过期的剧本：本进程的写入 (mark_stale) 与定期比对 revision 发现的其他进程的写入
+_stale = set()
+
+
+def _install(snapshot):
+    # 调用方持有 _snapshot_lock。旧快照不主动关闭：缓存中的 ScriptLines 仍引用它的 mmap，随引用释放
+    global _snapshot, _revisions_checked_at
+    _snapshot = snapshot
+    _revisions_checked_at = None
+    _stale.clear()
+
+
+def _reload_if_changed():
+    global _file_state, _file_checked_at
+    _file_checked_at = time.monotonic()
+    try:
+        stat = os.stat(SNAPSHOT_FILE)
+        state = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        state = None
+    if state == _file_state:
+        return
+    snapshot = None
+    if state is None:
+        print(f"Script snapshot {SNAPSHOT_FILE} not found, reading scripts from the database")
+    else:
+        try:
+            snapshot = ScriptSnapshot(SNAPSHOT_FILE)
+        except (OSError, SnapshotError) as e:
+            print(f"Script snapshot not loaded: {e}")
+    _install(snapshot)
+    # 打不开的文件同样记下状态，文件不变就不再重试
+    _file_state = state
+
+
+def get_snapshot():
+    """按 ``SNAPSHOT_FILE`` 加载的快照；未配置或文件不存在时返回 None。
+
+    每隔 SNAPSHOT_CHECK_INTERVAL 秒 stat 一次文件：重新导出 (文件被替换) 后自动换用新快照，
+    文件不存在的结果同样缓存到下次检查
+    """
+    if _pinned or not SNAPSHOT_FILE:
+        return _snapshot
+    if _file_state is _UNCHECKED or time.monotonic() - _file_checked_at >= SNAPSHOT_CHECK_INTERVAL:
+        with _snapshot_lock:
+            if _file_state is _UNCHECKED or time.monotonic() - _file_checked_at >= SNAPSHOT_CHECK_INTERVAL:
+                _reload_if_changed()
+    return _snapshot
+
+
+def use_snapshot(snapshot):
+    """替换当前快照 (None 表示停用)，之后不再跟随 SNAPSHOT_FILE"""
+    global _pinned
+    with _snapshot_lock:
+        _pinned = True
+        _install(snapshot)
+
+
+def mark_stale(story_id):
+    _stale.add(story_id)
+
+
+def _check_revisions(snapshot):
+    """其他进程的写入：每隔 SNAPSHOT_CHECK_INTERVAL 秒把快照中各剧本的 revision 与数据库批量比对一次"""
+    global _revisions_checked_at
+    with _snapshot_lock:
+        now = time.monotonic()
+        if snapshot is not _snapshot or (
+                _revisions_checked_at is not None and now - _revisions_checked_at < SNAPSHOT_CHECK_INTERVAL):
+            return
+        _revisions_checked_at = now
+    try:
+        current = {row['id']: row['revision'] for row in query_all("SELECT id, revision FROM script_stories")}
+    except Exception as e:
+        # 没有可用数据库的只读节点：以快照为准
+        print(f"Script snapshot revision check failed, serving snapshot as is: {e}")
+        return
+    stale = {story_id for story_id, revision in snapshot.revisions().items() if current.get(story_id) != revision}
+    with _snapshot_lock:
+        if snapshot is _snapshot:
+            _stale.update(stale)
+
+
+def snapshot_scripts(story_ids):
+    """快照中仍是最新的剧本 {story_id: script}，不含过期的和快照里没有的"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return {}
+    _check_revisions(snapshot)
+    scripts = {}
+    for story_id in story_ids:
+        if story_id not in _stale:
+            script = snapshot.get_script(story_id)
+            if script is not None:
+                scripts[story_id] = script
+    return scripts
+
+
+def snapshot_script(story_id):
+    return snapshot_scripts([story_id]).get(story_id)
@@ -0,0 +1,140 @@
+import os
+import threading
+from collections import OrderedDict
+
+from api.services.script_lines import ScriptLines
+
+# 缓存总量上限 (估算字节数)，超出后按 LRU 淘汰
+MAX_BYTES = int(os.environ.get("SCRIPTBUDDY_SCRIPT_STORE_BYTES", str(64 * 1024 * 1024)))
+
+# 粗略估算 (list of dict 形式的台词)：每句台词 dict 及其键值的固定开销 + 文本按 UTF-8 计
+LINE_OVERHEAD_BYTES = 400
+SCRIPT_OVERHEAD_BYTES = 1024
+
+
+def estimate_size(script):
+    size = SCRIPT_OVERHEAD_BYTES
+    lines = script["lines"]
+    if isinstance(lines, ScriptLines):
+        # ScriptLines 自己统计数组和文本缓冲区的大小
+        return size + lines.nbytes
+    for line in lines:
+        size += LINE_OVERHEAD_BYTES + len(line["content"]) * 3
+    return size
+
+
+class _Entry:
+    __slots__ = ("version", "script", "size", "encoded")
+
+    def __init__(self, version, script, size):
+        self.version = version
+        self.script = script
+        self.size = size
+        self.encoded = {}     # media_type -> 预编码的响应体 (见 api/http_cache.py)，首次下发时生成
+
+
+class ScriptStore:
+    """In-process cache of assembled scripts keyed by story id.
+
+    Each story has a version counter that every committed write bumps via
+    ``invalidate``. A reader that missed records the version *before* querying
+    the database and may only ``put`` if the version is unchanged, so a load
+    racing with a write can never re-insert stale data. Cached scripts are
+    shared objects and must not be mutated by callers.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # story_id -> _Entry
+        self._versions = {}             # story_id -> version (淘汰后仍保留)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, story_id):
+        return self._versions.get(story_id, 0)
+
+    def get(self, story_id):
+        with self._lock:
+            entry = self._entries.get(story_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(story_id)
+            self.hits += 1
+            return entry.script
+
+    def get_encoded(self, story_id, media_type="application/json"):
+        """Pre-encoded response for the cached script, or None if not encoded yet."""
+        with self._lock:
+            entry = self._entries.get(story_id)
+            if entry is None or media_type not in entry.encoded:
+                return None
+            self._entries.move_to_end(story_id)
+            self.hits += 1
+            return entry.encoded[media_type]
+
+    def attach_encoded(self, story_id, script, encoded):
+        """Remember the encoded form of ``script`` if it is still the cached one."""
+        with self._lock:
+            entry = self._entries.get(story_id)
+            if entry is None or entry.script is not script or encoded.media_type in entry.encoded:
+                return False
+            entry.encoded[encoded.media_type] = encoded
+            entry.size += encoded.size
+            self._bytes += encoded.size
+            self._evict()
+            return True
+
+    def put(self, story_id, script, version):
+        """Cache ``script`` loaded at ``version``; ignored if a write happened since."""
+        size = estimate_size(script)
+        with self._lock:
+            if self._versions.get(story_id, 0) != version or size > self.max_bytes:
+                return False
+            self._drop(story_id)
+            self._entries[story_id] = _Entry(version, script, size)
+            self._bytes += size
+            self._evict()
+            return True
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def invalidate(self, story_id):
+        """Bump the story's version and drop its entry. Call after the write commits."""
+        with self._lock:
+            self._versions[story_id] = self._versions.get(story_id, 0) + 1
+            self._drop(story_id)
+
+    def clear(self):
+        """Drop every entry and invalidate loads that are still in flight."""
+        with self._lock:
+            for story_id in set(self._versions) | set(self._entries):
+                self._versions[story_id] = self._versions.get(story_id, 0) + 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, story_id):
+        entry = self._entries.pop(story_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+script_store = ScriptStore()
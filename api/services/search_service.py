@@ -0,0 +1,121 @@
+from api.db import get_backend, query_all_async, run_in_db
+
+# trigram 分词只能匹配至少 3 个字符的片段，更短的词查 script_line_grams (SQLite)
+MIN_MATCH_CHARS = 3
+# MySQL ngram 的默认分词长度，更短的 (1 字) 词在 MySQL 上退化为 LIKE 过滤
+MYSQL_NGRAM_CHARS = 2
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _match_phrase(term):
+    # MySQL 布尔模式的短语内无法转义双引号，直接去掉
+    return '+"' + term.replace('"', ' ') + '"'
+
+
+def _fold(term):
+    # 与 SQLite lower() 一致，只转换 ASCII 字母
+    return "".join(c.lower() if c.isascii() else c for c in term)
+
+
+def _has_gram(story_column, sort_column, id_column):
+    """某一行包含短词：按 script_line_grams 主键点查"""
+    return (f"EXISTS (SELECT 1 FROM script_line_grams WHERE gram = ? AND story_id = {story_column} "
+            f"AND sort_order = {sort_column} AND line_id = {id_column})")
+
+
+def _like_pattern(term):
+    # 转义符用 '!'：反斜杠在 MySQL 字符串字面量里本身就是转义符，两种后端写法不一致
+    escaped = term.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+    return f"%{escaped}%"
+
+
+def build_search_query(query, story_id=None, limit=DEFAULT_LIMIT, dialect="sqlite"):
+    """把检索词转换为 (sql, params)。
+
+    空格分隔的每个词都必须出现 (子串匹配，天然支持前缀)。长度 >= 3 的词走全文索引并按相关度排序
+    (SQLite 为 FTS5 bm25；MySQL 为 ngram FULLTEXT，``dialect="mysql-like"`` 表示没有该索引)。
+    SQLite 上 1~2 字的短词查 script_line_grams，全部是短词时按剧本内顺序返回 (按索引顺序扫描，不排序)；
+    MySQL 上 2 字词也走 ngram 索引，只有 1 字词用 LIKE 过滤。score 越小越相关。
+    """
+    terms = query.split()
+    if not terms:
+        raise ValueError("empty query")
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    if dialect == "mysql-like":
+        indexed, short, like = [], [], terms
+    elif dialect == "mysql":
+        indexed = [t for t in terms if len(t) >= MYSQL_NGRAM_CHARS]
+        short, like = [], [t for t in terms if len(t) < MYSQL_NGRAM_CHARS]
+    else:
+        indexed = [t for t in terms if len(t) >= MIN_MATCH_CHARS]
+        short, like = [t for t in terms if len(t) < MIN_MATCH_CHARS], []
+
+    where, params = [], []
+    story_column, row = "l.story_id", ("l.story_id", "l.sort_order", "l.id")
+    if indexed and dialect == "mysql":
+        match = " ".join(_match_phrase(t) for t in indexed)
+        sql = "SELECT l.*, -MATCH(l.content) AGAINST (? IN BOOLEAN MODE) AS score FROM script_lines l"
+        where.append("MATCH(l.content) AGAINST (? IN BOOLEAN MODE)")
+        params += [match, match]
+        order = "score"
+    elif indexed:
+        sql = ("SELECT l.*, bm25(script_lines_fts) AS score "
+               "FROM script_lines_fts JOIN script_lines l ON l.id = script_lines_fts.rowid")
+        where.append("script_lines_fts MATCH ?")
+        params.append(" AND ".join(_fts_phrase(t) for t in indexed))
+        order = "score"
+    elif short:
+        # 没有长词时由片段表驱动：按主键顺序扫描最长的短词 (最少见)，其余短词逐行点查，
+        # 结果已按剧本和台词顺序排列，LIMIT 够数即停
+        short = sorted(short, key=len, reverse=True)
+        sql = ("SELECT l.*, 0.0 AS score "
+               "FROM script_line_grams g CROSS JOIN script_lines l ON l.id = g.line_id")
+        where.append("g.gram = ?")
+        params.append(_fold(short.pop(0)))
+        story_column, row = "g.story_id", ("g.story_id", "g.sort_order", "g.line_id")
+        order = "g.story_id, g.sort_order, g.line_id"
+    else:
+        sql = "SELECT l.*, 0.0 AS score FROM script_lines l"
+        order = "l.story_id, l.sort_order"
+    if story_id is not None:
+        where.append(f"{story_column} = ?")
+        params.append(story_id)
+    for term in short:
+        where.append(_has_gram(*row))
+        params.append(_fold(term))
+    for term in like:
+        where.append("l.content LIKE ? ESCAPE '!'")
+        params.append(_like_pattern(term))
+
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order} LIMIT ?"
+    params.append(limit)
+    return sql, tuple(params)
+
+
+class SearchService:
+    @staticmethod
+    async def search_lines(query, story_id=None, limit=DEFAULT_LIMIT):
+        """按内容检索台词，结果按相关度排序"""
+        backend, dialect = get_backend(), "sqlite"
+        if backend.name == "mysql":
+            # 第一次调用时查询 information_schema，之后读缓存
+            dialect = "mysql" if await run_in_db(backend.has_fulltext) else "mysql-like"
+        sql, params = build_search_query(query, story_id, limit, dialect)
+        rows = await query_all_async(sql, params)
+        return [{
+            "id": row['id'],
+            "storyId": row['story_id'],
+            "role": row['role_key'],
+            "content": row['content'],
+            "duration": row['duration_ms'],
+            "sort": row['sort_order'],
+            "score": row['score']
+        } for row in rows]
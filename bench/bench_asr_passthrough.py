@@ -0,0 +1,78 @@
+"""Benchmark: ASR proxy CPU per concurrent session, audio pass-through vs. re-encoding.
+
+Feeds a stream of browser audio frames (100ms of 16kHz 16-bit PCM each, a
+sine tone with a little noise so gzip has realistic work to do) through
+``relay_client_frame`` with pass-through on and off, for both raw and
+gzip-compressed client frames. Reports CPU time per frame, CPU per second of
+audio for one session, and how many concurrent sessions one core could relay.
+
+Usage (from the repo root):
+    python -m bench.bench_asr_passthrough [--frames 2000]
+"""
+import argparse
+import asyncio
+import gzip
+import math
+import random
+import struct
+import time
+
+from bench.common import quiet_logs
+
+FRAME_MS = 100
+SAMPLE_RATE = 16000
+
+
+def pcm_frames(count):
+    rng = random.Random(0)
+    samples_per_frame = SAMPLE_RATE * FRAME_MS // 1000
+    t = 0
+    for _ in range(count):
+        samples = []
+        for _ in range(samples_per_frame):
+            samples.append(int(8000 * math.sin(2 * math.pi * 220 * t / SAMPLE_RATE) + rng.gauss(0, 300)))
+            t += 1
+        yield struct.pack(f"<{samples_per_frame}h", *samples)
+
+
+def cpu_per_frame(relay, frames, passthrough):
+    from api.proxy.compression import CompressionStats
+
+    async def run():
+        stats = CompressionStats()
+        for i, data in enumerate(frames, 1):
+            await relay(data, i, stats, passthrough=passthrough)
+
+    started = time.process_time()
+    asyncio.run(run())
+    return (time.process_time() - started) / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    from api.proxy.asr_proxy import relay_client_frame
+    from api.proxy.protocol import CompressionBits, build_audio_only_request
+    quiet_logs()
+
+    audio = list(pcm_frames(args.frames))
+    clients = {
+        "raw": [build_audio_only_request(pcm, i, False) for i, pcm in enumerate(audio, 1)],
+        "gzip": [build_audio_only_request(gzip.compress(pcm), i, False, CompressionBits.Gzip)
+                 for i, pcm in enumerate(audio, 1)],
+    }
+    frames_per_second = 1000 / FRAME_MS
+
+    print(f"{args.frames} frames of {FRAME_MS}ms PCM ({len(audio[0])} bytes)")
+    print(f"{'client':<8}{'mode':<13}{'us/frame':>10}{'CPU ms/s':>10}{'sessions/core':>15}")
+    for client, frames in clients.items():
+        for mode, passthrough in (("re-encode", False), ("pass-through", True)):
+            per_frame = cpu_per_frame(relay_client_frame, frames, passthrough)
+            per_session = per_frame * frames_per_second
+            print(f"{client:<8}{mode:<13}{per_frame * 1e6:>10.1f}{per_session * 1000:>10.3f}{1 / per_session:>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
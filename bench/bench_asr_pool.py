@@ -0,0 +1,74 @@
+"""Benchmark: time to a ready ASR upstream connection, cold connect vs. the pre-warmed pool.
+
+Runs a local WebSocket server standing in for VolcEngine. The server delays
+every handshake by ``--handshake-ms`` to model the TLS round trips and
+credential check of the real upstream. Sessions start one after another,
+``--gap-ms`` apart (the pause between the user's turns):
+
+- "cold": ``connect_upstream`` per session, as the endpoint used to do;
+- "pooled": ``UpstreamPool.acquire`` with the pool refilling in the background.
+
+Usage (from the repo root):
+    python -m bench.bench_asr_pool [--sessions 50] [--handshake-ms 80] [--gap-ms 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import websockets
+
+from api.proxy.upstream_pool import UpstreamPool, connect_upstream
+from bench.common import quiet_logs
+
+
+async def run(args):
+    async def handler(ws, path=None):
+        await ws.wait_closed()
+
+    async def slow_handshake(path, headers):
+        await asyncio.sleep(args.handshake_ms / 1000)
+
+    server = await websockets.serve(handler, "127.0.0.1", 0, process_request=slow_handshake)
+    url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    pool = UpstreamPool(url=url, max_idle=4, check_interval=1)
+
+    async def cold():
+        return await connect_upstream(url, {})
+
+    async def pooled():
+        return (await pool.acquire(("app", "token"))).ws
+
+    print(f"{'mode':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for label, connect in (("cold", cold), ("pooled", pooled)):
+        timings = []
+        for _ in range(args.sessions):
+            started = time.perf_counter()
+            ws = await connect()
+            timings.append((time.perf_counter() - started) * 1000)
+            await ws.close()
+            await asyncio.sleep(args.gap_ms / 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{label:>8}{statistics.median(timings):>10.1f}{p95:>10.1f}{timings[-1]:>10.1f}")
+    print(f"pool: {pool.stats()}")
+
+    await pool.close()
+    # 等服务端把取消的预连接握手走完再关闭
+    await asyncio.sleep(args.handshake_ms / 1000 * 2)
+    server.close()
+    await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--handshake-ms", type=float, default=80)
+    parser.add_argument("--gap-ms", type=float, default=20)
+    args = parser.parse_args()
+    quiet_logs()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark: bytes sent and latency for warm clients on /api/script and /api/config.
+
+Compares a plain refetch, a gzip-accepting refetch and a conditional
+refetch carrying the ETag from the previous response.
+
+Usage (from the repo root):
+    python -m bench.bench_conditional_get [--lines 2000] [--requests 2000]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from bench.bench_script_store import seed_lines
+from bench.common import quiet_logs, temp_database
+
+
+async def measure(app, path, requests):
+    results = []
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        etag = (await client.get(path)).headers["etag"]
+        modes = (
+            ("full", {"Accept-Encoding": "identity"}),
+            ("gzip", {"Accept-Encoding": "gzip"}),
+            ("304", {"Accept-Encoding": "gzip", "If-None-Match": etag}),
+        )
+        for label, headers in modes:
+            timings, sent = [], 0
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                timings.append((time.perf_counter() - started) * 1000)
+                # 线路上的字节数：未解压的响应体
+                sent += len(response.read()) if response.status_code == 304 else int(response.headers["content-length"])
+            results.append((label, sent / requests, statistics.median(timings)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with temp_database():
+        from api.main import app
+        quiet_logs()
+        seed_lines(args.lines)
+        print(f"\nstory with {args.lines + 7} lines, {args.requests} requests per mode")
+        print(f"{'endpoint':<14}{'mode':<8}{'bytes/resp':>12}{'p50 ms':>10}")
+        for path in ("/api/script?id=1", "/api/config"):
+            for label, size, p50 in asyncio.run(measure(app, path, args.requests)):
+                print(f"{path.split('?')[0]:<14}{label:<8}{size:>12.0f}{p50:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark: per-call sqlite connections vs. the pooled WAL connection manager.
+
+Drives `/api/script` and `/api/config` in-process through the ASGI app with
+N concurrent clients and reports requests/s for both data-access modes.
+
+Usage (from the repo root):
+    python -m bench.bench_db_pool [--concurrency 32] [--seconds 3]
+"""
+import argparse
+import asyncio
+import sqlite3
+import time
+
+import httpx
+
+import api.db as db
+from bench.common import quiet_logs, temp_database
+
+
+def legacy_query_all(sql, params=None):
+    # 旧实现：每次调用都新建并关闭连接
+    conn = sqlite3.connect(db.DB_FILE)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql.replace('%s', '?'), params or ())
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+async def run_load(app, path, concurrency, seconds):
+    done = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker(client):
+        nonlocal done
+        while time.perf_counter() < deadline:
+            response = await client.get(path)
+            assert response.status_code == 200, response.text
+            done += 1
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return done / elapsed
+
+
+def patch_query_all(fn):
+    # 服务层经由 query_all_async -> api.db.query_all 访问数据库
+    db.query_all = fn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with temp_database():
+        from api.main import app
+        quiet_logs()
+
+        print(f"\nconcurrency={args.concurrency}, {args.seconds:.1f}s per run")
+        print(f"{'endpoint':<16}{'per-call conn':>16}{'pooled':>12}{'speedup':>10}")
+        pooled_query_all = db.query_all
+        for path in ("/api/script?id=1", "/api/config"):
+            patch_query_all(legacy_query_all)
+            before = asyncio.run(run_load(app, path, args.concurrency, args.seconds))
+            patch_query_all(pooled_query_all)
+            after = asyncio.run(run_load(app, path, args.concurrency, args.seconds))
+            print(f"{path.split('?')[0]:<16}{before:>12.0f} r/s{after:>8.0f} r/s{after / before:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
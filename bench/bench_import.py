@@ -0,0 +1,57 @@
+"""Benchmark: streaming screenplay import.
+
+Writes a synthetic "角色：台词" screenplay to a temp file and imports it as a
+new story through the writer thread, reporting wall time and lines/s, then
+imports it again under tracemalloc to report the peak Python heap, so flat
+memory use can be checked across sizes.
+
+Usage (from the repo root):
+    python -m bench.bench_import [--lines 100000 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from bench.common import temp_database
+
+SPEAKERS = ["导演", "演员甲", "演员乙", "旁白"]
+
+
+def write_screenplay(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# 压测剧本\n\n")
+        for i in range(count):
+            f.write(f"{SPEAKERS[i % len(SPEAKERS)]}：第 {i} 句台词，内容长度大致和真实剧本相当。\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[100_000])
+    args = parser.parse_args()
+
+    from api.services.import_service import import_file
+
+    print(f"{'lines':>10}{'file':>10}{'seconds':>10}{'lines/s':>12}{'peak heap':>12}")
+    for count in args.lines:
+        with temp_database(), tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "play.md")
+            write_screenplay(path, count)
+            size_mb = os.path.getsize(path) / 1e6
+
+            started = time.perf_counter()
+            result = import_file(path)
+            elapsed = time.perf_counter() - started
+            assert result["lines"] == count
+
+            # tracemalloc 本身会拖慢解析，单独跑一遍只看内存
+            tracemalloc.start()
+            import_file(path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{count:>10}{size_mb:>8.1f}MB{elapsed:>10.2f}{count / elapsed:>12.0f}{peak / 1e6:>10.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Benchmark: dict-per-line JSON vs. column-wise MessagePack for script payloads.
+
+Builds a script of N lines in the same shape ``ScriptService`` returns and
+reports, for each encoding, the body size (raw and gzip), the server-side
+encode time (including the column transform for msgpack) and, for reference,
+the decode time in Python.
+
+Usage (from the repo root):
+    python -m bench.bench_msgpack [--lines 100 1000 10000]
+"""
+import argparse
+import gzip
+import json
+import time
+
+import msgpack
+
+from api.http_cache import GZIP_LEVEL, encode_json, encode_msgpack
+from api.services.script_service import columnar_script
+
+
+def make_script(count):
+    return {
+        "meta": {"title": "压测剧本", "description": "", "roleMap": {"甲": "面试官", "乙": "求职者", "合": "旁白"}, "revision": 1},
+        "lines": [{"id": 1000 + i, "role": "甲乙合"[i % 3], "content": f"第 {i} 句台词，用来模拟一部长剧本里的普通对白。",
+                   "duration": 3000, "sort": (i + 1) * 1024} for i in range(count)]
+    }
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'lines':>7}{'format':>10}{'bytes':>10}{'gzip':>10}{'encode ms':>11}{'decode ms':>11}")
+    for count in args.lines:
+        script = make_script(count)
+        encoders = (
+            ("json", lambda: encode_json(script), json.loads),
+            ("msgpack", lambda: encode_msgpack(columnar_script(script)), msgpack.unpackb),
+        )
+        for label, encode, decode in encoders:
+            body = encode()
+            encode_ms = best_of(encode, args.repeat)
+            decode_ms = best_of(lambda: decode(body), args.repeat)
+            zipped = len(gzip.compress(body, GZIP_LEVEL))
+            print(f"{count:>7}{label:>10}{len(body):>10}{zipped:>10}{encode_ms:>11.3f}{decode_ms:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
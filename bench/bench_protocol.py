@@ -0,0 +1,62 @@
+"""Benchmark: frames/s per core for the shared VolcEngine codec vs. the reference SDK.
+
+Parses and builds uncompressed frames of a few typical sizes (a JSON control
+frame and 100ms / 1s of 16kHz 16-bit PCM) on a single thread, once with
+``api.proxy.protocol`` and once with the vendor's ``Message`` class from
+``doc/L2V_volcengine_binary_demo`` (the marshalling the TTS proxy used to
+carry), and reports frames per second for each.
+
+Usage (from the repo root):
+    python -m bench.bench_protocol [--sizes 200 3200 32000] [--seconds 0.5]
+"""
+import argparse
+import os
+import sys
+import time
+
+from api.proxy.protocol import MsgType, MsgTypeFlagBits, SerializationBits, build_frame, parse_frame
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "doc", "L2V_volcengine_binary_demo"))
+from protocols import Message, MsgType as RefMsgType, MsgTypeFlagBits as RefFlag  # noqa: E402
+
+
+def rate(fn, seconds):
+    """单线程下每秒可完成的次数"""
+    count, batch = 0, 1000
+    started = time.perf_counter()
+    while (elapsed := time.perf_counter() - started) < seconds:
+        for _ in range(batch):
+            fn()
+        count += batch
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 3200, 32000])
+    parser.add_argument("--seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{'payload':>8}{'codec':>10}{'parse/s':>12}{'build/s':>12}")
+    for size in args.sizes:
+        payload = bytes(size)
+        data = build_frame(MsgType.AudioOnlyServer, payload, flag=MsgTypeFlagBits.PositiveSeq, sequence=42,
+                           serialization=SerializationBits.Raw)
+        ref = Message(type=RefMsgType.AudioOnlyServer, flag=RefFlag.PositiveSeq, sequence=42, payload=payload)
+        ref.serialization = 0
+        assert ref.marshal() == data
+
+        # 只解析到载荷视图为止；构建时复用解析出的视图，模拟代理转发
+        view = parse_frame(data).payload
+        cases = (
+            ("shared", lambda: parse_frame(data),
+             lambda: build_frame(MsgType.AudioOnlyServer, view, flag=MsgTypeFlagBits.PositiveSeq, sequence=42,
+                                 serialization=SerializationBits.Raw)),
+            ("reference", lambda: Message.from_bytes(data), ref.marshal),
+        )
+        for label, parse, build in cases:
+            print(f"{size:>8}{label:>10}{rate(parse, args.seconds):>12,.0f}{rate(build, args.seconds):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
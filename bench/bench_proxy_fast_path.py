@@ -0,0 +1,96 @@
+"""Benchmark: per-frame proxy overhead of inspecting upstream frames, before vs. after the fast path.
+
+Replays upstream traffic through the same per-message step the proxies run
+in ``volc_to_client`` (``FrameInspector.should_inspect`` plus
+``inspect_server_frame``), with sending stubbed out:
+
+- ASR: gzip-compressed JSON recognition results.
+- TTS: 4KB audio chunks.
+
+"before" is the previous behaviour: every frame is decoded, and the
+per-frame log lines are formatted and written (to an in-memory stream) at
+DEBUG. "after" is the production default: INFO logging and one frame in
+``INSPECT_EVERY`` inspected.
+
+Usage (from the repo root):
+    python -m bench.bench_proxy_fast_path [--frames 20000]
+"""
+import argparse
+import asyncio
+import gzip
+import io
+import json
+import logging
+import time
+
+from bench.common import quiet_logs
+
+
+def asr_frames(count):
+    from api.proxy.protocol import CompressionBits, MsgType, MsgTypeFlagBits, build_frame
+    for i in range(count):
+        text = "今天天气不错，我们去公园走走吧"[:i % 15 + 1]
+        body = json.dumps({"result": {"text": text, "utterance_end": i % 15 == 14}}, ensure_ascii=False).encode()
+        yield build_frame(MsgType.FullServerResponse, gzip.compress(body), flag=MsgTypeFlagBits.PositiveSeq,
+                          sequence=i + 1, compression=CompressionBits.Gzip)
+
+
+def tts_frames(count):
+    from api.proxy.protocol import MsgType, MsgTypeFlagBits, SerializationBits, build_frame
+    chunk = bytes(range(256)) * 16
+    for i in range(count):
+        yield build_frame(MsgType.AudioOnlyServer, chunk, flag=MsgTypeFlagBits.PositiveSeq, sequence=i + 1,
+                          serialization=SerializationBits.Raw)
+
+
+def per_frame_us(logger, frames, inspect):
+    from api.proxy.inspection import FrameInspector
+
+    async def run():
+        inspector = FrameInspector(logger)
+        for i, message in enumerate(frames, 1):
+            if inspector.should_inspect(message):
+                result = inspect(message, i, inspector)
+                if asyncio.iscoroutine(result):
+                    await result
+
+    started = time.process_time()
+    asyncio.run(run())
+    return (time.process_time() - started) / len(frames) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=20000)
+    args = parser.parse_args()
+
+    from api.proxy import asr_proxy, tts_proxy
+    from api.proxy.compression import CompressionStats
+    quiet_logs()
+
+    stats = CompressionStats()
+    cases = (
+        ("asr", asr_proxy.logger, list(asr_frames(args.frames)),
+         lambda m, i, inspector: asr_proxy.inspect_server_frame(m, i, inspector, stats)),
+        ("tts", tts_proxy.logger, list(tts_frames(args.frames)), tts_proxy.inspect_server_frame),
+    )
+    print(f"{args.frames} upstream frames per proxy")
+    print(f"{'proxy':<7}{'before us/frame':>17}{'after us/frame':>16}{'speedup':>9}")
+    for label, logger, frames, inspect in cases:
+        handler = logging.StreamHandler(io.StringIO())
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            # DEBUG 时每个会话都逐帧检查，即改动前的行为
+            logger.setLevel(logging.DEBUG)
+            before = per_frame_us(logger, frames, inspect)
+            logger.setLevel(logging.INFO)
+            after = per_frame_us(logger, frames, inspect)
+        finally:
+            logger.removeHandler(handler)
+            logger.propagate = True
+        print(f"{label:<7}{before:>17.2f}{after:>16.2f}{before / after:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
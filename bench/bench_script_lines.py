@@ -0,0 +1,89 @@
+"""Benchmark: resident size and serialization speed, list-of-dict lines vs. ScriptLines.
+
+Builds an N-line script the way ``ScriptService`` does from database rows
+(fresh strings per build, so nothing is shared with the input) and reports
+the retained bytes per line measured with ``tracemalloc``, then the time to
+produce the JSON body and the column-wise msgpack payload.
+
+Usage (from the repo root):
+    python -m bench.bench_script_lines [--lines 100000] [--repeat 5]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from api.http_cache import encode_json, encode_msgpack, msgpack
+from api.services.script_lines import ScriptLines
+from api.services.script_service import columnar_lines, columnar_script, encode_script_json
+
+META = {"title": "压测剧本", "description": "", "roleMap": {"甲": "面试官", "乙": "求职者", "合": "旁白"}, "revision": 1}
+# 长剧本里常有重复的短句
+REPLIES = ["好的。", "嗯。", "明白了。"]
+
+
+def rows(count):
+    for i in range(count):
+        content = REPLIES[i % 3] if i % 10 == 0 else f"第 {i} 句台词，用来模拟一部长剧本里的普通对白。"
+        yield 1000 + i, "甲乙合"[i % 3], content, 3000, (i + 1) * 1024
+
+
+def build_dicts(count):
+    return [{"id": i, "role": r, "content": c, "duration": d, "sort": s} for i, r, c, d, s in rows(count)]
+
+
+def build_compact(count):
+    return ScriptLines(rows(count))
+
+
+def retained_bytes(build, count):
+    gc.collect()
+    tracemalloc.start()
+    lines = build(count)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del lines
+    return size
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    count = args.lines
+
+    dicts, compact = build_dicts(count), build_compact(count)
+    dict_script, compact_script = {"meta": META, "lines": dicts}, {"meta": META, "lines": compact}
+    assert encode_script_json(compact_script) == encode_json(dict_script)
+
+    cases = [
+        ("dict", build_dicts, lambda: encode_json(dict_script),
+         lambda: encode_msgpack({"meta": META, "lines": columnar_lines(dicts)})),
+        ("compact", build_compact, lambda: encode_script_json(compact_script),
+         lambda: encode_msgpack(columnar_script(compact_script))),
+    ]
+    body_mb = len(encode_json(dict_script)) / 1e6
+    print(f"{count} lines, JSON body {body_mb:.1f}MB")
+    print(f"{'lines as':<10}{'bytes/line':>12}{'build ms':>10}{'json ms':>10}{'json MB/s':>11}{'msgpack ms':>12}")
+    for label, build, to_json, to_msgpack in cases:
+        per_line = retained_bytes(build, count) / count
+        build_s = best_of(lambda: build(count), args.repeat)
+        json_s = best_of(to_json, args.repeat)
+        msgpack_ms = f"{best_of(to_msgpack, args.repeat) * 1000:>12.1f}" if msgpack else f"{'-':>12}"
+        print(f"{label:<10}{per_line:>12.0f}{build_s * 1000:>10.1f}{json_s * 1000:>10.1f}"
+              f"{body_mb / json_s:>11.0f}{msgpack_ms}")
+
+
+if __name__ == "__main__":
+    main()
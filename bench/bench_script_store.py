@@ -0,0 +1,57 @@
+"""Benchmark: ScriptService.get_script_by_id with and without the script store.
+
+Usage (from the repo root):
+    python -m bench.bench_script_store [--lines 2000] [--reads 2000]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import api.db as db
+from api.services.script_service import ScriptService
+from api.services.script_store import script_store
+from bench.common import quiet_logs, temp_database
+
+
+def seed_lines(count):
+    conn = db.get_db_connection()
+    conn.executemany(
+        "INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES (1, ?, ?, 3000, ?)",
+        [("甲乙合"[i % 3], f"第 {i} 句台词，用来模拟一部长剧本里的普通对白。", (i + 8) * 1024) for i in range(count)]
+    )
+    conn.commit()
+    conn.close()
+
+
+async def time_reads(reads, cached):
+    timings = []
+    for _ in range(reads):
+        if not cached:
+            script_store.clear()
+        started = time.perf_counter()
+        await ScriptService.get_script_by_id(1)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=2000)
+    args = parser.parse_args()
+
+    with temp_database():
+        quiet_logs()
+        seed_lines(args.lines)
+        print(f"\nstory with {args.lines + 7} lines, {args.reads} reads")
+        print(f"{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}")
+        for label, cached in (("database", False), ("store", True)):
+            timings = asyncio.run(time_reads(args.reads, cached))
+            p = statistics.quantiles(timings, n=100)
+            print(f"{label:<10}{p[49]:>10.4f}{p[98]:>10.4f}")
+        print(f"store stats: {script_store.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark: line search latency (FTS5 trigram and the short-term gram table) on a large generated corpus.
+
+Fills a throwaway database with N synthetic Chinese lines spread over many
+stories, then times story-scoped and global searches through
+the same SQL SearchService runs (p50/p99 per query, excluding the executor hop).
+Query terms of 1-2 characters (looked up in script_line_grams) and 3-5
+characters (FTS5) are timed separately.
+
+Usage (from the repo root):
+    python -m bench.bench_search [--lines 1000000] [--stories 1000] [--queries 2000]
+"""
+import argparse
+import random
+import statistics
+import time
+
+import api.db as db
+from api.services.search_service import build_search_query
+from bench.common import quiet_logs, temp_database
+
+# 3000 个常用汉字区间内随机组词，模拟台词文本
+CHARS = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+
+
+def make_vocabulary(rng, size=5000):
+    return ["".join(rng.choices(CHARS, k=rng.randint(2, 4))) for _ in range(size)]
+
+
+def fill_corpus(rng, lines, stories):
+    vocab = make_vocabulary(rng)
+    conn = db.get_db_connection()
+    conn.executemany(
+        "INSERT INTO script_stories (id, title) VALUES (?, ?)",
+        [(story_id, f"Bench {story_id}") for story_id in range(2, stories + 2)]
+    )
+    batch, sample = [], []
+    for i in range(lines):
+        content = "".join(rng.choices(vocab, k=rng.randint(4, 12)))
+        batch.append((2 + i % stories, "甲", content, 3000, (i // stories + 1) * 1024))
+        if i % 997 == 0:
+            sample.append((2 + i % stories, content))
+        if len(batch) == 50000:
+            conn.executemany(
+                "INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES (?, ?, ?, ?, ?)",
+                batch
+            )
+            batch.clear()
+    if batch:
+        conn.executemany(
+            "INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES (?, ?, ?, ?, ?)",
+            batch
+        )
+    conn.commit()
+    conn.execute("PRAGMA optimize")
+    conn.close()
+    return sample
+
+
+def percentile(samples, q):
+    return statistics.quantiles(samples, n=100)[q - 1] if len(samples) > 1 else samples[0]
+
+
+def time_queries(queries, scoped):
+    timings = []
+    for story_id, term in queries:
+        sql, params = build_search_query(term, story_id if scoped else None)
+        started = time.perf_counter()
+        db.query_all(sql, params)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--stories", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    with temp_database():
+        quiet_logs()
+        started = time.perf_counter()
+        sample = fill_corpus(rng, args.lines, args.stories)
+        print(f"\nindexed {args.lines} lines in {time.perf_counter() - started:.1f}s")
+
+        print(f"{'mode':<12}{'terms':<12}{'p50 ms':>10}{'p99 ms':>10}")
+        for terms, (low, high) in (("1-2 chars", (1, 2)), ("3-5 chars", (3, 5))):
+            queries = []
+            for _ in range(args.queries):
+                story_id, content = rng.choice(sample)
+                start = rng.randrange(0, len(content) - 4)
+                queries.append((story_id, content[start:start + rng.randint(low, high)]))
+            for label, scoped in (("story", True), ("global", False)):
+                timings = time_queries(queries, scoped)
+                print(f"{label:<12}{terms:<12}{percentile(timings, 50):>10.3f}{percentile(timings, 99):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark: cold start and RSS, mmap'd binary snapshot vs. querying SQLite.
+
+Seeds a corpus of stories, exports it with ``write_snapshot`` and then, in a
+fresh subprocess per mode, measures the time to open the data source and
+return the first script, the mean time per script for a batch of random
+stories, and the resident-set growth after reading them.
+
+Usage (from the repo root):
+    python -m bench.bench_snapshot [--stories 500] [--lines 200] [--reads 100]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+from bench.common import quiet_logs, temp_database
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def seed_corpus(stories, lines):
+    from api.services.import_service import import_lines
+
+    def screenplay(story):
+        for i in range(lines):
+            yield f"{'甲乙丙'[i % 3]}：第 {story} 幕第 {i} 句台词，用来模拟一部普通长度的剧本。\n"
+
+    return [import_lines(screenplay(s), f"剧本 {s}")["storyId"] for s in range(stories)]
+
+
+def child(mode, db_file, snap_file, story_ids):
+    import api.db as db
+    from api.services.script_service import _load_scripts
+    from api.services.script_snapshot import ScriptSnapshot
+
+    db.DB_FILE = db_file
+    base = rss_mb()
+    started = time.perf_counter()
+    if mode == "sqlite":
+        def read(story_id):
+            return _load_scripts([story_id])[story_id]
+    else:
+        snapshot = ScriptSnapshot(snap_file)
+        read = snapshot.get_script
+    read(story_ids[0])
+    first_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for story_id in story_ids[1:]:
+        assert read(story_id)["lines"]
+    per_ms = (time.perf_counter() - started) * 1000 / max(1, len(story_ids) - 1)
+    print(f"{mode:<10}{first_ms:>14.2f}{per_ms:>14.3f}{rss_mb() - base:>12.1f}")
+    db.close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stories", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=100)
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "DB", "SNAPSHOT"), help=argparse.SUPPRESS)
+    parser.add_argument("--ids", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child, [int(i) for i in args.ids.split(",")])
+        return
+
+    with temp_database() as db_file:
+        quiet_logs()
+        from api.services.script_snapshot import write_snapshot
+        story_ids = seed_corpus(args.stories, args.lines)
+        snap_file = db_file + ".snap"
+        started = time.perf_counter()
+        write_snapshot(snap_file)
+        export_s = time.perf_counter() - started
+
+        import api.db as db
+        db.close_pool()
+        print(f"\n{args.stories} stories x {args.lines} lines; db {os.path.getsize(db_file) / 1e6:.1f}MB, "
+              f"snapshot {os.path.getsize(snap_file) / 1e6:.1f}MB (export {export_s:.2f}s)")
+        print(f"{'mode':<10}{'open+first ms':>14}{'per script ms':>14}{'RSS +MB':>12}")
+        ids = ",".join(str(i) for i in random.Random(0).sample(story_ids, min(args.reads, len(story_ids))))
+        for mode in ("sqlite", "snapshot"):
+            subprocess.run([sys.executable, "-m", "bench.bench_snapshot", "--child", mode, db_file, snap_file,
+                            "--ids", ids], check=True)
+
+
+if __name__ == "__main__":
+    main()
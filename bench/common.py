@@ -0,0 +1,30 @@
+"""Shared helpers for the benchmark scripts in this directory."""
+import io
+import logging
+import os
+import tempfile
+from contextlib import contextmanager, redirect_stdout
+
+import api.db as db
+from api.init_db import init_db
+
+
+def quiet_logs():
+    # 代理模块在导入时开启了 INFO 日志，压测时只保留警告
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in ("httpx", "asr_proxy", "tts_proxy"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+
+@contextmanager
+def temp_database():
+    """Point ``api.db`` at a freshly seeded throwaway database."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db.close_pool()
+        db.DB_FILE = os.path.join(tmp, "bench.db")
+        with redirect_stdout(io.StringIO()):
+            init_db(db.DB_FILE)
+        try:
+            yield db.DB_FILE
+        finally:
+            db.close_pool()
@@ -1,6 +1,7 @@
 -- 数据库结构与演示数据
 -- 对应项目：ScriptBuddy
 -- 运行环境：SQLite 3
+-- (MySQL 后端的等价结构见 api/init_db.py 中的 MYSQL_SCHEMA)
 
 -- 1. 配置表 (script_configs)
 -- 用于存储 ASR, TTS, LLM 的各类 Key 和 Secret
@@ -62,11 +63,134 @@ CREATE TABLE script_lines (
 CREATE INDEX idx_story_order ON script_lines(story_id, sort_order);
 
 -- 插入演示台词 (对应 script_stories id=1)
+-- sort_order 以 1024 为间隔，插入时取相邻两行的中点，由服务端维护
 INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES
-(1, '甲', '您好，请先简单做一个自我介绍吧。', 3000, 1),
-(1, '乙', '好的。面试官您好，我叫陈驰，是一名全栈工程师。', 4000, 2),
-(1, '甲', '我看你的简历上写着熟悉 React 和 PHP？', 3000, 3),
-(1, '乙', '是的，我即使在 PHP 5.4 的环境下也能写出现代化的代码。', 4000, 4),
-(1, '合', '（面试官露出了满意的微笑）', 2000, 5),
-(1, '甲', '很有意思。那我们开始技术测试吧。', 3000, 6),
-(1, '乙', '没问题，请出题。', 2000, 7);
+(1, '甲', '您好，请先简单做一个自我介绍吧。', 3000, 1024),
+(1, '乙', '好的。面试官您好，我叫陈驰，是一名全栈工程师。', 4000, 2048),
+(1, '甲', '我看你的简历上写着熟悉 React 和 PHP？', 3000, 3072),
+(1, '乙', '是的，我即使在 PHP 5.4 的环境下也能写出现代化的代码。', 4000, 4096),
+(1, '合', '（面试官露出了满意的微笑）', 2000, 5120),
+(1, '甲', '很有意思。那我们开始技术测试吧。', 3000, 6144),
+(1, '乙', '没问题，请出题。', 2000, 7168);
+
+
+
+-- 4. 台词全文索引 (script_lines_fts)
+-- FTS5 trigram 分词，外部内容表指向 script_lines，由触发器保持同步
+-- (api/init_db.py 中的迁移 1，执行后 PRAGMA user_version = 1)
+CREATE VIRTUAL TABLE script_lines_fts USING fts5(
+  content,
+  content='script_lines',
+  content_rowid='id',
+  tokenize='trigram'
+);
+
+CREATE TRIGGER script_lines_fts_ai AFTER INSERT ON script_lines BEGIN
+  INSERT INTO script_lines_fts(rowid, content) VALUES (new.id, new.content);
+END;
+
+CREATE TRIGGER script_lines_fts_ad AFTER DELETE ON script_lines BEGIN
+  INSERT INTO script_lines_fts(script_lines_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+
+CREATE TRIGGER script_lines_fts_au AFTER UPDATE OF content ON script_lines BEGIN
+  INSERT INTO script_lines_fts(script_lines_fts, rowid, content) VALUES ('delete', old.id, old.content);
+  INSERT INTO script_lines_fts(rowid, content) VALUES (new.id, new.content);
+END;
+
+INSERT INTO script_lines_fts(script_lines_fts) VALUES ('rebuild');
+
+
+
+-- 5. 剧本目录统计 (api/init_db.py 中的迁移 2，执行后 PRAGMA user_version = 2)
+-- line_count / total_duration_ms 及各角色台词数由 script_lines 上的触发器维护
+ALTER TABLE script_stories ADD COLUMN line_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE script_stories ADD COLUMN total_duration_ms INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE script_story_roles (
+  story_id INTEGER NOT NULL,
+  role_key VARCHAR(50) NOT NULL,
+  line_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (story_id, role_key)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_story_created ON script_stories(created_at, id);
+
+CREATE TRIGGER script_lines_stats_ai AFTER INSERT ON script_lines BEGIN
+  UPDATE script_stories
+     SET line_count = line_count + 1, total_duration_ms = total_duration_ms + COALESCE(new.duration_ms, 0)
+   WHERE id = new.story_id;
+  INSERT INTO script_story_roles (story_id, role_key, line_count) VALUES (new.story_id, new.role_key, 1)
+      ON CONFLICT (story_id, role_key) DO UPDATE SET line_count = line_count + 1;
+END;
+
+CREATE TRIGGER script_lines_stats_ad AFTER DELETE ON script_lines BEGIN
+  UPDATE script_stories
+     SET line_count = line_count - 1, total_duration_ms = total_duration_ms - COALESCE(old.duration_ms, 0)
+   WHERE id = old.story_id;
+  UPDATE script_story_roles SET line_count = line_count - 1
+   WHERE story_id = old.story_id AND role_key = old.role_key;
+  DELETE FROM script_story_roles
+   WHERE story_id = old.story_id AND role_key = old.role_key AND line_count <= 0;
+END;
+
+CREATE TRIGGER script_lines_stats_au AFTER UPDATE OF story_id, role_key, duration_ms ON script_lines BEGIN
+  UPDATE script_stories
+     SET line_count = line_count - 1, total_duration_ms = total_duration_ms - COALESCE(old.duration_ms, 0)
+   WHERE id = old.story_id;
+  UPDATE script_stories
+     SET line_count = line_count + 1, total_duration_ms = total_duration_ms + COALESCE(new.duration_ms, 0)
+   WHERE id = new.story_id;
+  UPDATE script_story_roles SET line_count = line_count - 1
+   WHERE story_id = old.story_id AND role_key = old.role_key;
+  INSERT INTO script_story_roles (story_id, role_key, line_count) VALUES (new.story_id, new.role_key, 1)
+      ON CONFLICT (story_id, role_key) DO UPDATE SET line_count = line_count + 1;
+  DELETE FROM script_story_roles
+   WHERE story_id = old.story_id AND role_key = old.role_key AND line_count <= 0;
+END;
+
+UPDATE script_stories SET
+  line_count = (SELECT COUNT(*) FROM script_lines WHERE story_id = script_stories.id),
+  total_duration_ms = (SELECT COALESCE(SUM(duration_ms), 0) FROM script_lines WHERE story_id = script_stories.id);
+INSERT INTO script_story_roles (story_id, role_key, line_count)
+SELECT story_id, role_key, COUNT(*) FROM script_lines GROUP BY story_id, role_key;
+
+
+
+-- 6. 台词变更日志 (api/init_db.py 中的迁移 3，执行后 PRAGMA user_version = 3)
+-- 每次 ScriptService 写操作使 revision +1，并按台词记录 insert/update/delete；
+-- 日志只覆盖 revision > change_floor 的变更
+ALTER TABLE script_stories ADD COLUMN revision INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE script_stories ADD COLUMN change_floor INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE script_changes (
+  story_id INTEGER NOT NULL,
+  revision INTEGER NOT NULL,
+  line_id INTEGER NOT NULL,
+  op VARCHAR(10) NOT NULL,
+  PRIMARY KEY (story_id, revision, line_id)
+) WITHOUT ROWID;
+
+
+
+-- 7. 批量导入 (api/init_db.py 中的迁移 4，执行后 PRAGMA user_version = 4)
+-- 导入事务内登记 story_id，逐行维护全文索引/统计的 INSERT 触发器跳过这些行，导入结束后一次性补齐
+CREATE TABLE script_bulk_loads (story_id INTEGER PRIMARY KEY);
+
+DROP TRIGGER script_lines_fts_ai;
+CREATE TRIGGER script_lines_fts_ai AFTER INSERT ON script_lines
+WHEN NOT EXISTS (SELECT 1 FROM script_bulk_loads WHERE story_id = new.story_id) BEGIN
+  INSERT INTO script_lines_fts(rowid, content) VALUES (new.id, new.content);
+END;
+
+DROP TRIGGER script_lines_stats_ai;
+CREATE TRIGGER script_lines_stats_ai AFTER INSERT ON script_lines
+WHEN NOT EXISTS (SELECT 1 FROM script_bulk_loads WHERE story_id = new.story_id) BEGIN
+  UPDATE script_stories
+     SET line_count = line_count + 1, total_duration_ms = total_duration_ms + COALESCE(new.duration_ms, 0)
+   WHERE id = new.story_id;
+  INSERT INTO script_story_roles (story_id, role_key, line_count) VALUES (new.story_id, new.role_key, 1)
+      ON CONFLICT (story_id, role_key) DO UPDATE SET line_count = line_count + 1;
+END;
+
+PRAGMA user_version = 4;
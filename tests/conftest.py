@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import api.db as db
+from api.services.config_service import ConfigService
+from api.services.script_store import script_store
+
+# MySQL 用例使用单独的库，每次测试会话开始时重建 (会清空其中的数据)
+TEST_MYSQL_DATABASE = os.environ.get("SCRIPTBUDDY_TEST_MYSQL_DATABASE", "scriptbuddy_test")
+# 设为 1 时 (CI) 连不上 MySQL 直接报错，不跳过
+REQUIRE_MYSQL = os.environ.get("SCRIPTBUDDY_TEST_REQUIRE_MYSQL") == "1"
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "sqlite_only: test exercises SQLite-specific behaviour")
+
+
+def _unavailable(reason):
+    if REQUIRE_MYSQL:
+        pytest.fail(reason)
+    pytest.skip(reason)
+
+
+def _mysql_backend():
+    try:
+        import mysql.connector
+    except ImportError:
+        _unavailable("mysql-connector-python is not installed")
+
+    from api.init_db import init_mysql
+    backend = db.MySQLBackend(config={**db.MYSQL_CONFIG, "database": TEST_MYSQL_DATABASE})
+    try:
+        conn = backend.connect()
+    except mysql.connector.Error as e:
+        _unavailable(f"MySQL server not available: {e}")
+    try:
+        init_mysql(conn)
+    finally:
+        conn.close()
+    return backend
+
+
+@pytest.fixture(scope="session", params=["sqlite", "mysql"])
+def backend(request):
+    """用到数据库的用例 (``usefixtures("backend")``) 分别在 SQLite 和 MySQL 后端上运行；连不上 MySQL 时跳过后者。
+    编解码、连接池等不碰数据库的用例不使用该 fixture，只跑一遍"""
+    backend = db.SQLiteBackend() if request.param == "sqlite" else _mysql_backend()
+    previous = db.get_backend()
+    db.use_backend(backend)
+    script_store.clear()
+    ConfigService.invalidate()
+    yield backend
+    db.use_backend(previous)
+    script_store.clear()
+    ConfigService.invalidate()
+
+
+def pytest_collection_modifyitems(config, items):
+    # sqlite_only 的用例不生成 MySQL 版本
+    deselected = {
+        item.nodeid for item in items
+        if item.get_closest_marker("sqlite_only")
+        and getattr(item, "callspec", None) is not None and item.callspec.params.get("backend") == "mysql"
+    }
+    if deselected:
+        config.hook.pytest_deselected(items=[item for item in items if item.nodeid in deselected])
+        items[:] = [item for item in items if item.nodeid not in deselected]
@@ -1,7 +1,14 @@
+import asyncio
+import json
+
 import pytest
 from httpx import AsyncClient
-from api.main import app
-from api.db import execute_query
+from api.main import app, ScriptLineModel
+from api.db import execute_query, get_writer, query_all
+from api.services.script_service import ScriptService, _renumber_story
+from api.services.script_store import script_store
+
+pytestmark = pytest.mark.usefixtures("backend")
 
 # Note: These tests require the database to be accessible.
 
@@ -36,7 +43,8 @@ async def test_admin_add_delete():
             "content": "Test Line",
             "sort": 999
         }
-        await ac.post("/api/admin", json=payload)
+        response = await ac.post("/api/admin", json=payload)
+        assert response.json()["id"] > 0
 
     # 2. Verify
     async with AsyncClient(app=app, base_url="http://test") as ac:
@@ -50,3 +58,447 @@ async def test_admin_add_delete():
     if test_line:
         async with AsyncClient(app=app, base_url="http://test") as ac:
             await ac.post("/api/admin", json={"action": "delete", "id": test_line["id"]})
+
+@pytest.mark.asyncio
+async def test_admin_batch():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        ops = [
+            {"action": "add", "role": "甲", "content": "Batch A", "sort": 901},
+            {"action": "add", "role": "乙", "content": "Batch B", "sort": 902},
+            {"action": "add", "role": "合", "content": "Batch C", "sort": 903},
+        ]
+        response = await ac.post("/api/admin/batch", json={"story_id": 1, "ops": ops})
+        assert response.status_code == 200
+        a, b, c = response.json()["ids"]
+
+        ops = [
+            {"action": "update", "id": a, "role": "甲", "content": "Batch A2", "sort": 901},
+            {"action": "move", "id": c, "sort": 900},
+            {"action": "delete", "id": b},
+        ]
+        response = await ac.post("/api/admin/batch", json={"story_id": 1, "ops": ops})
+        assert response.json()["ids"] == [a, c, b]
+
+        lines = (await ac.get("/api/script?id=1")).json()["lines"]
+        batch_lines = [l for l in lines if l["content"].startswith("Batch")]
+        assert [(l["id"], l["content"]) for l in batch_lines] == [(c, "Batch C"), (a, "Batch A2")]
+
+        # 缺少 id 的操作在执行前即被拒绝
+        response = await ac.post("/api/admin/batch", json={"ops": [{"action": "delete"}]})
+        assert response.status_code == 400
+
+        await ac.post("/api/admin/batch", json={"ops": [
+            {"action": "delete", "id": a}, {"action": "delete", "id": c}
+        ]})
+
+
+@pytest.mark.asyncio
+async def test_admin_batch_is_atomic():
+    probe = ScriptLineModel(action="add", role="甲", content="Atomic Probe", sort=950)
+    # 缺少 role 的 update 在执行前即被拒绝 (400)，不会撞上 NOT NULL 约束变成 500
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/api/admin/batch", json={"story_id": 1, "ops": [
+            probe.model_dump(), {"action": "update", "id": 1, "content": "x"}
+        ]})
+    assert response.status_code == 400 and "requires role and content" in response.json()["detail"]
+    # 单条 update 同样校验
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for payload in ({"action": "update", "id": 1, "story_id": 1}, {"action": "update", "id": 1, "role": "甲"}):
+            response = await ac.post("/api/admin", json=payload)
+            assert response.status_code == 400 and "update requires role and content" in response.json()["detail"]
+
+    # 不存在或属于其他剧本的台词：整批回滚，已执行的 add 也不生效
+    other = query_all("SELECT id FROM script_lines WHERE story_id != 1 LIMIT 1")
+    for line_id in [424242] + [row["id"] for row in other]:
+        for action in ("update", "delete", "move"):
+            op = ScriptLineModel(action=action, id=line_id, role="甲", content="x", sort=1)
+            with pytest.raises(ValueError, match=f"ops\\[1\\]: line {line_id} not found in story 1"):
+                await ScriptService.apply_batch(1, [probe, op])
+    # 同一行重复删除：第二次没有匹配到行
+    a, = await ScriptService.apply_batch(1, [probe])
+    with pytest.raises(ValueError, match="only 1 of 2 delete ops"):
+        await ScriptService.apply_batch(1, [ScriptLineModel(action="delete", id=a)] * 2)
+    await ScriptService.apply_batch(1, [ScriptLineModel(action="delete", id=a)])
+    assert query_all("SELECT id FROM script_lines WHERE content = 'Atomic Probe'") == []
+
+
+@pytest.mark.asyncio
+async def test_insert_between_touches_only_new_row():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        before = (await ac.get("/api/script?id=1")).json()["lines"]
+        first, second = before[0], before[1]
+
+        response = await ac.post("/api/admin", json={"action": "add", "role": "合", "content": "Gap Probe", "after_id": first["id"]})
+        new_id = response.json()["id"]
+
+        after = (await ac.get("/api/script?id=1")).json()["lines"]
+        assert [l["id"] for l in after[:3]] == [first["id"], new_id, second["id"]]
+        # 其余行的排序键保持不变
+        untouched = {l["id"]: l["sort"] for l in after if l["id"] != new_id}
+        assert untouched == {l["id"]: l["sort"] for l in before}
+
+        # 移动到最前，同样只改写被移动的行
+        await ac.post("/api/admin", json={"action": "move", "id": new_id, "after_id": 0})
+        moved = (await ac.get("/api/script?id=1")).json()["lines"]
+        assert moved[0]["id"] == new_id
+        assert {l["id"]: l["sort"] for l in moved if l["id"] != new_id} == untouched
+
+        await ac.post("/api/admin", json={"action": "delete", "id": new_id})
+
+        # 锚点不存在：400，而不是 500
+        response = await ac.post("/api/admin", json={"action": "add", "role": "合", "content": "Gap Probe", "after_id": 99999})
+        assert response.status_code == 400 and "not found" in response.json()["detail"]
+        # 缺少 role/content：写入前即返回 400
+        for payload in ({"action": "add", "story_id": 1}, {"action": "add", "role": "合"}, {"action": "add", "content": "x"}):
+            response = await ac.post("/api/admin", json=payload)
+            assert response.status_code == 400 and "add requires role and content" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_exhausted_gap_triggers_renumbering():
+    # 反复插入到同一位置，直到间隔用尽，顺序必须始终正确
+    anchor = (await ScriptService.get_script_by_id(1))["lines"][0]["id"]
+    inserted = []
+    for i in range(15):
+        line = ScriptLineModel(action="add", role="合", content=f"Squeeze {i}", after_id=anchor)
+        inserted.append(await ScriptService.add_line(line))
+    await asyncio.wrap_future(get_writer().submit(lambda conn: None))  # 等待后台整理完成
+
+    lines = (await ScriptService.get_script_by_id(1))["lines"]
+    ids = [l["id"] for l in lines]
+    assert ids[1:16] == list(reversed(inserted))
+    sorts = [l["sort"] for l in lines]
+    assert sorts == sorted(sorts) and len(set(sorts)) == len(sorts)
+
+    await ScriptService.apply_batch(1, [ScriptLineModel(action="delete", id=i) for i in inserted])
+
+
+@pytest.mark.asyncio
+async def test_script_pagination_and_stream():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        full = (await ac.get("/api/script?id=1")).json()
+
+        paged, cursor = [], None
+        while True:
+            params = {"id": 1, "limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            page = (await ac.get("/api/script/lines", params=params)).json()
+            paged.extend(page["lines"])
+            cursor = page["nextCursor"]
+            if cursor is None:
+                break
+        assert paged == full["lines"]
+
+        response = await ac.get("/api/script/stream?id=1")
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        records = [json.loads(row) for row in response.text.splitlines()]
+        assert records[0] == {"meta": full["meta"]}
+        assert records[1:] == full["lines"]
+
+        assert (await ac.get("/api/script/lines?id=1&cursor=bogus")).status_code == 400
+        assert (await ac.get("/api/script/stream?id=999999")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stream_reads_one_snapshot():
+    full = await ScriptService.get_script_by_id(1)
+    lines = list(full["lines"])
+    stream = ScriptService.iter_script_ndjson(1, chunk_size=2)
+    received = [await stream.__anext__(), await stream.__anext__()]
+
+    # 输出途中移动、新增台词：已开始的流仍是开始时的内容，不漏行也不重复
+    last, before_last = lines[-1]["id"], lines[-2]["id"]
+    await ScriptService.move_line(1, last, 0)
+    new_id = await ScriptService.add_line(ScriptLineModel(action="add", role="甲", content="流式途中新增"))
+    try:
+        received += [chunk async for chunk in stream]
+        records = [json.loads(row) for chunk in received for row in chunk.decode("utf-8").splitlines()]
+        assert records[0] == {"meta": full["meta"]}
+        assert records[1:] == lines
+    finally:
+        await ScriptService.delete_line(new_id)
+        await ScriptService.move_line(1, last, before_last)
+    assert list((await ScriptService.get_script_by_id(1))["lines"]) == lines
+
+
+@pytest.mark.asyncio
+async def test_search_lines():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        results = (await ac.get("/api/search", params={"q": "自我介绍", "story_id": 1})).json()["results"]
+        assert any("自我介绍" in r["content"] for r in results)
+
+        # 1~2 字的短词同样可用 (走片段表)，ASCII 不区分大小写，多个短词取交集
+        results = (await ac.get("/api/search", params={"q": "面试", "story_id": 1})).json()["results"]
+        assert results and all("面试" in r["content"] for r in results)
+        results = (await ac.get("/api/search", params={"q": "驰", "story_id": 1})).json()["results"]
+        assert [r["content"] for r in results] == ["好的。面试官您好，我叫陈驰，是一名全栈工程师。"]
+        results = (await ac.get("/api/search", params={"q": "re", "story_id": 1})).json()["results"]
+        assert [r["content"] for r in results] == ["我看你的简历上写着熟悉 React 和 PHP？"]
+        results = (await ac.get("/api/search", params={"q": "您 面试", "story_id": 1})).json()["results"]
+        assert results and all("您" in r["content"] and "面试" in r["content"] for r in results)
+        assert "您好，请先简单做一个自我介绍吧。" not in [r["content"] for r in results]
+
+        # 写入后索引立即同步
+        new_id = (await ac.post("/api/admin", json={"action": "add", "role": "甲", "content": "排练检索探针"})).json()["id"]
+        results = (await ac.get("/api/search", params={"q": "检索探", "story_id": 1})).json()["results"]
+        assert [r["id"] for r in results] == [new_id]
+        assert [r["id"] for r in (await ac.get("/api/search", params={"q": "探针"})).json()["results"]] == [new_id]
+
+        await ac.post("/api/admin", json={"action": "update", "id": new_id, "role": "甲", "content": "已改写"})
+        assert (await ac.get("/api/search", params={"q": "检索探"})).json()["results"] == []
+        assert (await ac.get("/api/search", params={"q": "探针"})).json()["results"] == []
+        assert [r["id"] for r in (await ac.get("/api/search", params={"q": "改写"})).json()["results"]] == [new_id]
+        # 短词结果按台词顺序返回，移动后片段表随之更新
+        results = (await ac.get("/api/search", params={"q": "，", "story_id": 1, "limit": 100})).json()["results"]
+        assert [r["sort"] for r in results] == sorted(r["sort"] for r in results)
+        await ac.post("/api/admin", json={"action": "move", "id": new_id, "after_id": 0})
+        results = (await ac.get("/api/search", params={"q": "写", "story_id": 1, "limit": 100})).json()["results"]
+        assert results[0]["id"] == new_id
+        await ac.post("/api/admin", json={"action": "delete", "id": new_id})
+        assert (await ac.get("/api/search", params={"q": "改写"})).json()["results"] == []
+
+        assert (await ac.get("/api/search", params={"q": "  "})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_conditional_get():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for path in ("/api/script?id=1", "/api/config"):
+            response = await ac.get(path)
+            etag = response.headers["etag"]
+            assert response.headers["cache-control"] == "no-cache"
+
+            response = await ac.get(path, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.content == b""
+
+        # 编辑后 ETag 改变，旧 ETag 拿到完整的新内容
+        new_id = (await ac.post("/api/admin", json={"action": "add", "role": "甲", "content": "ETag Probe"})).json()["id"]
+        old_etag = (await ac.get("/api/script?id=1")).headers["etag"]
+        await ac.post("/api/admin", json={"action": "delete", "id": new_id})
+        response = await ac.get("/api/script?id=1", headers={"If-None-Match": old_etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != old_etag
+
+        # 支持 gzip 的客户端拿到预压缩的响应体 (httpx 自动解压)
+        await ac.post("/api/admin", json={"action": "add", "role": "甲", "content": "长台词" * 400})
+        response = await ac.get("/api/script?id=1", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        lines = response.json()["lines"]
+        # gzip 与原始字节是不同的表示，强 ETag 不同；各自的 ETag 只对同一编码返回 304
+        gzip_etag = response.headers["etag"]
+        identity = await ac.get("/api/script?id=1", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in identity.headers
+        assert identity.headers["etag"] != gzip_etag and gzip_etag.endswith('-gz"')
+        response = await ac.get("/api/script?id=1", headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_etag})
+        assert response.status_code == 304 and response.headers["etag"] == gzip_etag
+        response = await ac.get("/api/script?id=1",
+                                headers={"Accept-Encoding": "identity", "If-None-Match": identity.headers["etag"]})
+        assert response.status_code == 304 and response.headers["etag"] == identity.headers["etag"]
+        response = await ac.get("/api/script?id=1", headers={"Accept-Encoding": "identity", "If-None-Match": gzip_etag})
+        assert response.status_code == 200 and response.content == identity.content
+        # 按 q 权重判断：q=0 表示拒绝，"*" 只在没有单独列出 gzip 时生效
+        for accept_encoding, gzipped in (("gzip;q=0", False), ("br, GZIP;q=0.5", True),
+                                         ("*", True), ("gzip;q=0, *", False), ("identity", False)):
+            response = await ac.get("/api/script?id=1", headers={"Accept-Encoding": accept_encoding})
+            assert (response.headers.get("content-encoding") == "gzip") is gzipped, accept_encoding
+        await ac.post("/api/admin", json={"action": "delete", "id": lines[-1]["id"]})
+
+
+@pytest.mark.asyncio
+async def test_msgpack_negotiation():
+    msgpack = pytest.importorskip("msgpack")
+    headers = {"Accept": "application/msgpack"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        as_json = await ac.get("/api/script?id=1")
+        response = await ac.get("/api/script?id=1", headers=headers)
+        assert response.headers["content-type"] == "application/msgpack"
+        assert "Accept" in response.headers["vary"]
+        assert response.headers["etag"] != as_json.headers["etag"]
+        assert len(response.content) < len(as_json.content)
+
+        # 台词按列存放，与 JSON 的逐行对象一一对应
+        data = msgpack.unpackb(response.content)
+        columns, lines = data["lines"], as_json.json()["lines"]
+        assert data["meta"] == as_json.json()["meta"]
+        assert columns["id"] == [l["id"] for l in lines]
+        assert [columns["roles"][i] for i in columns["role"]] == [l["role"] for l in lines]
+        assert columns["content"] == [l["content"] for l in lines]
+        assert columns["duration"] == [l["duration"] for l in lines]
+
+        response = await ac.get("/api/script?id=1", headers={**headers, "If-None-Match": response.headers["etag"]})
+        assert response.status_code == 304
+
+        # JSON 权重更高或只接受 JSON 时仍返回 JSON
+        for accept in ("application/json", "application/msgpack;q=0.5, application/json", "*/*"):
+            response = await ac.get("/api/script?id=1", headers={"Accept": accept})
+            assert response.headers["content-type"] == "application/json"
+
+        bulk = msgpack.unpackb((await ac.get("/api/scripts?ids=1", headers=headers)).content, strict_map_key=False)
+        assert bulk[1]["lines"] == columns
+        page = msgpack.unpackb((await ac.get("/api/script/lines?id=1&limit=2", headers=headers)).content)
+        assert page["lines"]["id"] == columns["id"][:2] and page["nextCursor"]
+        stories = msgpack.unpackb((await ac.get("/api/stories", headers=headers)).content)
+        assert any(story["id"] == 1 for story in stories["stories"])
+
+
+@pytest.mark.asyncio
+async def test_bulk_fetch_scripts():
+    story_id = execute_query(
+        "INSERT INTO script_stories (title, description, role_map_json) VALUES (?, ?, ?)",
+        ("Bulk Probe", "", json.dumps({"甲": "A"}))
+    )
+    await ScriptService.apply_batch(story_id, [
+        ScriptLineModel(action="add", role="甲", content=f"Bulk {i}") for i in range(3)
+    ])
+    script_store.clear()
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            response = await ac.get(f"/api/scripts?ids={story_id},1,999999")
+            assert response.status_code == 200
+            data = response.json()
+            assert list(data) == [str(story_id), "1"]
+            assert [l["content"] for l in data[str(story_id)]["lines"]] == ["Bulk 0", "Bulk 1", "Bulk 2"]
+            assert data["1"] == (await ac.get("/api/script?id=1")).json()
+
+            # 结果回填缓存
+            assert script_store.get(story_id) is not None
+            assert (await ac.get("/api/scripts?ids=a,b")).status_code == 400
+    finally:
+        execute_query("DELETE FROM script_lines WHERE story_id = ?", (story_id,))
+        execute_query("DELETE FROM script_stories WHERE id = ?", (story_id,))
+        script_store.invalidate(story_id)
+
+
+@pytest.mark.asyncio
+async def test_story_catalog():
+    story_ids = [
+        execute_query("INSERT INTO script_stories (title) VALUES (?)", (f"Catalog {i}",)) for i in range(3)
+    ]
+    try:
+        ids = await ScriptService.apply_batch(story_ids[0], [
+            ScriptLineModel(action="add", role="甲", content="c1", duration=1000),
+            ScriptLineModel(action="add", role="甲", content="c2", duration=2000),
+            ScriptLineModel(action="add", role="乙", content="c3", duration=500),
+        ])
+        await ScriptService.apply_batch(story_ids[0], [
+            ScriptLineModel(action="update", id=ids[1], role="乙", content="c2", duration=2500),
+            ScriptLineModel(action="delete", id=ids[0]),
+        ])
+
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            listed, cursor = [], None
+            while True:
+                params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+                page = (await ac.get("/api/stories", params=params)).json()
+                listed.extend(page["stories"])
+                cursor = page["nextCursor"]
+                if cursor is None:
+                    break
+
+        # 新的在前
+        ours = [s for s in listed if s["id"] in story_ids]
+        assert [s["id"] for s in ours] == list(reversed(story_ids))
+        first = ours[-1]
+        assert (first["lineCount"], first["totalDuration"]) == (2, 3000)
+        assert first["roleCounts"] == {"乙": 2}
+        assert ours[0]["lineCount"] == 0 and ours[0]["roleCounts"] == {}
+    finally:
+        for story_id in story_ids:
+            execute_query("DELETE FROM script_lines WHERE story_id = ?", (story_id,))
+            execute_query("DELETE FROM script_stories WHERE id = ?", (story_id,))
+
+
+@pytest.mark.sqlite_only
+@pytest.mark.asyncio
+async def test_story_catalog_never_sees_null_created_at():
+    # created_at 为 NULL 的剧本会从键集分页中漏掉；写入的 NULL 由触发器补为当前时间 (MySQL 上该列为 NOT NULL)
+    story_id = execute_query("INSERT INTO script_stories (title, created_at) VALUES ('No date', NULL)")
+    try:
+        execute_query("UPDATE script_stories SET created_at = NULL WHERE id = ?", (story_id,))
+        assert query_all("SELECT created_at FROM script_stories WHERE id = ?", (story_id,))[0]["created_at"]
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            listed, cursor = [], None
+            while True:
+                params = {"limit": 1, **({"cursor": cursor} if cursor else {})}
+                page = (await ac.get("/api/stories", params=params)).json()
+                listed.extend(s["id"] for s in page["stories"])
+                cursor = page["nextCursor"]
+                if cursor is None:
+                    break
+        assert story_id in listed and 1 in listed
+    finally:
+        execute_query("DELETE FROM script_stories WHERE id = ?", (story_id,))
+
+
+@pytest.mark.asyncio
+async def test_script_changes_since_revision():
+    start = (await ScriptService.get_script_by_id(1))["meta"]["revision"]
+    a, b = await ScriptService.apply_batch(1, [
+        ScriptLineModel(action="add", role="甲", content="Delta A"),
+        ScriptLineModel(action="add", role="乙", content="Delta B"),
+    ])
+    await ScriptService.update_line(ScriptLineModel(action="update", id=a, role="甲", content="Delta A2"))
+    await ScriptService.delete_line(b)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        # 新增后又修改仍算新增；新增后又删除的不下发
+        delta = (await ac.get("/api/script/changes", params={"id": 1, "since": start})).json()
+        assert delta["revision"] == start + 3 and delta["full"] is False
+        assert [l["content"] for l in delta["inserted"]] == ["Delta A2"]
+        assert delta["updated"] == [] and delta["deleted"] == []
+
+        delta = (await ac.get("/api/script/changes", params={"id": 1, "since": start + 1})).json()
+        assert [l["id"] for l in delta["updated"]] == [a]
+        assert delta["inserted"] == [] and delta["deleted"] == [b]
+
+        current = (await ac.get("/api/script/changes", params={"id": 1, "since": start + 3})).json()
+        assert (current["inserted"], current["updated"], current["deleted"]) == ([], [], [])
+
+        # 重新编号会整理日志，落后的客户端改拿完整快照
+        await ScriptService.apply_batch(1, [ScriptLineModel(action="move", id=a, after_id=0)])
+        await asyncio.wrap_future(get_writer().submit(lambda conn: _renumber_story(conn, 1)))
+        script_store.invalidate(1)
+        snapshot = (await ac.get("/api/script/changes", params={"id": 1, "since": start + 3})).json()
+        assert snapshot["full"] is True
+        assert snapshot["script"]["lines"][0]["id"] == a
+        assert snapshot["revision"] == (await ScriptService.get_script_by_id(1))["meta"]["revision"]
+
+    await ScriptService.delete_line(a)
+
+
+@pytest.mark.asyncio
+async def test_writes_to_missing_lines_do_not_bump_revision():
+    start = (await ScriptService.get_script_by_id(1))["meta"]["revision"]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for action in ({"action": "move", "after_id": 0}, {"action": "delete"},
+                       {"action": "update", "role": "甲", "content": "x"}):
+            response = await ac.post("/api/admin", json={"id": 424242, **action})
+            assert response.status_code == 404
+        response = await ac.post("/api/admin/batch", json={"ops": [{"action": "delete", "id": 424242}]})
+        assert response.status_code == 400
+        assert (await ac.post("/api/admin/batch", json={"ops": []})).json()["ids"] == []
+
+        delta = (await ac.get("/api/script/changes", params={"id": 1, "since": start})).json()
+        assert delta["revision"] == start and delta["deleted"] == [] and delta["updated"] == []
+
+
+@pytest.mark.asyncio
+async def test_admin_line_ranges_and_cached_page():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        full = (await ac.get("/api/script?id=1")).json()
+        window = (await ac.get("/api/admin/lines", params={"id": 1, "offset": 2, "limit": 3})).json()
+        assert window["total"] == len(full["lines"]) and window["offset"] == 2
+        assert window["lines"] == full["lines"][2:5]
+        assert window["revision"] == full["meta"]["revision"]
+        past_end = (await ac.get("/api/admin/lines", params={"id": 1, "offset": 10_000})).json()
+        assert past_end["lines"] == []
+        assert (await ac.get("/api/admin/lines", params={"id": 1, "offset": -1})).status_code == 400
+        assert (await ac.get("/api/admin/lines", params={"id": 999999})).status_code == 404
+
+        page = await ac.get("/admin")
+        assert page.status_code == 200 and "lines-viewport" in page.text
+        assert page.headers["content-type"].startswith("text/html")
+        again = await ac.get("/admin", headers={"If-None-Match": page.headers["etag"]})
+        assert again.status_code == 304
@@ -0,0 +1,50 @@
+import pytest
+from httpx import AsyncClient
+
+from api.db import execute_query
+from api.main import app
+from api.services.config_service import ConfigService
+
+pytestmark = pytest.mark.usefixtures("backend")
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_shared_until_invalidated():
+    first = await ConfigService.get_snapshot()
+    assert await ConfigService.get_snapshot() is first
+
+    ConfigService.invalidate()
+    second = await ConfigService.get_snapshot()
+    assert second is not first
+    assert second.configs == first.configs
+
+    with pytest.raises(TypeError):
+        second.configs["llm"]["apiKey"] = "tampered"
+
+
+@pytest.mark.asyncio
+async def test_reload_swaps_snapshot_and_notifies():
+    before = await ConfigService.get_snapshot()
+    original = before.configs["llm"]["baseUrl"]
+    changes = []
+    listener = lambda old, new: changes.append((old, new))
+    ConfigService.subscribe(listener)
+    try:
+        execute_query("UPDATE script_configs SET value=? WHERE category='llm' AND key_name='baseUrl'", ("https://example.test",))
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            etag = (await ac.get("/api/config")).headers["etag"]
+            # 快照刷新前仍返回旧内容
+            assert (await ac.get("/api/config", headers={"If-None-Match": etag})).status_code == 304
+
+            await ac.post("/api/admin/config/reload")
+            response = await ac.get("/api/config", headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.json()["llm"]["baseUrl"] == "https://example.test"
+
+        # 已经拿到旧快照的会话视图保持不变
+        assert before.configs["llm"]["baseUrl"] == original
+        assert len(changes) == 1 and changes[0][0] is before
+    finally:
+        ConfigService.unsubscribe(listener)
+        execute_query("UPDATE script_configs SET value=? WHERE category='llm' AND key_name='baseUrl'", (original,))
+        await ConfigService.reload()
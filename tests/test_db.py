@@ -0,0 +1,349 @@
+import asyncio
+import datetime
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+
+import api.db as db
+from api.db import (ConnectionPool, MySQLBackend, MySQLConnection, MySQLWriter, WriteQueue, _Result, execute_query,
+                    get_db_connection, get_pool, query_all)
+from api.main import app
+from api.services.script_store import script_store
+
+
+@pytest.mark.usefixtures("backend")
+@pytest.mark.sqlite_only
+def test_pool_connections_use_wal():
+    with get_pool().connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] > 0
+
+
+@pytest.mark.sqlite_only
+def test_pool_reuses_and_bounds_connections():
+    pool = ConnectionPool(size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as again:
+        assert again is first
+
+    a = pool.acquire()
+    b = pool.acquire()
+    assert pool._created == 2
+
+    # 第三个调用方需要等待归还
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(timeout=2)))
+    waiter.start()
+    pool.release(a)
+    waiter.join()
+    assert got == [a]
+    pool.release(b)
+    pool.release(got[0])
+    pool.close()
+
+
+@pytest.mark.usefixtures("backend")
+def test_query_all_through_pool():
+    rows = query_all("SELECT id FROM script_stories WHERE id = ?", (1,))
+    assert rows == [{"id": 1}]
+
+
+
+class FakeMySQLCursor:
+    description = [("id",), ("content",), ("created_at",), ("total",), ("id",)]
+    lastrowid, rowcount = None, 1
+
+    def fetchall(self):
+        return [(1, bytearray("台词".encode("utf-8")), datetime.datetime(2024, 5, 1, 8, 30), Decimal("12"), 9)]
+
+
+def test_mysql_rows_look_like_sqlite_rows():
+    # 不需要 MySQL 服务：只检查驱动返回值转换为与 sqlite3.Row 相同的形状和类型
+    row = _Result(FakeMySQLCursor()).fetchone()
+    assert dict(row) == {"id": 1, "content": "台词", "created_at": "2024-05-01 08:30:00", "total": 12}
+    assert row[4] == 9 and row["id"] == 1   # 重名列按名字取第一个，与 sqlite3.Row 一致
+
+
+class DeadlockError(Exception):
+    def __init__(self, errno):
+        super().__init__(f"error {errno}")
+        self.errno = errno
+
+
+class FakeWriterConnection:
+    def __init__(self):
+        self.in_transaction = False
+        self.log = []
+
+    def begin(self):
+        self.in_transaction = True
+        self.log.append("begin")
+
+    def commit(self):
+        self.in_transaction = False
+        self.log.append("commit")
+
+    def rollback(self):
+        self.in_transaction = False
+        self.log.append("rollback")
+
+
+class FakeWriterPool:
+    def __init__(self):
+        self.conn = FakeWriterConnection()
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+
+def test_mysql_writer_retries_deadlocks():
+    # 不需要 MySQL 服务：死锁/锁等待超时 (1213/1205) 回滚后整个操作重做，其他错误直接抛出
+    pool = FakeWriterPool()
+    writer = MySQLWriter(pool, workers=1, retries=2)
+    try:
+        failures = [1213, 1205]
+
+        def flaky(conn):
+            if failures:
+                raise DeadlockError(failures.pop(0))
+            return "done"
+
+        assert writer.submit(flaky).result() == "done"
+        assert pool.conn.log == ["begin", "rollback", "begin", "rollback", "begin", "commit"]
+        assert (writer.commits, writer.operations) == (1, 1)
+
+        pool.conn.log.clear()
+        attempts = []
+
+        def always_deadlocks(conn):
+            attempts.append(1)
+            raise DeadlockError(1213)
+
+        with pytest.raises(DeadlockError):
+            writer.submit(always_deadlocks).result()
+        assert len(attempts) == 3   # 首次 + 2 次重试
+
+        def duplicate_key(conn):
+            attempts.append(1)
+            raise DeadlockError(1062)
+
+        attempts.clear()
+        with pytest.raises(DeadlockError):
+            writer.submit(duplicate_key).result()
+        assert len(attempts) == 1 and pool.conn.log[-2:] == ["begin", "rollback"]
+        assert (writer.commits, writer.operations) == (1, 3)
+    finally:
+        writer.close()
+
+
+class FakeMySQLRaw:
+    """mysql-connector 连接的替身：记录执行的语句，每行影响的行数由 ``rowcounts`` 给出"""
+
+    def __init__(self, rowcounts=()):
+        self.rowcounts = list(rowcounts)
+        self.executed = []
+
+    def cursor(self, prepared=False):
+        raw = self
+
+        class Cursor:
+            rowcount, lastrowid, description = 0, None, None
+
+            def execute(self, sql, params=()):
+                raw.executed.append((prepared, sql, params))
+                self.rowcount = raw.rowcounts.pop(0)
+
+            def executemany(self, sql, rows):
+                raw.executed.append((prepared, sql, rows))
+                self.rowcount = len(rows)
+
+            def close(self):
+                pass
+
+        return Cursor()
+
+
+def test_mysql_executemany_row_counts():
+    # executemany 的 rowcount 与 sqlite3 一致：各行影响行数之和
+    conn = MySQLConnection.__new__(MySQLConnection)
+    conn._statements, conn._raw = OrderedDict(), FakeMySQLRaw(rowcounts=[1, 0, 1])
+
+    # INSERT 整批交给驱动改写为多行 INSERT，占位符换成驱动的 %s
+    result = conn.executemany("INSERT INTO t (a) VALUES (?)", [[1], [2]])
+    assert result.rowcount == 2
+    assert conn._raw.executed == [(False, "INSERT INTO t (a) VALUES (%s)", [(1,), (2,)])]
+
+    # 其他语句逐行执行同一条预编译语句，影响行数累加 (没匹配到的行计 0)
+    conn._raw.executed.clear()
+    result = conn.executemany("UPDATE t SET a = ? WHERE id = ?", [(1, 1), (2, 2), (3, 3)])
+    assert result.rowcount == 2
+    assert [prepared for prepared, _, _ in conn._raw.executed] == [True] * 3
+    assert len(conn._statements) == 1
+
+    assert conn.executemany("UPDATE t SET a = ?", []).rowcount == 0
+
+
+def test_mysql_connection_counts_matched_rows(monkeypatch):
+    # FOUND_ROWS：UPDATE 的 rowcount 为匹配的行数，值没变的行也计入 (与 SQLite 相同)
+    import mysql.connector
+    from mysql.connector.constants import ClientFlag
+
+    captured = {}
+    monkeypatch.setattr(mysql.connector, "connect", lambda **kwargs: captured.update(kwargs) or FakeMySQLRaw())
+    MySQLConnection({"database": "scriptbuddy_test"})
+    assert ClientFlag.FOUND_ROWS in captured["client_flags"] and captured["autocommit"] is True
+
+
+def test_mysql_fulltext_check_uses_its_own_connection(monkeypatch):
+    # 不经过全局连接池 (当前启用的可能是 SQLite)，用该后端自己的连接查询，结果缓存
+    backend = MySQLBackend(config={})
+    opened = []
+
+    class Connection:
+        closed = False
+
+        def execute(self, sql, params=()):
+            assert "information_schema" in sql
+            return _Result(type("Cursor", (), {"description": [("1",)], "fetchall": lambda self: [(1,)],
+                                               "rowcount": 1, "lastrowid": None})())
+
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(backend, "connect", lambda: opened.append(Connection()) or opened[-1])
+    monkeypatch.setattr(db, "get_pool", lambda: pytest.fail("global pool used"))
+    assert backend.has_fulltext() is True
+    assert backend.has_fulltext() is True
+    assert len(opened) == 1 and opened[0].closed
+
+@pytest.mark.usefixtures("backend")
+@pytest.mark.sqlite_only
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_under_write_lock():
+    # 另一个连接持有写锁 0.5s，期间管理端写入必须在线程池里等待，而不是卡住事件循环
+    locked = threading.Event()
+
+    def hold_write_lock():
+        conn = get_db_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        locked.set()
+        time.sleep(0.5)
+        conn.rollback()
+        conn.close()
+
+    holder = threading.Thread(target=hold_write_lock)
+    holder.start()
+    locked.wait()
+
+    max_lag = 0.0
+    stop = False
+
+    async def measure_lag():
+        nonlocal max_lag
+        while not stop:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.perf_counter() - started - 0.01)
+
+    ticker = asyncio.create_task(measure_lag())
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        payload = {"action": "add", "role": "甲", "content": "Lag Probe", "sort": 999}
+        started = time.perf_counter()
+        response = await ac.post("/api/admin", json=payload)
+        waited = time.perf_counter() - started
+        # 读请求在 WAL 模式下不受写锁影响
+        assert (await ac.get("/api/script?id=1")).status_code == 200
+    stop = True
+    await ticker
+    holder.join()
+
+    assert response.status_code == 200
+    assert waited >= 0.3
+    assert max_lag < 0.1
+    execute_query("DELETE FROM script_lines WHERE content = ?", ("Lag Probe",))
+    script_store.invalidate(1)  # 绕过 ScriptService 的直接写入需手动失效缓存
+
+
+@pytest.mark.usefixtures("backend")
+@pytest.mark.sqlite_only
+@pytest.mark.asyncio
+async def test_concurrent_writes_are_group_committed():
+    writer = WriteQueue(window_ms=20)
+    sql = "INSERT INTO script_lines (story_id, role_key, content, sort_order) VALUES (?, ?, ?, ?)"
+
+    def insert(i):
+        return lambda conn: conn.execute(sql, (1, "甲", f"Group Commit {i}", 1000 + i)).lastrowid
+
+    def broken(conn):
+        conn.execute("INSERT INTO no_such_table VALUES (1)")
+
+    futures = [writer.submit(insert(i)) for i in range(50)]
+    bad = writer.submit(broken)
+    ids = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+    with pytest.raises(sqlite3.OperationalError):
+        await asyncio.wrap_future(bad)
+    writer.close()
+
+    # 失败的操作只回滚自己，其余操作都拿到各自的自增 ID
+    assert len(set(ids)) == 50
+    assert writer.operations == 51
+    assert writer.commits < 51
+    rows = query_all("SELECT COUNT(*) AS n FROM script_lines WHERE content LIKE 'Group Commit %'")
+    assert rows[0]["n"] == 50
+    execute_query("DELETE FROM script_lines WHERE content LIKE 'Group Commit %'")
+    script_store.invalidate(1)
+
+
+class _BrokenCommit:
+    """COMMIT 和 ROLLBACK 都失败的连接"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.isolation_level = None
+
+    @property
+    def in_transaction(self):
+        return self.conn.in_transaction
+
+    def execute(self, sql, *args):
+        if sql in ("COMMIT", "ROLLBACK"):
+            raise sqlite3.OperationalError(f"{sql} failed")
+        return self.conn.execute(sql, *args)
+
+    def close(self):
+        self.conn.close()
+
+
+@pytest.mark.sqlite_only
+def test_writer_restarts_after_connect_or_rollback_failure(tmp_path):
+    connects = []
+
+    def connect():
+        connects.append(1)
+        if len(connects) == 1:
+            raise sqlite3.OperationalError("unable to open database file")
+        conn = sqlite3.connect(str(tmp_path / "writer.db"), check_same_thread=False)
+        return _BrokenCommit(conn) if len(connects) == 2 else conn
+
+    writer = WriteQueue(window_ms=0, connect=connect)
+    try:
+        # 连不上数据库：排队的操作以该异常失败，而不是一直挂起
+        with pytest.raises(sqlite3.OperationalError, match="unable to open"):
+            writer.submit(lambda conn: 1).result(timeout=5)
+        # 下一次 submit 重新启动写线程；这次 COMMIT 和 ROLLBACK 都失败
+        with pytest.raises(sqlite3.OperationalError, match="COMMIT failed"):
+            writer.submit(lambda conn: conn.execute("CREATE TABLE t (x)")).result(timeout=5)
+        # 放弃坏连接之后的写入在新连接上完成
+        assert writer.submit(lambda conn: conn.execute("CREATE TABLE t (x)").rowcount).result(timeout=5) == -1
+        assert len(connects) == 3
+    finally:
+        writer.close()
@@ -0,0 +1,89 @@
+import pytest
+from httpx import AsyncClient
+
+from api.main import app
+from api.db import execute_query
+import api.services.import_service as import_service
+from api.services.import_service import RoleMapper, ScreenplayParser
+
+PLAY = """# 排练：咖啡店
+
+- **店员**：欢迎光临，请问要点什么？
+- **顾客**：一杯拿铁，
+  要热的。
+（店员开始制作咖啡）
+旁白: 五分钟后。
+店员：您的拿铁好了。
+"""
+
+
+def test_parse_screenplay():
+    parser, roles = ScreenplayParser(), RoleMapper()
+    parsed = [(roles.key_for(speaker), content) for speaker, content in parser.parse(PLAY.splitlines())]
+    assert parser.title == "排练：咖啡店"
+    assert parsed == [
+        ("甲", "欢迎光临，请问要点什么？"),
+        ("乙", "一杯拿铁，要热的。"),      # 无角色的行接在上一句后面
+        ("合", "（店员开始制作咖啡）"),
+        ("合", "五分钟后。"),
+        ("甲", "您的拿铁好了。"),
+    ]
+    assert roles.role_map == {"甲": "店员", "乙": "顾客", "合": "旁白"}
+
+    # 含空白或全是数字的 "角色" 不是说话人，整行接在上一句后面
+    parsed = list(ScreenplayParser().parse(["店员：出发吧。", "10:30 他们出发了", "第一幕 场景：客厅"]))
+    assert parsed == [("店员", "出发吧。10:30 他们出发了第一幕 场景：客厅")]
+
+    # 天干用完之后的角色以名字作键，与已分配的键重名时加序号 (甲2、甲3…)，不会并到别的角色上；
+    # 名字本身就叫 "甲2" 时与刚分配的 甲2 重名，得到 甲22
+    roles = RoleMapper()
+    keys = [roles.key_for(f"角色{i}") for i in range(10)]
+    assert keys == list("甲乙丙丁戊己庚辛壬癸")
+    assert [roles.key_for(name) for name in ("路人", "甲", "乙", "甲2")] == ["路人", "甲2", "乙2", "甲22"]
+    assert len(set(roles.role_map)) == len(roles.role_map) == 14 and roles.role_map["甲2"] == "甲"
+
+
+@pytest.mark.usefixtures("backend")
+@pytest.mark.asyncio
+async def test_import_endpoint(monkeypatch):
+    # 调小阈值，让上传经过分块写入并转存为磁盘文件的路径
+    monkeypatch.setattr(import_service, "UPLOAD_SPOOL_BYTES", 64)
+    monkeypatch.setattr(import_service, "UPLOAD_WRITE_BYTES", 16)
+    # 每 2 行提交一次，覆盖分块写入与逐块补齐索引
+    monkeypatch.setattr(import_service, "IMPORT_BATCH_SIZE", 2)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/api/admin/import", content=PLAY.encode("utf-8"))
+        assert response.status_code == 200
+        story_id = response.json()["storyId"]
+        try:
+            assert response.json()["lines"] == 5
+            script = (await ac.get("/api/script", params={"id": story_id})).json()
+            assert script["meta"]["title"] == "排练：咖啡店"
+            assert [l["role"] for l in script["lines"]] == ["甲", "乙", "合", "合", "甲"]
+
+            # 导入时暂停的索引和统计在提交前已补齐
+            results = (await ac.get("/api/search", params={"q": "拿铁好了", "story_id": story_id})).json()["results"]
+            assert [r["content"] for r in results] == ["您的拿铁好了。"]
+            results = (await ac.get("/api/search", params={"q": "拿铁", "story_id": story_id})).json()["results"]
+            assert [r["content"] for r in results] == ["一杯拿铁，要热的。", "您的拿铁好了。"]
+            stories = (await ac.get("/api/stories", params={"limit": 100})).json()["stories"]
+            imported = next(s for s in stories if s["id"] == story_id)
+            assert imported["lineCount"] == 5 and imported["roleCounts"] == {"甲": 2, "乙": 1, "合": 2}
+
+            # 之后的逐行写入照常维护索引和统计
+            await ac.post("/api/admin", json={"action": "add", "story_id": story_id, "role": "乙", "content": "谢谢。"})
+            stories = (await ac.get("/api/stories", params={"limit": 100})).json()["stories"]
+            assert next(s for s in stories if s["id"] == story_id)["lineCount"] == 6
+        finally:
+            execute_query("DELETE FROM script_lines WHERE story_id = ?", (story_id,))
+            execute_query("DELETE FROM script_stories WHERE id = ?", (story_id,))
+
+        stories = (await ac.get("/api/stories", params={"limit": 100})).json()["stories"]
+        response = await ac.post("/api/admin/import", content="只有说明，没有台词".encode("utf-8"))
+        assert response.status_code == 400
+        # 已提交若干块之后失败 (这里是非法 UTF-8)：删除已写入的部分，不留下剧本
+        response = await ac.post("/api/admin/import", content=PLAY.encode("utf-8") * 50 + b"\xff\xfe")
+        assert response.status_code == 400
+        assert (await ac.get("/api/stories", params={"limit": 100})).json()["stories"] == stories
+        results = (await ac.get("/api/search", params={"q": "拿铁"})).json()["results"]
+        assert all(r["storyId"] in {s["id"] for s in stories} for r in results)
@@ -0,0 +1,145 @@
+import gzip
+import ipaddress
+import json
+import logging
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from api.proxy.protocol import (
+    CompressionBits, MsgType, MsgTypeFlagBits, SerializationBits,
+    build_audio_only_request, build_frame, build_full_client_request, forward_frame, parse_frame
+)
+from api.proxy.asr_proxy import inspect_server_frame, relay_client_frame
+from api.proxy.compression import CompressionPolicy, CompressionStats
+from api.proxy.inspection import FrameInspector, should_trace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "doc", "L2V_volcengine_binary_demo"))
+from protocols import Message  # noqa: E402  官方 SDK 的参考实现
+
+
+def test_frames_round_trip_with_reference_sdk():
+    audio = bytes(range(256)) * 4
+    frames = [
+        build_frame(MsgType.FullClientRequest, b'{"a": 1}'),
+        build_frame(MsgType.AudioOnlyServer, audio, flag=MsgTypeFlagBits.PositiveSeq, sequence=7,
+                    serialization=SerializationBits.Raw),
+        build_audio_only_request(audio, 9, is_last=True),
+        build_frame(MsgType.Error, b'{"message": "bad"}', error_code=45000001),
+    ]
+    for data in frames:
+        frame, ref = parse_frame(data), Message.from_bytes(data)
+        assert (frame.type, frame.flag, frame.sequence, frame.error_code) == (ref.type, ref.flag, ref.sequence, ref.error_code)
+        assert frame.payload == ref.payload and ref.marshal() == data
+
+    last = parse_frame(frames[2])
+    assert last.is_last and last.sequence == -9 and last.serialization == SerializationBits.Raw
+
+    # 载荷是原缓冲区上的视图，不复制
+    buffer = bytearray(frames[1])
+    view = parse_frame(buffer).payload
+    buffer[-1] ^= 0xFF
+    assert view[-1] == buffer[-1]
+
+
+def test_compressed_payloads_and_truncated_frames():
+    body = json.dumps({"audio": {"format": "pcm"}}).encode()
+    frame = parse_frame(build_full_client_request(gzip.compress(body), CompressionBits.Gzip))
+    assert frame.compression == CompressionBits.Gzip and frame.json() == {"audio": {"format": "pcm"}}
+
+    audio = parse_frame(build_audio_only_request(gzip.compress(b"\x00\x01" * 100), 3, False, CompressionBits.Gzip))
+    assert audio.sequence == 3 and not audio.is_last and bytes(audio.data()) == b"\x00\x01" * 100
+    assert gzip.decompress(audio.payload) == b"\x00\x01" * 100
+
+    data = build_frame(MsgType.FullClientRequest, b"{}")
+    for truncated in (data[:2], data[:6], data[:-1]):
+        with pytest.raises(ValueError):
+            parse_frame(truncated)
+    with pytest.raises(ValueError):
+        parse_frame(bytes([0x11, (MsgType.FullClientRequest << 4) | MsgTypeFlagBits.WithEvent, 0x10, 0]) + bytes(8))
+
+
+@pytest.mark.asyncio
+async def test_asr_audio_is_forwarded_without_recompression():
+    pcm = bytes(range(200)) * 16
+    compressed = build_audio_only_request(gzip.compress(pcm), 5, False, CompressionBits.Gzip)
+    stats = CompressionStats()
+
+    # 头部已符合要求：原样转发，不复制
+    assert await relay_client_frame(compressed, 5, stats, passthrough=True) is compressed
+    assert stats.decompressed == stats.compressed == 0
+
+    # 只改写头部和 sequence，压缩后的载荷逐字节保留
+    reencoded = parse_frame(await relay_client_frame(compressed, 5, stats, passthrough=False))
+    assert stats.decompressed == 1 and stats.compressed == 1
+    unnumbered = build_frame(MsgType.AudioOnlyClient, parse_frame(compressed).payload, flag=MsgTypeFlagBits.LastNoSeq,
+                             serialization=SerializationBits.Raw, compression=CompressionBits.Gzip)
+    forwarded = parse_frame(await relay_client_frame(unnumbered, 12, stats, passthrough=True))
+    assert forwarded.is_last and forwarded.sequence == -12 and forwarded.payload == parse_frame(compressed).payload
+    assert bytes(reencoded.data()) == bytes(forwarded.data()) == pcm
+
+    raw = build_audio_only_request(pcm, 7, is_last=True)
+    renumbered = parse_frame(forward_frame(raw, parse_frame(raw), MsgTypeFlagBits.PositiveSeq, 8))
+    assert (renumbered.sequence, renumbered.is_last, bytes(renumbered.payload)) == (8, False, pcm)
+    assert parse_frame(raw).sequence == -7       # 原缓冲区不受影响
+
+
+@pytest.mark.asyncio
+async def test_compression_policy_skips_small_and_incompressible_payloads():
+    policy, stats = CompressionPolicy(min_bytes=1024, offload_bytes=64 * 1024), CompressionStats()
+
+    assert await policy.compress(b"{}", stats) == (b"{}", CompressionBits.None_)
+    text = json.dumps({"text": "台词" * 2000}).encode()
+    body, compression = await policy.compress(text, stats)
+    assert compression == CompressionBits.Gzip and gzip.decompress(body) == text
+    assert stats.skipped == 1 and stats.compressed == 1 and stats.bytes_saved == len(text) - len(body)
+
+    # 超过阈值的载荷在线程池里压缩/解压
+    large = bytes(100 * 1024)
+    body, compression = await policy.compress(large, stats, audio=True)
+    assert await policy.decompress(body, stats) == large and stats.offloaded == 2
+    assert stats.cpu_seconds > 0
+
+    # 音频压不动时，试探若干帧后本会话不再压缩音频
+    noise, stats = os.urandom(4096), CompressionStats()
+    for _ in range(40):
+        await policy.compress(noise, stats, audio=True)
+    assert stats.audio_frames == 20 and stats.skipped == 40 and stats.compressed == 0
+
+
+@pytest.mark.asyncio
+async def test_upstream_frames_are_sampled_but_errors_always_inspected(caplog):
+    logger = logging.getLogger("asr_proxy")
+    audio = build_frame(MsgType.AudioOnlyServer, b"pcm", flag=MsgTypeFlagBits.PositiveSeq, sequence=1,
+                        serialization=SerializationBits.Raw)
+    error = build_frame(MsgType.Error, b'{"message": "quota exceeded"}', error_code=45000001)
+
+    inspector = FrameInspector(logger, sample_every=10)
+    picks = [inspector.should_inspect(audio) for _ in range(20)]
+    assert [i for i, pick in enumerate(picks) if pick] == [0, 10]
+    assert inspector.should_inspect(error)
+    traced = FrameInspector(logger, traced=True)
+    assert all(traced.should_inspect(audio) for _ in range(5)) and traced.level == logging.INFO
+
+    final = json.dumps({"result": {"text": "你好", "utterance_end": True}}).encode()
+    final = build_frame(MsgType.FullServerResponse, gzip.compress(final), compression=CompressionBits.Gzip)
+    with caplog.at_level(logging.INFO, logger="asr_proxy"):
+        await inspect_server_frame(final, 1, inspector, CompressionStats())
+        await inspect_server_frame(error, 2, inspector, CompressionStats())
+    assert "你好" in caplog.text and "45000001: quota exceeded" in caplog.text
+
+
+def test_trace_requires_allow_listed_client():
+    def client_ws(host, query):
+        return SimpleNamespace(client=SimpleNamespace(host=host, port=50000), query_params=query)
+
+    allowed = [ipaddress.ip_network("10.0.0.0/8"), ipaddress.ip_network("127.0.0.1/32")]
+    # 默认没有配置允许的地址：客户端无法自行开启跟踪
+    assert not should_trace(client_ws("127.0.0.1", {"trace": "1"}))
+    assert should_trace(client_ws("127.0.0.1", {"trace": "1"}), allowed)
+    assert should_trace(client_ws("10.1.2.3", {"trace": "1"}), allowed)
+    assert not should_trace(client_ws("192.168.1.5", {"trace": "1"}), allowed)
+    assert not should_trace(client_ws("10.1.2.3", {}), allowed)
+    assert not should_trace(client_ws("testclient", {"trace": "1"}), allowed)
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from api.main import app
+from api.services.script_events import RESYNC, ScriptEventHub
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_resynced_not_awaited():
+    hub = ScriptEventHub(queue_size=2)
+    slow = hub.subscribe(1)
+    for revision in range(1, 5):
+        hub.publish(1, {"revision": revision})
+    # 队列满时不阻塞发布方：积压被丢弃，只留补发标记
+    assert slow.queue.qsize() == 1 and await slow.get() is RESYNC
+    assert slow.dropped == 3
+
+    # 已推送过的 revision 不再重复推送
+    hub.publish(1, {"revision": 3})
+    assert slow.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_notify_coalesces_writes():
+    hub = ScriptEventHub()
+    subscription = hub.subscribe(1)
+    hub.seen(1, 10)
+    calls = []
+
+    async def load(story_id, since):
+        calls.append(since)
+        await asyncio.sleep(0)
+        return {"revision": 12, "full": False, "inserted": [], "updated": [], "deleted": []}
+
+    for _ in range(3):
+        hub.notify(1, load)
+    hub.notify(2, load)  # 没有订阅者的剧本不读库
+    while hub._tasks:
+        await asyncio.sleep(0)
+    assert calls == [10]
+    revision, text = await subscription.get()
+    assert revision == 12 and json.loads(text)["type"] == "changes"
+
+
+@pytest.mark.usefixtures("backend")
+def test_live_push_over_websocket():
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/ws/script?id=1") as ws:
+            initial = ws.receive_json()
+            assert initial["full"] is True and initial["type"] == "changes"
+
+            new_id = client.post("/api/admin", json={
+                "action": "add", "story_id": 1, "role": "甲", "content": "Live push"
+            }).json()["id"]
+            event = ws.receive_json()
+            assert event["revision"] == initial["revision"] + 1
+            assert [l["content"] for l in event["inserted"]] == ["Live push"]
+
+            client.post("/api/admin", json={"action": "delete", "id": new_id})
+            event = ws.receive_json()
+            assert event["deleted"] == [new_id]
@@ -0,0 +1,31 @@
+import pytest
+
+from api.http_cache import encode_json
+from api.services.script_lines import ScriptLines
+from api.services.script_service import ScriptService, columnar_lines, encode_script_json
+
+LINES = [
+    {"id": 3, "role": "甲", "content": "好的。", "duration": 3000, "sort": 1024},
+    {"id": 9, "role": "乙", "content": 'He said "hi"\n\\ok', "duration": None, "sort": 2048},
+    {"id": 4, "role": "甲", "content": "好的。", "duration": 1500, "sort": 3072},
+]
+
+
+def test_script_lines_match_dict_lines():
+    lines = ScriptLines.from_lines(LINES)
+    assert len(lines) == 3 and lines == LINES and list(lines) == LINES
+    assert lines[-1] == LINES[-1] and lines[1:] == LINES[1:]
+    assert lines.text.count("好的".encode("utf-8")) == 1     # 相同文本只存一份
+
+    # 直接序列化的结果与逐行 dict 的编码逐字节相同
+    assert lines.to_json() == encode_json(LINES)
+    assert lines.columns() == columnar_lines(LINES)
+    assert ScriptLines().to_json() == b"[]"
+
+
+@pytest.mark.usefixtures("backend")
+@pytest.mark.asyncio
+async def test_script_response_is_byte_identical():
+    script = await ScriptService.get_script_by_id(1)
+    assert isinstance(script["lines"], ScriptLines)
+    assert encode_script_json(script) == encode_json({"meta": script["meta"], "lines": list(script["lines"])})
@@ -0,0 +1,56 @@
+import pytest
+from httpx import AsyncClient
+
+from api.main import app
+from api.services.script_store import ScriptStore, estimate_size, script_store
+
+
+def make_script(n, text="台词"):
+    return {"meta": {}, "lines": [{"id": i, "role": "甲", "content": text, "duration": 3000, "sort": i} for i in range(n)]}
+
+
+def test_put_rejected_after_concurrent_write():
+    store = ScriptStore()
+    version = store.version(1)
+    store.invalidate(1)  # 读取期间发生了写入
+    assert store.put(1, make_script(3), version) is False
+    assert store.get(1) is None
+
+    assert store.put(1, make_script(3), store.version(1)) is True
+    assert store.get(1)["lines"][0]["content"] == "台词"
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_lru_eviction_by_bytes():
+    size = estimate_size(make_script(10))
+    store = ScriptStore(max_bytes=size * 2)
+    for story_id in (1, 2):
+        store.put(story_id, make_script(10), 0)
+    store.get(1)  # 1 变为最近使用
+    store.put(3, make_script(10), 0)
+
+    assert store.get(2) is None
+    assert store.get(1) is not None and store.get(3) is not None
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["bytes"] <= store.max_bytes
+
+
+@pytest.mark.usefixtures("backend")
+@pytest.mark.asyncio
+async def test_reads_hit_store_and_writes_invalidate():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.get("/api/script?id=1")
+        hits = script_store.hits
+        await ac.get("/api/script?id=1")
+        assert script_store.hits == hits + 1
+
+        new_id = (await ac.post("/api/admin", json={"action": "add", "role": "甲", "content": "Store Probe"})).json()["id"]
+        lines = (await ac.get("/api/script?id=1")).json()["lines"]
+        assert lines[-1]["id"] == new_id
+
+        await ac.post("/api/admin", json={"action": "delete", "id": new_id})
+        lines = (await ac.get("/api/script?id=1")).json()["lines"]
+        assert all(l["id"] != new_id for l in lines)
+
+        stats = (await ac.get("/api/admin/stats")).json()
+        assert stats["scriptStore"]["hits"] >= 1
@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from api.main import ScriptLineModel
+from api.db import execute_query
+from api.services.script_service import ScriptService
+from api.services import script_snapshot
+from api.services.script_snapshot import ScriptSnapshot, SnapshotError, get_snapshot, use_snapshot, write_snapshot
+from api.services.script_store import script_store
+
+pytestmark = pytest.mark.usefixtures("backend")
+
+
+@pytest.mark.asyncio
+async def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "scripts.snap")
+    # 没有时长的台词读回来仍是 None，而不是 0
+    line_id = execute_query(
+        "INSERT INTO script_lines (story_id, role_key, content, duration_ms, sort_order) VALUES (1, '合', 'No duration', NULL, 99999999)"
+    )
+    script_store.invalidate(1)
+    try:
+        assert write_snapshot(path, [1, 999]) == (1, len((await ScriptService.get_script_by_id(1))["lines"]))
+
+        snapshot = ScriptSnapshot(path)
+        try:
+            assert snapshot.story_ids() == [1] and 999 not in snapshot
+            script = await ScriptService.get_script_by_id(1)
+            assert snapshot.get_script(1) == script
+            # 直接引用 mmap 中转义好的文本，序列化结果与数据库读出的逐字节一致
+            assert snapshot.get_script(1)["lines"].to_json() == script["lines"].to_json()
+            assert snapshot.get_script(1)["lines"].columns() == script["lines"].columns()
+            assert list(snapshot.iter_lines(1))[-1]["duration"] is None
+            assert snapshot.get_script(999) is None
+        finally:
+            snapshot.close()
+    finally:
+        execute_query("DELETE FROM script_lines WHERE id = ?", (line_id,))
+        script_store.invalidate(1)
+
+    with open(path, "r+b") as f:
+        f.write(b"garbage!")
+    with pytest.raises(SnapshotError):
+        ScriptSnapshot(path)
+
+
+@pytest.mark.asyncio
+async def test_service_reads_from_snapshot_until_written(tmp_path, monkeypatch):
+    # 每次读取都与数据库比对 revision
+    monkeypatch.setattr(script_snapshot, "SNAPSHOT_CHECK_INTERVAL", 0)
+    path = str(tmp_path / "scripts.snap")
+    write_snapshot(path, [1])
+    use_snapshot(ScriptSnapshot(path))
+    line_id = None
+    try:
+        # 绕过 ScriptService 改库：快照仍是读取来源
+        line_id = execute_query(
+            "INSERT INTO script_lines (story_id, role_key, content, sort_order) VALUES (1, '合', 'Not in snapshot', 99999999)"
+        )
+        script_store.invalidate(1)
+        lines = (await ScriptService.get_script_by_id(1))["lines"]
+        assert "Not in snapshot" not in [l["content"] for l in lines]
+
+        # 其他进程的写入使 revision 变化：快照过期，改从数据库读取
+        execute_query("UPDATE script_stories SET revision = revision + 1 WHERE id = 1")
+        script_store.invalidate(1)
+        lines = (await ScriptService.get_script_by_id(1))["lines"]
+        assert lines[-1]["content"] == "Not in snapshot"
+        assert (await ScriptService.get_scripts_by_ids([1]))[1]["lines"][-1]["content"] == "Not in snapshot"
+
+        # 经 ScriptService 写入后该剧本改从数据库读取
+        await ScriptService.update_line(ScriptLineModel(action="update", id=line_id, role="合", content="Now live"))
+        lines = (await ScriptService.get_script_by_id(1))["lines"]
+        assert lines[-1]["content"] == "Now live"
+    finally:
+        use_snapshot(None)
+        if line_id is not None:
+            await ScriptService.delete_line(line_id)
+
+
+def test_snapshot_file_is_followed(tmp_path, monkeypatch):
+    path = str(tmp_path / "scripts.snap")
+    monkeypatch.setattr(script_snapshot, "SNAPSHOT_FILE", path)
+    monkeypatch.setattr(script_snapshot, "SNAPSHOT_CHECK_INTERVAL", 3600)
+    monkeypatch.setattr(script_snapshot, "_pinned", False)
+    monkeypatch.setattr(script_snapshot, "_file_state", script_snapshot._UNCHECKED)
+    monkeypatch.setattr(script_snapshot, "_snapshot", None)
+
+    # 文件不存在的结果被缓存，检查间隔内不再 stat
+    assert get_snapshot() is None
+    write_snapshot(path, [999])
+    assert get_snapshot() is None
+
+    monkeypatch.setattr(script_snapshot, "SNAPSHOT_CHECK_INTERVAL", 0)
+    first = get_snapshot()
+    assert first is not None and first.story_ids() == []
+    assert get_snapshot() is first
+
+    # 重新导出后换用新文件
+    write_snapshot(path, [1])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    second = get_snapshot()
+    assert second is not first and second.story_ids() == [1]
+    assert first.get_script(1) is None and second.get_script(1) is not None
+
+    os.remove(path)
+    assert get_snapshot() is None
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+
+import pytest
+import websockets
+from starlette.testclient import TestClient
+
+import api.proxy.asr_proxy as asr_proxy
+from api.main import app
+from api.proxy.protocol import MsgType, build_frame, build_full_client_request, parse_frame
+from api.proxy.upstream_pool import UpstreamPool
+
+CREDENTIALS = ("app", "token")
+
+
+class FakeUpstream:
+    """本地假的 ASR 上游：记录握手头，每收到一帧回一个 FullServerResponse。跑在独立线程的事件循环里"""
+
+    def __init__(self):
+        self.headers = []
+        self.connections = set()
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(websockets.serve(self._handler, "127.0.0.1", 0))
+        self.url = f"ws://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        ready.set()
+        self.loop.run_forever()
+
+    async def _handler(self, ws, path=None):
+        self.headers.append(ws.request_headers)
+        self.connections.add(ws)
+        try:
+            async for message in ws:
+                text = json.dumps({"result": {"text": f"got {parse_frame(message).type}"}}).encode()
+                await ws.send(build_frame(MsgType.FullServerResponse, text))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.connections.discard(ws)
+
+    async def drop_all(self):
+        """服务端主动断开所有连接"""
+        async def close():
+            await asyncio.gather(*(ws.close() for ws in list(self.connections)))
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(close(), self.loop))
+
+    def stop(self):
+        self.server.close()
+        asyncio.run_coroutine_threadsafe(self.server.wait_closed(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+@pytest.fixture
+def upstream():
+    fake = FakeUpstream()
+    yield fake
+    fake.stop()
+
+
+async def wait_for(condition, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_pool_prewarms_from_demand_and_hands_out_ready_connections(upstream):
+    pool = UpstreamPool(url=upstream.url, max_idle=2, check_interval=0.2)
+    try:
+        # 冷启动：当场建连，之后按需求预热
+        async with pool.connection(CREDENTIALS) as first:
+            await first.ws.send(build_full_client_request(b"{}"))
+            assert parse_frame(await first.ws.recv()).type == MsgType.FullServerResponse
+        await wait_for(lambda: pool.stats()["idle"] == 1)
+
+        second = await pool.acquire(CREDENTIALS)
+        assert pool.hits == 1 and pool.misses == 1
+        third = await pool.acquire(CREDENTIALS)
+        await second.ws.close()
+        await third.ws.close()
+        # 同一检查周期内开始了两个会话：预热数量随之增加，但不超过 max_idle
+        await wait_for(lambda: pool.stats()["idle"] == 2)
+        assert pool.target_size() == 2
+
+        # 每条连接都有自己的 request id，并带着凭证完成握手
+        request_ids = [h["X-Api-Request-Id"] for h in upstream.headers]
+        assert len(set(request_ids)) == len(request_ids) == pool.opened
+        assert {first.request_id, second.request_id} <= set(request_ids)
+        assert all(h["X-Api-App-Key"] == "app" and h["X-Api-Access-Key"] == "token" for h in upstream.headers)
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_drops_aged_dead_and_stale_credential_connections(upstream):
+    pool = UpstreamPool(url=upstream.url, max_idle=1, check_interval=0.05, max_idle_age=60)
+    try:
+        await (await pool.acquire(CREDENTIALS)).ws.close()
+        await wait_for(lambda: pool.stats()["idle"] == 1)
+
+        # 上游断开的空闲连接在健康检查时被丢弃并重新补上
+        await upstream.drop_all()
+        await wait_for(lambda: pool.failed_checks + pool.expired >= 1 and pool.stats()["idle"] == 1)
+        conn = await pool.acquire(CREDENTIALS)
+        assert conn.is_open()
+        await conn.ws.close()
+
+        # 超过最长空闲时间的连接不会被取出
+        await wait_for(lambda: pool.stats()["idle"] == 1)
+        pool.max_idle_age = 0
+        expired = pool.expired
+        await (await pool.acquire(CREDENTIALS)).ws.close()
+        assert pool.expired > expired and pool.misses == 2
+        pool.max_idle_age = 60
+
+        # 凭证变化时旧连接全部作废
+        await wait_for(lambda: pool.stats()["idle"] == 1)
+        conn = await pool.acquire(("app", "rotated"))
+        assert conn.credentials == ("app", "rotated") and upstream.headers[-1]["X-Api-Access-Key"] == "rotated"
+        assert pool.misses == 3
+        await conn.ws.close()
+    finally:
+        await pool.close()
+
+
+def test_asr_endpoint_relays_through_pooled_connection(upstream, monkeypatch):
+    pool = UpstreamPool(url=upstream.url, max_idle=1)
+    monkeypatch.setattr(asr_proxy, "asr_pool", pool)
+    with TestClient(app) as client:
+        for _ in range(2):
+            with client.websocket_connect("/api/ws/asr") as ws:
+                ws.send_bytes(build_full_client_request(b'{"audio": {"format": "pcm"}}'))
+                assert parse_frame(ws.receive_bytes()).json() == {"result": {"text": "got 1"}}
+        client.portal.call(pool.close)
+    # 会话结束时可能还有一条预连接在握手，上游看到的连接数不一定等于 opened
+    request_ids = [h["X-Api-Request-Id"] for h in upstream.headers]
+    assert pool.misses + pool.hits == 2 and len(set(request_ids)) == len(request_ids) >= 2
@@ -8,8 +8,10 @@ Usage:
 
 import sqlite3
 import os
+import urllib.request
 
 DB_FILE = "scriptbuddy.db"
+API_URL = os.environ.get("SCRIPTBUDDY_API_URL", "http://127.0.0.1:8000")
 
 def update_credentials():
     print("=" * 60)
@@ -81,8 +83,19 @@ def update_credentials():
         print(f"  LLM Key: {llm_key[:10]}...")
 
     print()
-    print("🔄 Please restart your FastAPI server for changes to take effect:")
-    print("   cd api && uvicorn main:app --reload")
+    notify_server()
+
+
+def notify_server():
+    """让运行中的服务立即刷新配置快照 (否则最迟在快照 TTL 到期后生效)"""
+    request = urllib.request.Request(f"{API_URL}/api/admin/config/reload", data=b"", method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=3):
+            pass
+        print(f"🔄 Server at {API_URL} reloaded its config.")
+    except OSError as e:
+        print(f"⚠️  Could not reach server at {API_URL} ({e}).")
+        print("   A running server picks up the change when its config snapshot expires (30s by default).")
 
 if __name__ == "__main__":
     if not os.path.exists(DB_FILE):